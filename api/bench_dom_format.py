@@ -0,0 +1,100 @@
+"""
+Benchmark: domTree wire formats - nested JSON vs flat-dom/1, as JSON and MessagePack.
+
+Usage:
+    python bench_dom_format.py                    # synthetic SPA-sized trees
+    python bench_dom_format.py dumps/*.json ...   # recorded extension payloads
+
+Reports payload size, body decode time, the recursive DomElementModel validation
+/dom/customize used to run on nested trees, and text extraction / LLM formatting
+over nested dicts vs FlatDomView.
+"""
+import sys
+import json
+import random
+from typing import List, Optional
+
+import ormsgpack
+from pydantic import BaseModel, Field
+
+from bench_dom_text import synthetic_tree, load_fixture, best_of, tree_depth
+from utils.flat_dom import encode_flat_dom, FlatDomView
+from utils.text_processing import extract_clean_text_from_dom
+
+
+# ======================================================
+# PREVIOUS /dom/customize VALIDATION (baseline)
+# ======================================================
+
+class DomElementModel(BaseModel):
+    tag: str = ""
+    attrs: dict = Field(default_factory=dict)
+    style: Optional[dict] = None
+    text: Optional[str] = None
+    children: List['DomElementModel'] = []
+
+DomElementModel.model_rebuild()
+
+
+def format_dom_for_llm():
+    # runnable pulls in the LLM clients; only import it when they are installed
+    try:
+        from runnable import format_dom_for_llm as fn
+        return fn
+    except ImportError as e:
+        print(f"⚠️ Skipping format_dom_for_llm ({e})")
+        return None
+
+
+# ======================================================
+# BENCHMARK
+# ======================================================
+
+def run(name: str, tree, formatter=None):
+    print(f"\n--- {name} (depth {tree_depth(tree)}) ---")
+    flat = encode_flat_dom(tree)
+
+    bodies = {
+        "json nested": json.dumps(tree).encode(),
+        "json flat": json.dumps(flat).encode(),
+        "msgpack nested": ormsgpack.packb(tree),
+        "msgpack flat": ormsgpack.packb(flat),
+    }
+    decoders = {"json": json.loads, "msgpack": ormsgpack.unpackb}
+    base = len(bodies["json nested"])
+
+    print(f"{'format':<16}{'bytes':>12}{'size':>8}{'decode ms':>12}")
+    for label, body in bodies.items():
+        decode = decoders[label.split()[0]]
+        ms = best_of(decode, body)
+        print(f"{label:<16}{len(body):>12,}{len(body) / base:>7.0%}{ms:>12.2f}")
+
+    if tree_depth(tree) < 500:
+        ms = best_of(lambda t: DomElementModel.model_validate(t), tree)
+        print(f"DomElementModel validation (old /dom/customize): {ms:8.2f} ms")
+
+    nested_ms = best_of(extract_clean_text_from_dom, tree)
+    flat_ms = best_of(extract_clean_text_from_dom, flat)
+    assert extract_clean_text_from_dom(tree) == extract_clean_text_from_dom(flat), "Flat extraction differs"
+    print(f"text extraction:   nested {nested_ms:8.2f} ms   flat view {flat_ms:8.2f} ms")
+
+    view_ms = best_of(FlatDomView, flat)
+    print(f"FlatDomView():     {view_ms * 1000:8.1f} µs")
+
+    if formatter:
+        nested_ms = best_of(formatter, tree)
+        flat_ms = best_of(formatter, flat)
+        assert formatter(tree) == formatter(flat), "Flat LLM formatting differs"
+        print(f"format_dom_for_llm: nested {nested_ms:8.2f} ms   flat view {flat_ms:8.2f} ms")
+    print("✅ Output identical")
+
+
+if __name__ == "__main__":
+    formatter = format_dom_for_llm()
+    if len(sys.argv) > 1:
+        for path in sys.argv[1:]:
+            run(path, load_fixture(path), formatter)
+    else:
+        rng = random.Random(42)
+        run("small page (2k nodes)", synthetic_tree(rng, 2_000), formatter)
+        run("large SPA (50k nodes)", synthetic_tree(rng, 50_000), formatter)
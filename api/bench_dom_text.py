@@ -0,0 +1,160 @@
+"""
+Benchmark: iterative extract_clean_text_from_dom vs the previous recursive version.
+
+Usage:
+    python bench_dom_text.py                      # synthetic SPA-sized trees
+    python bench_dom_text.py dumps/*.json ...     # recorded extension payloads
+
+Recorded fixtures are JSON files holding either a raw DOM tree or an extension
+context payload ({"domTree": ...}). Output parity is checked on every tree the
+old implementation could handle (depth <= 50, Universal Extractor text leaves).
+"""
+import sys
+import json
+import time
+import random
+
+from utils.text_processing import extract_clean_text_from_dom
+
+
+# ======================================================
+# PREVIOUS IMPLEMENTATION (baseline)
+# ======================================================
+
+def recursive_extract(dom_node, depth=0, max_depth=50):
+    if not dom_node or depth > max_depth:
+        return ""
+    if dom_node.get("type") == "text":
+        return dom_node.get("content", "").strip()
+
+    tag = dom_node.get("tag", "").upper()
+    SKIP_TAGS = {"SCRIPT", "STYLE", "NOSCRIPT", "IFRAME", "SVG", "NAV", "FOOTER", "HEADER", "ASIDE", "BUTTON", "INPUT", "FORM", "AD", "INS"}
+    if tag in SKIP_TAGS:
+        return ""
+
+    child_texts = []
+    for child in dom_node.get("children", []):
+        text = recursive_extract(child, depth + 1, max_depth)
+        if text:
+            child_texts.append(text)
+
+    full_text = " ".join(child_texts)
+    if not full_text:
+        return ""
+    if tag in ["H1", "H2", "H3"]:
+        return f"\n\n# {full_text}\n"
+    elif tag in ["H4", "H5", "H6"]:
+        return f"\n## {full_text}\n"
+    elif tag == "LI":
+        return f"- {full_text}"
+    elif tag in ["P", "DIV", "SECTION", "ARTICLE"]:
+        return f"{full_text}\n"
+    elif tag == "CODE":
+        return f"`{full_text}`"
+    elif tag == "TR":
+        return f"| {full_text} |"
+    return full_text
+
+
+# ======================================================
+# FIXTURES
+# ======================================================
+
+WORDS = "the quick brown fox jumps over lazy dog lorem ipsum dolor sit amet data model page".split()
+CONTAINERS = ["div", "section", "article", "span", "ul", "table", "tr", "main"]
+LEAVES = ["p", "h2", "h4", "li", "td", "code", "a", "span", "button", "nav", "script"]
+
+
+def text_leaf(rng):
+    return {"type": "text", "content": " ".join(rng.choices(WORDS, k=rng.randint(2, 25))) + " "}
+
+
+def synthetic_tree(rng, nodes: int, fanout: int = 6, max_depth: int = 30) -> dict:
+    """Wide and moderately deep, like a React app's serialized DOM."""
+    root = {"tag": "body", "children": []}
+    frontier = [(root, 0)]
+    count = 0
+    while count < nodes and frontier:
+        slot = rng.randrange(len(frontier))
+        parent, depth = frontier[slot]
+        if depth >= max_depth or len(parent["children"]) >= fanout:
+            frontier[slot] = frontier[-1]
+            frontier.pop()
+            continue
+        if rng.random() < 0.45:
+            node = {"tag": rng.choice(CONTAINERS), "children": []}
+            frontier.append((node, depth + 1))
+        else:
+            node = {"tag": rng.choice(LEAVES), "children": [text_leaf(rng) for _ in range(rng.randint(1, 3))]}
+        parent["children"].append(node)
+        count += 1
+    return root
+
+
+def deep_tree(depth: int) -> dict:
+    """A single long chain of wrappers, as produced by deeply nested SPA layouts."""
+    node = {"tag": "p", "children": [{"type": "text", "content": "leaf"}]}
+    for _ in range(depth):
+        node = {"tag": "div", "children": [node, {"type": "text", "content": "x"}]}
+    return node
+
+
+def load_fixture(path: str):
+    with open(path) as f:
+        data = json.load(f)
+    return data.get("domTree", data) if isinstance(data, dict) else data
+
+
+def tree_depth(node) -> int:
+    deepest, stack = 0, [(node, 0)]
+    while stack:
+        node, depth = stack.pop()
+        deepest = max(deepest, depth)
+        if isinstance(node, dict):
+            stack.extend((child, depth + 1) for child in node.get("children") or ())
+    return deepest
+
+
+# ======================================================
+# BENCHMARK
+# ======================================================
+
+def best_of(fn, arg, repeat: int = 5) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(arg)
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+def run(name: str, tree):
+    print(f"\n--- {name} (depth {tree_depth(tree)}) ---")
+    new_text = extract_clean_text_from_dom(tree)
+    new_ms = best_of(extract_clean_text_from_dom, tree)
+    budget_ms = best_of(lambda t: extract_clean_text_from_dom(t, max_chars=10000), tree)
+    print(f"iterative:        {new_ms:8.2f} ms  ({len(new_text)} chars)")
+    print(f"iterative @10k:   {budget_ms:8.2f} ms")
+
+    try:
+        old_text = recursive_extract(tree)
+        old_ms = best_of(recursive_extract, tree)
+    except RecursionError:
+        print("recursive:        RecursionError")
+        return
+    print(f"recursive:        {old_ms:8.2f} ms  ({len(old_text)} chars)  speedup {old_ms / new_ms:.1f}x")
+    if tree_depth(tree) <= 50 and isinstance(tree, dict):
+        assert new_text == old_text, "Output differs from the recursive implementation"
+        print("✅ Output identical")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        for path in sys.argv[1:]:
+            run(path, load_fixture(path))
+    else:
+        rng = random.Random(42)
+        run("small page (2k nodes)", synthetic_tree(rng, 2_000))
+        run("large SPA (50k nodes)", synthetic_tree(rng, 50_000))
+        run("deep nesting (45 levels, within old limit)", deep_tree(45))
+        run("deep nesting (5000 levels)", deep_tree(5_000))
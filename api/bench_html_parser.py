@@ -0,0 +1,154 @@
+"""
+Benchmark: single-pass extract_readable_page vs the previous implementation.
+
+Usage:
+    python bench_html_parser.py                        # synthetic pages
+    python bench_html_parser.py saved_pages/ page.html  # saved real-world HTML
+
+Reports parse time (best of N) and peak traced memory per page. Pass
+directories or .html files saved from the browser ("Save Page As", HTML only).
+"""
+import os
+import re
+import sys
+import time
+import random
+import tracemalloc
+
+from bs4 import BeautifulSoup
+
+import html_parser
+from html_parser import extract_readable_page, REMOVE_TAGS, BLOCK_TAGS
+
+
+# ======================================================
+# PREVIOUS IMPLEMENTATION (baseline)
+# ======================================================
+
+def previous_extract_readable_page(html: str) -> dict:
+    soup = BeautifulSoup(html, "html.parser")
+
+    def meta(name=None, prop=None):
+        tag = soup.find("meta", attrs={"name": name}) if name else soup.find("meta", property=prop)
+        return tag["content"].strip() if tag and tag.get("content") else None
+
+    head = {
+        "title": soup.title.string.strip() if soup.title and soup.title.string else None,
+        "description": meta(name="description") or meta(prop="og:description"),
+        "og_title": meta(prop="og:title"),
+        "canonical": soup.find("link", rel="canonical")["href"] if soup.find("link", rel="canonical") else None,
+    }
+    for tag in soup.find_all(REMOVE_TAGS):
+        tag.decompose()
+    main = soup.find("main") or soup.find("article") or soup.find(attrs={"role": "main"}) or soup.body
+    if not main:
+        return {"head": head, "content": "", "word_count": 0, "char_count": 0}
+
+    blocks = []
+    for el in main.descendants:
+        if el.name in BLOCK_TAGS:
+            text = " ".join(el.stripped_strings)
+            if len(text) > 40:
+                blocks.append(text)
+        if el.name == "input":
+            label = None
+            if el.get("id"):
+                l = soup.find("label", attrs={"for": el["id"]})
+                label = l.get_text(strip=True) if l else None
+            hint = label or el.get("placeholder")
+            if hint:
+                blocks.append(f"[Input] {hint}")
+        if el.name == "textarea" and el.get("placeholder"):
+            blocks.append(f"[Textarea] {el['placeholder']}")
+
+    content = re.sub(r"\n{3,}", "\n\n", "\n\n".join(dict.fromkeys(blocks)))
+    return {"head": head, "content": content.strip(), "word_count": len(content.split()), "char_count": len(content)}
+
+
+# ======================================================
+# CORPUS
+# ======================================================
+
+WORDS = "the quick brown fox jumps over lazy dog lorem ipsum dolor sit amet pricing plan account".split()
+
+
+def sentence(rng, n=12):
+    return " ".join(rng.choices(WORDS, k=n)).capitalize() + "."
+
+
+def synthetic_page(rng, sections: int, nesting: int, inputs: int) -> str:
+    """Article-style page wrapped in `nesting` layout divs, with a form of `inputs` fields."""
+    body = []
+    for i in range(sections):
+        paragraphs = "".join(f"<p>{sentence(rng, rng.randint(8, 30))} <a href='#'>{sentence(rng, 3)}</a></p>" for _ in range(4))
+        items = "".join(f"<li><span>{sentence(rng, 4)}</span></li>" for _ in range(5))
+        body.append(f"<section><h2>Section {i}</h2><div><div>{paragraphs}</div><ul>{items}</ul></div></section>")
+    form = "".join(
+        f"<div><label for='f{i}'>Field {i}</label><input id='f{i}' placeholder='value {i}'></div>"
+        for i in range(inputs)
+    )
+    content = "".join(body) + f"<form>{form}<textarea placeholder='Comment'></textarea></form>"
+    for _ in range(nesting):
+        content = f"<div class='wrap'>{content}</div>"
+    return (
+        "<html><head><title>Synthetic page</title><meta name='description' content='Benchmark page'>"
+        "<link rel='canonical' href='https://example.com/page'><script>var x = 1;</script></head>"
+        f"<body><header><nav><a href='/'>Home</a></nav></header><main>{content}</main>"
+        "<footer>Footer links</footer></body></html>"
+    )
+
+
+def load_corpus(paths):
+    for path in paths:
+        if os.path.isdir(path):
+            for name in sorted(os.listdir(path)):
+                if name.endswith((".html", ".htm")):
+                    yield from load_corpus([os.path.join(path, name)])
+        else:
+            with open(path, encoding="utf-8", errors="replace") as f:
+                yield os.path.basename(path), f.read()
+
+
+# ======================================================
+# BENCHMARK
+# ======================================================
+
+def measure(fn, html: str, repeat: int = 3) -> tuple[float, float, dict]:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(html)
+        best = min(best, time.perf_counter() - start)
+    tracemalloc.start()
+    fn(html)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best * 1000, peak / (1024 * 1024), result
+
+
+def run(name: str, html: str):
+    new_ms, new_mb, new = measure(extract_readable_page, html)
+    old_ms, old_mb, old = measure(previous_extract_readable_page, html)
+    print(
+        f"{name[:38]:38} {len(html) / 1024:8.0f} KB | "
+        f"old {old_ms:8.1f} ms {old_mb:6.1f} MB {old['char_count']:8d} chars | "
+        f"new {new_ms:7.1f} ms {new_mb:6.1f} MB {new['char_count']:8d} chars | "
+        f"{old_ms / new_ms:5.1f}x"
+    )
+    assert new["head"] == old["head"], f"{name}: head metadata differs"
+
+
+if __name__ == "__main__":
+    print(f"Parser backend: {html_parser.PARSER}\n")
+    if len(sys.argv) > 1:
+        corpus = list(load_corpus(sys.argv[1:]))
+    else:
+        rng = random.Random(7)
+        corpus = [
+            ("article (20 sections, 5 wrappers)", synthetic_page(rng, 20, 5, 5)),
+            ("long article (200 sections)", synthetic_page(rng, 200, 5, 5)),
+            ("deeply nested SPA (60 wrappers)", synthetic_page(rng, 100, 60, 5)),
+            ("large form (300 inputs)", synthetic_page(rng, 10, 5, 300)),
+        ]
+    for name, html in corpus:
+        run(name, html)
@@ -1,5 +1,7 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from dotenv import load_dotenv
 import os
 
@@ -7,6 +9,13 @@ load_dotenv()
 
 DATABASE_URL = os.getenv("DATABASE_URL")
 
+# Pool sizing for the async engine (per worker process)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "30"))
+
+# Sync engine: scripts, migrations and code that still runs in worker threads
 engine = create_engine(
     DATABASE_URL,
     pool_pre_ping=True,
@@ -17,4 +26,53 @@ SessionLocal = sessionmaker(
     bind=engine,
     autocommit=False,
     autoflush=False,
-)
\ No newline at end of file
+)
+
+
+def _asyncpg_url(url: str):
+    """
+    postgresql[+driver]://... -> postgresql+asyncpg://...
+
+    asyncpg doesn't understand libpq query params like `sslmode`/`channel_binding`,
+    so they are stripped and translated into connect_args.
+    """
+    parsed = make_url(url)
+    query = dict(parsed.query)
+    sslmode = query.pop("sslmode", None)
+    query.pop("channel_binding", None)
+
+    connect_args = {}
+    if sslmode and sslmode != "disable":
+        connect_args["ssl"] = "require" if sslmode in ("require", "prefer", "allow") else True
+
+    return parsed.set(drivername="postgresql+asyncpg", query=query), connect_args
+
+
+_async_url, _async_connect_args = _asyncpg_url(DATABASE_URL)
+
+# Async engine: used by every async FastAPI handler so queries never block the event loop
+async_engine = create_async_engine(
+    _async_url,
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_recycle=DB_POOL_RECYCLE,
+    pool_timeout=DB_POOL_TIMEOUT,
+    pool_pre_ping=True,
+    connect_args=_async_connect_args,
+)
+
+
+@event.listens_for(async_engine.sync_engine, "connect")
+def _register_vector(dbapi_connection, connection_record):
+    # pgvector codec for asyncpg so Vector columns round-trip as lists
+    from pgvector.asyncpg import register_vector
+    dbapi_connection.run_async(register_vector)
+
+
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine,
+    class_=AsyncSession,
+    autoflush=False,
+    # Keep ORM objects readable after commit without a lazy (sync) refresh
+    expire_on_commit=False,
+)
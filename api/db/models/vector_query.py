@@ -20,4 +20,8 @@ class QueryHistory(Base):
     response = Column(Text, nullable=False)
     response_embedding = Column(Vector(1536), nullable=False)
 
+    # Semantic cache scope: answering model + fingerprint of the page the answer used
+    model = Column(Text)
+    context_fingerprint = Column(Text)
+
     created_at = Column(TIMESTAMP, server_default=func.now())
\ No newline at end of file
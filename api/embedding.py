@@ -1,14 +1,29 @@
 from langchain_openai import OpenAIEmbeddings
 from langchain_ollama import OllamaEmbeddings
 import os
+import asyncio
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import AsyncIterator, Optional
 from dotenv import load_dotenv
 
+from utils.lru_cache import LRUCache
+
 load_dotenv()
 
 # Global instances initialized only if needed or when possible
 _openai_embeddings = None
 _ollama_embeddings = None
 
+# Query embedding memoization:
+# - request scope: every consumer in one chat turn shares one vector per distinct text
+# - short-TTL process cache: repeated/retried prompts across requests
+# - in-flight map: concurrent callers for the same text await a single provider call
+QUERY_EMBEDDING_TTL = float(os.getenv("QUERY_EMBEDDING_TTL", "120"))
+_query_embedding_cache = LRUCache(max_items=2048, ttl=QUERY_EMBEDDING_TTL)
+_request_embeddings: ContextVar[Optional[dict]] = ContextVar("request_embeddings", default=None)
+_inflight_embeddings: dict[str, asyncio.Future] = {}
+
 def get_openai_embeddings():
     """
     Retrieves the global OpenAIEmbeddings instance, initializing it if necessary.
@@ -53,28 +68,14 @@ def ensure_1536_dimensions(vector: list[float]) -> list[float]:
         return vector[:1536]
     return vector
 
-async def embed_text(text: str) -> list[float]:
-    """
-    Generate an embedding vector for the provided text with automatic provider fallback.
-    
-    Workflow:
-    1. Attempts to use OpenAI (text-embedding-3-small).
-    2. If OpenAI fails or key is missing, falls back to local Ollama (nomic-embed-text).
-    3. Always ensures the resulting vector is 1536 dimensions.
-    4. Returns a zero-vector of 1536 dimensions if all providers fail or text is empty.
-    
-    Expects: Input text string.
-    Returns: A list of 1536 floating point numbers.
-    """
-    if not text:
-        return [0.0] * 1536
-
+async def _embed_text_uncached(text: str) -> tuple[list[float], bool]:
+    """Returns (vector, ok); ok is False when the zero-vector fallback was used."""
     # 1. Try OpenAI first (Cloud-based, higher quality)
     embeddings = get_openai_embeddings()
     if embeddings:
         try:
             vec = await embeddings.aembed_query(text)
-            return ensure_1536_dimensions(vec) # Always anchor just in case
+            return ensure_1536_dimensions(vec), True # Always anchor just in case
         except Exception as e:
             print(f"⚠️ OpenAI embedding failed, falling back to Ollama: {e}")
     
@@ -82,7 +83,76 @@ async def embed_text(text: str) -> list[float]:
     try:
         ollama = get_ollama_embeddings()
         vec = await ollama.aembed_query(text)
-        return ensure_1536_dimensions(vec)
+        return ensure_1536_dimensions(vec), True
     except Exception as ollama_err:
         print(f"❌ Ollama embedding also failed: {ollama_err}")
-        return [0.0] * 1536
\ No newline at end of file
+        return [0.0] * 1536, False
+
+async def embed_text(text: str) -> list[float]:
+    """
+    Generate an embedding vector for the provided text with automatic provider fallback.
+    
+    Workflow:
+    1. Reuses the vector if this text was already embedded in the current request
+       scope or within QUERY_EMBEDDING_TTL seconds (concurrent callers share one call).
+    2. Attempts to use OpenAI (text-embedding-3-small).
+    3. If OpenAI fails or key is missing, falls back to local Ollama (nomic-embed-text).
+    4. Always ensures the resulting vector is 1536 dimensions.
+    5. Returns a zero-vector of 1536 dimensions if all providers fail or text is empty.
+    
+    Expects: Input text string.
+    Returns: A list of 1536 floating point numbers.
+    """
+    if not text:
+        return [0.0] * 1536
+
+    request_memo = _request_embeddings.get()
+    if request_memo is not None and text in request_memo:
+        return request_memo[text]
+
+    vec = _query_embedding_cache.get(text)
+    if vec is None:
+        pending = _inflight_embeddings.get(text)
+        if pending is not None:
+            vec = await asyncio.shield(pending)
+        else:
+            future = asyncio.get_running_loop().create_future()
+            _inflight_embeddings[text] = future
+            try:
+                vec, ok = await _embed_text_uncached(text)
+                if ok:
+                    _query_embedding_cache.set(text, vec)
+                future.set_result(vec)
+            except BaseException as e:
+                future.set_exception(e)
+                # Mark retrieved so an unawaited failure doesn't log a warning
+                future.exception()
+                raise
+            finally:
+                _inflight_embeddings.pop(text, None)
+
+    if request_memo is not None:
+        request_memo[text] = vec
+    return vec
+
+@contextmanager
+def query_embedding_scope():
+    """
+    Opens a per-request embedding memo. Tasks spawned inside the scope inherit it,
+    so retrieval, memory lookups and semantic cache checks for one turn share vectors.
+    """
+    token = _request_embeddings.set({})
+    try:
+        yield
+    finally:
+        try:
+            _request_embeddings.reset(token)
+        except ValueError:
+            # Streaming generator finalised from another context (client disconnect)
+            _request_embeddings.set(None)
+
+async def with_query_embedding_scope(frames: AsyncIterator) -> AsyncIterator:
+    """Wraps an SSE generator so its whole turn runs inside one query_embedding_scope."""
+    with query_embedding_scope():
+        async for frame in frames:
+            yield frame
@@ -0,0 +1,116 @@
+"""
+Offline evaluation of the local intent router against logged LLM planner decisions.
+
+Collect decisions by running the API with PLANNER_DECISION_LOG=planner_decisions.jsonl,
+then:
+
+    python eval_router.py planner_decisions.jsonl                 # rules only
+    python eval_router.py planner_decisions.jsonl --train          # rules + NB (80/20 split)
+    python eval_router.py planner_decisions.jsonl --save-model intent_router_model.json
+
+Reports per-head agreement with the LLM, coverage (share of turns the router would
+answer alone at the threshold), agreement on that covered subset, and routing latency.
+"""
+import sys
+import time
+import random
+import argparse
+
+from utils.intent_router import (
+    IntentRouter,
+    NaiveBayesRouter,
+    INTENT_ROUTER_THRESHOLD,
+    BINARY_HEADS,
+    load_planner_decisions,
+)
+
+
+def expected(record: dict) -> dict:
+    return {
+        "intent": (record.get("classification") or {}).get("primary_intent"),
+        **{head: bool(record.get(head)) for head in BINARY_HEADS},
+    }
+
+
+def predicted(decision) -> dict:
+    return {
+        "intent": decision.classification["primary_intent"],
+        "needs_context": decision.needs_context,
+        "needs_actions": decision.needs_actions,
+        "needs_video": decision.needs_video,
+    }
+
+
+def evaluate(router: IntentRouter, records: list[dict], threshold: float) -> dict:
+    heads = ("intent", *BINARY_HEADS)
+    agree = {head: 0 for head in heads}
+    covered = 0
+    covered_exact = 0
+    elapsed = 0.0
+
+    for record in records:
+        start = time.perf_counter()
+        decision = router.route(record.get("question") or "", has_video=bool(record.get("has_video")))
+        elapsed += time.perf_counter() - start
+
+        want, got = expected(record), predicted(decision)
+        matches = {head: want[head] == got[head] for head in heads}
+        for head in heads:
+            agree[head] += matches[head]
+
+        if decision.confidence >= threshold:
+            covered += 1
+            covered_exact += all(matches.values())
+
+    n = max(len(records), 1)
+    return {
+        "n": len(records),
+        "agreement": {head: agree[head] / n for head in heads},
+        "coverage": covered / n,
+        "covered_agreement": covered_exact / covered if covered else None,
+        "us_per_query": elapsed / n * 1e6,
+    }
+
+
+def print_report(title: str, report: dict):
+    print(f"\n=== {title} ({report['n']} turns) ===")
+    for head, rate in report["agreement"].items():
+        print(f"  {head:<14} agreement: {rate:6.1%}")
+    print(f"  coverage @ threshold: {report['coverage']:6.1%}")
+    if report["covered_agreement"] is not None:
+        print(f"  exact agreement on covered turns: {report['covered_agreement']:6.1%}")
+    print(f"  latency: {report['us_per_query']:.1f} µs/query")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("log", help="JSONL file written via PLANNER_DECISION_LOG")
+    parser.add_argument("--threshold", type=float, default=INTENT_ROUTER_THRESHOLD)
+    parser.add_argument("--train", action="store_true", help="also evaluate rules + naive Bayes on a holdout split")
+    parser.add_argument("--test-fraction", type=float, default=0.2)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--save-model", help="train on the full log and write the model here")
+    args = parser.parse_args()
+
+    records = load_planner_decisions(args.log)
+    if not records:
+        print(f"❌ No planner decisions in {args.log}")
+        sys.exit(1)
+
+    random.Random(args.seed).shuffle(records)
+    split = int(len(records) * (1 - args.test_fraction))
+    train, test = records[:split], records[split:] or records
+
+    print_report("rules only (holdout)", evaluate(IntentRouter(), test, args.threshold))
+
+    if args.train:
+        model = NaiveBayesRouter.train(train)
+        print_report("rules + naive Bayes (holdout)", evaluate(IntentRouter(model), test, args.threshold))
+
+    if args.save_model:
+        NaiveBayesRouter.train(records).save(args.save_model)
+        print(f"\n✅ Saved model trained on {len(records)} turns to {args.save_model}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,14 @@
 # html_parser.py
-from bs4 import BeautifulSoup, NavigableString
+from bs4 import BeautifulSoup, NavigableString, CData
 import re
 
+# lxml builds the tree several times faster than html.parser; optional
+try:
+    import lxml  # noqa: F401
+    PARSER = "lxml"
+except ImportError:
+    PARSER = "html.parser"
+
 REMOVE_TAGS = {
     "script", "style", "noscript",
     "svg", "canvas", "iframe",
@@ -16,17 +23,31 @@ BLOCK_TAGS = {
     "h1", "h2", "h3", "h4"
 }
 
+# Blocks shorter than this are carried into the next block instead of standing alone
+MIN_BLOCK_CHARS = 40
+
+_TEXT_TYPES = (NavigableString, CData)
+
+
+def _inside_removed(el) -> bool:
+    return any(parent.name in REMOVE_TAGS for parent in el.parents)
+
+
+def _first_visible(elements):
+    return next((el for el in elements if not _inside_removed(el)), None)
+
 def extract_readable_page(html: str) -> dict:
     """
     Parses raw HTML and extracts the most relevant readable content and metadata.
     
     This function:
-    1. Parses the HTML using BeautifulSoup.
+    1. Parses the HTML using BeautifulSoup (lxml when installed).
     2. Extracts metadata (title, description, canonical URL) from the <head>.
-    3. Removes non-content tags (scripts, styles, nav, footer, etc.).
-    4. Identifies the main content area (using <main>, <article>, or <body>).
-    5. Extracts text from block-level tags (p, div, h1-h4, etc.) and interactive element hints.
-    6. Deduplicates and cleans the extracted text.
+    3. Identifies the main content area (using <main>, <article>, or <body>).
+    4. Walks it once, skipping non-content tags (scripts, styles, nav, footer, etc.)
+       and emitting the text of the innermost block-level tags (p, div, h1-h4, etc.)
+       plus interactive element hints. Linear in document size.
+    5. Deduplicates and cleans the extracted text.
     
     Args:
         html: The raw HTML string to parse.
@@ -38,7 +59,7 @@ def extract_readable_page(html: str) -> dict:
             - word_count: Total words in content.
             - char_count: Total characters in content.
     """
-    soup = BeautifulSoup(html, "html.parser")
+    soup = BeautifulSoup(html, PARSER)
 
     # -------------------------
     # HEAD EXTRACTION (Metadata)
@@ -52,7 +73,7 @@ def extract_readable_page(html: str) -> dict:
         return tag["content"].strip() if tag and tag.get("content") else None
 
     head = {
-        "title": soup.title.string.strip() if soup.title else None,
+        "title": soup.title.string.strip() if soup.title and soup.title.string else None,
         "description": meta(name="description") or meta(prop="og:description"),
         "og_title": meta(prop="og:title"),
         "canonical": (
@@ -62,18 +83,12 @@ def extract_readable_page(html: str) -> dict:
         ),
     }
 
-    # -------------------------
-    # BODY CLEANUP (Noise Removal)
-    # -------------------------
-    # Remove tags that usually don't contain primary content or are for presentation/logic.
-    for tag in soup.find_all(REMOVE_TAGS):
-        tag.decompose()
-
-    # Look for the most likely main content container.
+    # Look for the most likely main content container (outside nav/header/aside noise,
+    # which the walk below skips rather than deleting from the tree).
     main = (
-        soup.find("main")
-        or soup.find("article")
-        or soup.find(attrs={"role": "main"})
+        _first_visible(soup.find_all("main"))
+        or _first_visible(soup.find_all("article"))
+        or _first_visible(soup.find_all(attrs={"role": "main"}))
         or soup.body
     )
 
@@ -85,35 +100,75 @@ def extract_readable_page(html: str) -> dict:
             "char_count": 0
         }
 
-    blocks = []
-
     # -------------------------
-    # CONTENT EXTRACTION (Block Analysis)
+    # CONTENT EXTRACTION (Single Pass)
     # -------------------------
-    for el in main.descendants:
-        # Extract text from meaningful block tags
-        if el.name in BLOCK_TAGS:
-            text = " ".join(el.stripped_strings)
-            # Only keep blocks with significant text content
-            if len(text) > 40:
-                blocks.append(text)
-
-        # Extract hints for form elements (useful for agentic interaction)
-        if el.name == "input":
-            label = None
-            if el.get("id"):
-                l = soup.find("label", attrs={"for": el["id"]})
-                label = l.get_text(strip=True) if l else None
-
-            # Prefer label over placeholder as a functional hint
-            hint = label or el.get("placeholder")
-            if hint:
-                blocks.append(f"[Input] {hint}")
-
-        # Textareas often contain search boxes or comment fields
-        if el.name == "textarea" and el.get("placeholder"):
+    # Text runs are flushed at every block boundary, so each piece of text lands in
+    # exactly one block (its innermost one) instead of once per enclosing div.
+    blocks = []
+    inputs = []      # (index in blocks, id, placeholder), resolved once labels are indexed
+    buffer = []
+
+    def flush(force=False):
+        text = " ".join(buffer)
+        if len(text) > MIN_BLOCK_CHARS or (force and text):
+            blocks.append(text)
+            buffer.clear()
+
+    # (children iterator, whether leaving it closes a block)
+    stack = [(iter(main.contents), False)]
+    while stack:
+        children, in_block = stack[-1]
+        el = next(children, None)
+        if el is None:
+            stack.pop()
+            if in_block:
+                flush()
+            continue
+
+        if isinstance(el, NavigableString):
+            # Same strings as `stripped_strings` (no comments, doctypes, templates)
+            if type(el) in _TEXT_TYPES:
+                text = el.strip()
+                if text:
+                    buffer.append(text)
+            continue
+
+        name = el.name
+        if name in REMOVE_TAGS:
+            continue
+
+        # Hints for form elements (useful for agentic interaction)
+        if name == "input":
+            flush(force=True)
+            inputs.append((len(blocks), el.get("id"), el.get("placeholder")))
+            blocks.append(None)
+        elif name == "textarea" and el.get("placeholder"):
+            flush(force=True)
             blocks.append(f"[Textarea] {el['placeholder']}")
 
+        is_block = name in BLOCK_TAGS
+        if is_block:
+            flush()
+        if el.contents:
+            stack.append((iter(el.contents), is_block))
+
+    flush(force=True)
+
+    # label[for] index: one pass instead of a document-wide search per input
+    labels = {}
+    if inputs:
+        for label in soup.find_all("label", attrs={"for": True}):
+            if not _inside_removed(label):
+                labels.setdefault(label["for"], label)
+
+    for index, input_id, placeholder in inputs:
+        label = labels.get(input_id) if input_id else None
+        # Prefer label over placeholder as a functional hint
+        hint = (label.get_text(strip=True) if label else None) or placeholder
+        blocks[index] = f"[Input] {hint}" if hint else None
+    blocks = [block for block in blocks if block]
+
     # Deduplicate extracted blocks (preserves order of first occurrence)
     content = "\n\n".join(dict.fromkeys(blocks))
     # Normalize excessive spacing
@@ -3,7 +3,7 @@
 
 import json
 import asyncio
-from typing import Optional, TypedDict, List, Any
+from typing import Optional, TypedDict, List, Any, Union
 from sqlalchemy import select
 from bs4 import BeautifulSoup
 from fastapi import FastAPI, Depends, HTTPException, Header, BackgroundTasks
@@ -14,22 +14,26 @@ from db.models.vector_query import QueryHistory
 from pydantic import BaseModel, Field
 import os
 import io
-import tempfile
-from fastapi.responses import FileResponse, StreamingResponse
-from snapshot import (
-    capture_page, 
-    get_markdown, 
-    generate_special_format, 
-    generate_smart_pdf, 
-    generate_word_doc,
-    generate_markdown_report
+import sys
+from fastapi.responses import FileResponse, StreamingResponse, RedirectResponse, JSONResponse
+from snapshot_jobs import (
+    snapshot_queue,
+    enqueue_snapshot,
+    status_view,
+    remove_job_files,
+    download_filename,
+    InvalidSnapshotFormat,
+    PREVIEW_MEDIA_TYPES,
+    SNAPSHOT_PRESIGN_EXPIRY,
+    SNAPSHOT_LEASE_SECONDS
 )
+from utils.job_queue import QUEUED, COMPLETED, ERROR
 
-from langgraph.graph import StateGraph, END
-from jose import JWTError, jwt
-from datetime import datetime, timedelta
-from fastapi import Response, BackgroundTasks
-import uuid
+from langgraph.graph import StateGraph, START, END
+from langchain_core.runnables import RunnableConfig
+from datetime import datetime
+from fastapi import Response, BackgroundTasks, Cookie, Request
+from fastapi.routing import APIRoute
 
 # =============================
 # IMPORT CHAINS
@@ -48,6 +52,7 @@ from runnable import (
     extract_youtube_url,
     get_youtube_transcript,
     action_intent_chain,
+    turn_planner_chain,
     rewrite_chain,
     dom_customization_chain,
     micro_manifest_chain,
@@ -60,12 +65,30 @@ from agent_graph import agent_runnable
 from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
 
 from html_parser import extract_readable_page
-from sync_schemas import SECRET_KEY, ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES
+from sync_schemas import ACCESS_TOKEN_EXPIRE_MINUTES
+from utils.auth import auth_service, create_access_token
 from utils.vector_store import vector_store
-from langchain_text_splitters import RecursiveCharacterTextSplitter
+from utils.intent_router import intent_router, log_planner_decision
+from utils.semantic_cache import semantic_cache, CacheScope
+from utils.storage import storage, LocalStorageBackend
+from utils.flat_dom import (
+    FlatDomView,
+    is_flat_dom,
+    is_msgpack,
+    decode_msgpack,
+    MSGPACK_MAX_BODY_MB,
+    TEXT_TAG
+)
+from utils.page_state import (
+    page_states,
+    page_key,
+    PageStateError,
+    UnknownPageState,
+    VersionConflict
+)
 
 
-from embedding import embed_text
+from embedding import embed_text, with_query_embedding_scope
 
 # ======================================================
 # GRAPH STATE - Defines the shared data structure for LangGraph nodes
@@ -108,6 +131,7 @@ class GenerateRequest(BaseModel):
     prompt: str                                          # User query
     image_url: Optional[str] = Field(None, alias="imageUrl") # Vision input
     context: Optional[Any] = None                        # Raw DOM context fallback
+    context_ref: Optional[str] = Field(None, alias="contextRef") # Page state from /context/state (instead of context)
     current_url: Optional[str] = Field(None, alias="currentUrl") # Active tab URL
     conversation_id: Optional[int] = Field(None, alias="conversationId") # SQL DB key
     user_id: Optional[str] = Field(None, alias="userId") # Auth identifier
@@ -135,7 +159,7 @@ class SnapshotRequest(BaseModel):
 # GRAPH NODES - Logic steps executed in the background
 # ======================================================
 
-def video_analyzer(state: AgentState):
+async def video_analyzer(state: AgentState, config: RunnableConfig):
     """
     Node: Analyzes if a YouTube video is involved and needs transcription.
     Triggers: `video_context_analyzer_chain` in runnable.py
@@ -144,28 +168,26 @@ def video_analyzer(state: AgentState):
     current_url = state.get("current_url") or ""
     yt = extract_youtube_url(current_url)
     
-    classification = state.get("classification", {})
-    primary_intent = classification.get("primary_intent", "")
-    
-    # Skip LLM if no video detected and not a video intent
-    if not yt and primary_intent != "video":
+    # Skip LLM if no video detected (nothing to transcribe without a YouTube URL).
+    # Runs in parallel with `classify`, so it can't wait on the classification.
+    if not yt:
         return {
             "needs_video": False,
             "youtube_url": None
         }
 
     # Calls LLM to decide if transcript is actually needed for the specific question
-    result = video_context_analyzer_chain.invoke({
+    result = await video_context_analyzer_chain.ainvoke({
         "question": state["question"],
-        "has_videos": "true" if yt else "false"
-    })
+        "has_videos": "true"
+    }, config=config)
     return {
         "needs_video": result.get("needs_video_context", False),
         "youtube_url": yt
     }
 
 
-def page_context_analyzer(state: AgentState):
+async def page_context_analyzer(state: AgentState, config: RunnableConfig):
     """
     Node: Detects if the user query refers to the content of the active tab.
     Triggers: `context_analyzer_chain` in runnable.py
@@ -176,31 +198,31 @@ def page_context_analyzer(state: AgentState):
         return {"needs_context": True}
 
     # Asks LLM if question requires scraping/reading the page
-    result = context_analyzer_chain.invoke({
+    result = await context_analyzer_chain.ainvoke({
         "question": state["question"]
-    })
+    }, config=config)
     return {
         "needs_context": result.get("needs_context", False)
     }
 
 
-def action_intent_analyzer(state: AgentState):
+async def action_intent_analyzer(state: AgentState, config: RunnableConfig):
     """
     Node: Categorizes if the request requires browser automation (clicks, navigation).
     Triggers: `action_intent_chain` in runnable.py
     Expects: `question`, `raw_html`, `current_url`
     """
-    result = action_intent_chain.invoke({
+    result = await action_intent_chain.ainvoke({
         "question": state["question"],
         "has_context": "true" if state.get("raw_html") else "false",
         "current_url": state.get("current_url") or ""
-    })
+    }, config=config)
     return {
         "needs_actions": result.get("needs_actions", False)
     }
 
 
-def intent_classifier(state: AgentState):
+async def intent_classifier(state: AgentState, config: RunnableConfig):
     """
     Node: Primary classifier that determines the general intent (shopping, info, tutorial).
     Triggers: `classifier_chain` in runnable.py
@@ -208,13 +230,13 @@ def intent_classifier(state: AgentState):
     Returns: `classification` dict containing rich content requirements.
     """
     return {
-        "classification": classifier_chain.invoke({
+        "classification": await classifier_chain.ainvoke({
             "question": state["question"]
-        })
+        }, config=config)
     }
 
 
-def transcribe_video(state: AgentState):
+async def transcribe_video(state: AgentState):
     """
     Node: Downloads and transcribes YouTube audio if required.
     Triggers: `get_youtube_transcript` in runnable.py (External API: AssemblyAI)
@@ -223,7 +245,9 @@ def transcribe_video(state: AgentState):
     if not state.get("needs_video") or not state.get("youtube_url"):
         return {"video_transcripts": []} 
 
-    transcript = get_youtube_transcript(
+    # Download + transcription is blocking I/O; keep it off the event loop
+    transcript = await asyncio.to_thread(
+        get_youtube_transcript,
         state["youtube_url"]
     )
 
@@ -236,7 +260,7 @@ def transcribe_video(state: AgentState):
 def parse_html(state: AgentState):
     """
     Node: Sanitizes and truncates raw DOM trees into LLM-friendly text.
-    Triggers: `extract_clean_text_from_dom` and `RecursiveCharacterTextSplitter`.
+    Triggers: `pack_context` (streams `iter_dom_text` up to the token budget).
     Expects: `raw_html` (dict from extractDOMTree or string).
     Returns: `page_context` with head metadata and limited body content.
     """
@@ -248,19 +272,12 @@ def parse_html(state: AgentState):
     
     # Logic Step: Handle pre-structured DOM tree from extension
     if isinstance(raw, dict):
-        from utils.text_processing import extract_clean_text_from_dom, limit_context
+        from utils.context_packer import pack_context, CONTEXT_PROMPT_TOKEN_BUDGET
         
-        # 1. Extract clean text (Try direct textContent first, then traverse DOM)
-        content = raw.get("textContent") or raw.get("content")
+        # 1-2. Clean text (textContent first, else the DOM tree), packed to the prompt's
+        # token budget; extraction stops once the budget is full
         dom_tree = raw.get("domTree")
-        
-        if not content:
-            content = extract_clean_text_from_dom(dom_tree)
-        
-        # 2. Token Limit: Split and keep only the first 20 chunks (~10k chars) to avoid LLM context overflow
-        text_splitter = RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=100)
-        chunks = text_splitter.split_text(content)
-        content = "\n\n".join(chunks[:20])
+        content = pack_context(raw, CONTEXT_PROMPT_TOKEN_BUDGET, query=state.get("question"))
         
         # Metadata extraction for the prompt
         title = raw.get("title") or ""
@@ -338,36 +355,177 @@ graph.add_node("transcribe", transcribe_video)
 graph.add_node("parse_html", parse_html)
 graph.add_node("decide", decide_agent_mode)
 
-graph.set_entry_point("classify")
-
-graph.add_edge("classify", "video_analyze")
-graph.add_edge("classify", "page_analyze")
-graph.add_edge("classify", "action_analyze")
-
-graph.add_conditional_edges(
-    "video_analyze",
-    lambda state: "transcribe" if state.get("needs_video") and state.get("youtube_url") else "decide",
-    {
-        "transcribe": "transcribe",
-        "decide": "decide"
-    }
-)
+# All analyzers are independent LLM calls: fan out from START so planning costs
+# one LLM round trip instead of classify -> analyzers.
+graph.add_edge(START, "classify")
+graph.add_edge(START, "video_analyze")
+graph.add_edge(START, "page_analyze")
+graph.add_edge(START, "action_analyze")
 
-graph.add_edge("transcribe", "decide")
+# transcribe / parse_html are no-ops when their analyzer said they aren't needed,
+# which keeps every branch the same length so `decide` joins exactly once.
+graph.add_edge("video_analyze", "transcribe")
 graph.add_edge("page_analyze", "parse_html")
-graph.add_edge("parse_html", "decide")
-graph.add_edge("action_analyze", "decide")
+
+graph.add_edge(["classify", "action_analyze", "transcribe", "parse_html"], "decide")
 
 graph.add_edge("decide", END)
 
 app_graph = graph.compile()
 
 
+# ======================================================
+# FUSED TURN PLANNER - one LLM call instead of the four analyzer nodes
+# ======================================================
+
+AGENT_PLANNER_MODE = os.getenv("AGENT_PLANNER_MODE", "fused").lower()  # "fused" | "graph"
+
+
+class PlannerOutputError(Exception):
+    """Fused planner call failed or returned incomplete JSON; caller falls back to `app_graph`."""
+
+
+async def turn_planner(state: AgentState, config: RunnableConfig):
+    """
+    Node: Produces classification, needs_context, needs_actions and needs_video together.
+    Triggers: `turn_planner_chain` in runnable.py
+    Expects: `question`, `raw_html`, `current_url`
+    """
+    yt = extract_youtube_url(state.get("current_url") or "")
+
+    try:
+        result = await turn_planner_chain.ainvoke({
+            "question": state["question"],
+            "has_context": "true" if state.get("raw_html") else "false",
+            "current_url": state.get("current_url") or "",
+            "has_videos": "true" if yt else "false"
+        }, config=config)
+    except Exception as e:
+        raise PlannerOutputError(str(e)) from e
+
+    if not isinstance(result, dict) or not isinstance(result.get("classification"), dict):
+        raise PlannerOutputError(f"missing classification in {result!r}")
+    missing = [k for k in ("needs_context", "needs_actions", "needs_video") if k not in result]
+    if missing:
+        raise PlannerOutputError(f"missing {missing} in {result!r}")
+
+    return {
+        "classification": result["classification"],
+        "needs_context": bool(state.get("page_context")) or bool(result["needs_context"]),
+        "needs_actions": bool(result["needs_actions"]),
+        "needs_video": bool(yt) and bool(result["needs_video"]),
+        "youtube_url": yt
+    }
+
+
+planner_graph = StateGraph(AgentState)
+
+planner_graph.add_node("plan", turn_planner)
+planner_graph.add_node("transcribe", transcribe_video)
+planner_graph.add_node("parse_html", parse_html)
+planner_graph.add_node("decide", decide_agent_mode)
+
+planner_graph.add_edge(START, "plan")
+planner_graph.add_edge("plan", "transcribe")
+planner_graph.add_edge("plan", "parse_html")
+planner_graph.add_edge(["transcribe", "parse_html"], "decide")
+planner_graph.add_edge("decide", END)
+
+fused_app_graph = planner_graph.compile()
+
+
+# Local router hit: flags are already in the input state, only fetch/parse/decide run.
+routed_graph = StateGraph(AgentState)
+
+routed_graph.add_node("transcribe", transcribe_video)
+routed_graph.add_node("parse_html", parse_html)
+routed_graph.add_node("decide", decide_agent_mode)
+
+routed_graph.add_edge(START, "transcribe")
+routed_graph.add_edge(START, "parse_html")
+routed_graph.add_edge(["transcribe", "parse_html"], "decide")
+routed_graph.add_edge("decide", END)
+
+routed_app_graph = routed_graph.compile()
+
+
+async def plan_turn(state: AgentState, config: Optional[RunnableConfig] = None) -> dict:
+    """
+    Runs turn planning. Obvious queries are decided by the local `intent_router`
+    without any LLM call; otherwise the graph selected by AGENT_PLANNER_MODE runs.
+    The per-node `app_graph` is used directly in "graph" mode and as the
+    fallback whenever the fused planner call fails.
+    """
+    youtube_url = extract_youtube_url(state.get("current_url") or "")
+    decision = intent_router.route(state["question"], has_video=bool(youtube_url))
+
+    if intent_router.confident(decision):
+        print(f"⚡ Local router decided turn (confidence {decision.confidence:.2f})")
+        return await routed_app_graph.ainvoke({
+            **state,
+            "classification": decision.classification,
+            "needs_context": bool(state.get("page_context")) or decision.needs_context,
+            "needs_actions": decision.needs_actions,
+            "needs_video": decision.needs_video,
+            "youtube_url": youtube_url,
+        }, config=config)
+
+    result = None
+    source = "graph"
+    if AGENT_PLANNER_MODE == "fused":
+        try:
+            result = await fused_app_graph.ainvoke(state, config=config)
+            source = "fused"
+        except PlannerOutputError as e:
+            print(f"⚠️ Fused planner failed, falling back to per-node graph: {e}")
+
+    if result is None:
+        result = await app_graph.ainvoke(state, config=config)
+
+    await asyncio.to_thread(log_planner_decision, state["question"], bool(youtube_url), result, source)
+    return result
+
+
 # ======================================================
 # FASTAPI APP
 # ======================================================
 
+class MsgPackRoute(APIRoute):
+    """
+    Accepts MessagePack request bodies (Content-Type: application/msgpack) on any
+    JSON endpoint. The body is decoded once and handed to FastAPI as the
+    request's parsed JSON, so models validate the same Python objects.
+    """
+
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+
+        async def route_handler(request: Request):
+            if not is_msgpack(request.headers.get("content-type")):
+                return await handler(request)
+
+            body = await request.body()
+            if len(body) > MSGPACK_MAX_BODY_MB * 1024 * 1024:
+                return JSONResponse(status_code=413, content={"detail": "Request body too large"})
+            try:
+                decoded = await asyncio.to_thread(decode_msgpack, body)
+            except Exception as e:
+                return JSONResponse(status_code=400, content={"detail": f"Invalid MessagePack body: {e}"})
+
+            scope = dict(request.scope)
+            scope["headers"] = [
+                (k, v) for k, v in request.scope["headers"] if k != b"content-type"
+            ] + [(b"content-type", b"application/json")]
+            decoded_request = Request(scope, request.receive)
+            decoded_request._body = body
+            decoded_request._json = decoded
+            return await handler(decoded_request)
+
+        return route_handler
+
+
 app = FastAPI(title="Context-Aware AI API")
+app.router.route_class = MsgPackRoute
 
 app.add_middleware(
     CORSMiddleware,
@@ -376,12 +534,86 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+if isinstance(storage, LocalStorageBackend):
+    # Offline stand-in for R2: serve stored objects directly
+    from fastapi.staticfiles import StaticFiles
+    app.mount("/storage", StaticFiles(directory=storage.root), name="storage")
+
+@app.on_event("shutdown")
+async def close_vector_index():
+    # Release the pooled vector index connections
+    if vector_store.index is not None:
+        await vector_store.index.aclose()
+
 class ContextRequest(BaseModel):
     url: str
     title: Optional[str] = None
     raw_html: Optional[dict] = None  # domTree
+    context_ref: Optional[str] = None  # Page state from /context/state (instead of raw_html)
     conversation_id: Optional[int] = None
 
+
+class PageStateRequest(BaseModel):
+    url: str
+    tab_id: Optional[int] = None
+    raw_html: dict  # Full extractDOMTree payload
+
+
+class PageDeltaRequest(BaseModel):
+    ref: str
+    base_version: int
+    ops: List[dict] = []        # Node-level patches on domTree (see utils/page_state.apply_op)
+    fields: dict = {}           # Top-level payload fields (title, textContent, ...)
+
+
+# SSE frame telling the extension to re-upload the page (its context_ref expired or was pruned)
+UNKNOWN_CONTEXT_REF_FRAME = json.dumps({
+    "type": "error", "code": "unknown_context_ref", "data": "Unknown context_ref"
+}) + "\n\n"
+
+
+async def resolve_context_ref(user_id: str, ref: Optional[str]) -> Optional[dict]:
+    """Page payload for a context_ref, or None if the ref is unknown or expired."""
+    if not ref:
+        return None
+    state = await page_states.aget(user_id, ref)
+    if state is None:
+        print(f"⚠️ Unknown or expired context_ref {ref}")
+        return None
+    return state.payload
+
+
+@app.post("/context/state")
+async def put_page_state(req: PageStateRequest, authorization: Optional[str] = Header(None)):
+    """
+    Endpoint: Upload the full extracted page once per tab/URL.
+    Returns a `ref` for /context/delta and for `contextRef` on chat requests.
+    """
+    user = await get_user_from_token(authorization)
+    state = await page_states.aput(str(user.id), page_key(req.url, req.tab_id), req.raw_html)
+    return {"status": "success", "ref": state.ref, "version": state.version}
+
+
+@app.post("/context/delta")
+async def apply_page_delta(req: PageDeltaRequest, authorization: Optional[str] = Header(None)):
+    """
+    Endpoint: Patch a stored page with node-level ops made against `base_version`.
+    409 when the server has moved on (client re-uploads via /context/state), 404 for unknown refs.
+    """
+    user = await get_user_from_token(authorization)
+    try:
+        state = await page_states.aapply(str(user.id), req.ref, req.base_version, req.ops, req.fields)
+    except UnknownPageState:
+        raise HTTPException(status_code=404, detail="Unknown page state")
+    except VersionConflict as e:
+        return JSONResponse(
+            status_code=409,
+            content={"status": "error", "message": "Version mismatch", "version": e.version}
+        )
+    except PageStateError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    return {"status": "success", "ref": state.ref, "version": state.version}
+
 @app.post("/context/save")
 async def save_context_endpoint(
     req: ContextRequest,
@@ -396,8 +628,19 @@ async def save_context_endpoint(
     """
     try:
         # Auth: Verify requester identity
-        user, _ = await get_user_from_token(authorization)
-        
+        user = await get_user_from_token(authorization)
+
+        if req.raw_html is None and req.context_ref:
+            req.raw_html = await resolve_context_ref(str(user.id), req.context_ref)
+            if req.raw_html is None:
+                return {"status": "error", "message": "Unknown context_ref"}
+
+        # Fast path: the extension sends pre-extracted textContent, so an unchanged
+        # page can be detected from its fingerprint without scheduling any work.
+        text_content = (req.raw_html or {}).get("textContent")
+        if await vector_store.is_page_unchanged(str(user.id), req.url, req.conversation_id, text_content):
+            return {"status": "success", "message": "Context unchanged", "skipped": True}
+
         # Offload the entire processing & saving to a background task
         # This allows the extension to continue without waiting for embeddings/upserts
         background_tasks.add_task(
@@ -420,13 +663,6 @@ async def save_context_endpoint(
 # AUTH FUNCTIONS
 # ======================================================
 
-def create_access_token(data: dict):
-    to_encode = data.copy()
-    expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
-    return encoded_jwt
-
 # ======================================================
 # STREAMING ENDPOINT (CORRECT SSE)
 # ======================================================
@@ -436,16 +672,12 @@ class LoginRequest(BaseModel):
     class Config:
         extra = "allow"
 
-from db.database import SessionLocal
+from db.database import AsyncSessionLocal
 from db.models.user import User
-from sqlalchemy.orm import Session
 
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db():
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
         
 @app.post("/login")
 async def user_login(req: LoginRequest, response: Response):
@@ -455,7 +687,7 @@ async def user_login(req: LoginRequest, response: Response):
     Expects: `googleToken`.
     Functions: Verifies with Google API, Upserts User in SQL DB, issues JWT.
     """
-    db = SessionLocal() 
+    db = AsyncSessionLocal()
     try:
         # Step 1: Identity Verification via Google
         async with httpx.AsyncClient() as client:
@@ -472,7 +704,9 @@ async def user_login(req: LoginRequest, response: Response):
             user_dp = user_data.get("picture")
 
         # Step 2: Database Persistence (Upsert)
-        user = db.query(User).filter(User.email == email).first()
+        user = (await db.execute(
+            select(User).where(User.email == email)
+        )).scalars().first()
         
         if not user:
             # New User registration
@@ -483,19 +717,21 @@ async def user_login(req: LoginRequest, response: Response):
                 credits=10.0 
             )
             db.add(user)
-            db.commit()
-            db.refresh(user)
+            await db.commit()
+            await db.refresh(user)
             message = "User created"
         else:
             # Existing User update (sync name/picture)
             user.name = name 
             user.user_dp = user_dp
-            db.commit()
+            await db.commit()
             message = "Logged in"
 
         # Step 3: Session Management
         # Generate our own internal JWT to avoid passing raw Google tokens in headers
-        access_token = create_access_token(data={"sub": user.email})
+        # `uid` lets every later request authenticate from the token alone (no DB lookup)
+        access_token = create_access_token(data={"sub": user.email, "uid": user.id})
+        auth_service.invalidate_user(user.id)
         
         # Set HttpOnly cookie for security (prevent XSS access to session)
         response.set_cookie(
@@ -521,11 +757,19 @@ async def user_login(req: LoginRequest, response: Response):
     except Exception as e:
         return {"status": "error", "message": str(e)}
     finally:
-        db.close()
+        await db.close()
 
 
 @app.post("/auth/logout")
-async def user_logout(response: Response):
+async def user_logout(
+    response: Response,
+    authorization: Optional[str] = Header(None),
+    session_token: Optional[str] = Cookie(None)
+):
+    # Denylist the session token(s) so they stop working before their expiry
+    await auth_service.revoke(authorization)
+    if session_token:
+        await auth_service.revoke(f"Bearer {session_token}")
     response.delete_cookie("session_token")
     return {"status": "success", "message": "Logged out"}
 
@@ -534,24 +778,18 @@ async def user_logout(response: Response):
 # DATA SYNC ENDPOINTS
 # ======================================================
 
-from sync_schemas import get_current_user, ConversationSync, NoteSync, ManifestSync, MessageCreate
+from sync_schemas import ConversationSync, NoteSync, ManifestSync, MessageCreate
 from db.models.conversation import Conversation
 from db.models.message import Message
 from db.models.note import Note
 from db.models.agent import AgentManifest
 
 async def get_user_from_token(authorization: Optional[str] = Header(None)):
-    """Get user from JWT token"""
-    email = await get_current_user(authorization)
-    db = SessionLocal()
-    try:
-        user = db.query(User).filter(User.email == email).first()
-        if not user:
-            raise HTTPException(status_code=404, detail="User not found")
-        return user, db
-    except Exception as e:
-        db.close()
-        raise e
+    """
+    Get the authenticated principal (`id`, `email`) from the JWT.
+    Served from the auth cache/claims - no database session is opened.
+    """
+    return await auth_service.authenticate(authorization)
 
 @app.post("/sync/conversations")
 async def sync_conversations(
@@ -568,15 +806,17 @@ async def sync_conversations(
 
 async def generate_conversation_title(conversation_id: int):
     """Background task to generate title for a conversation"""
-    db = SessionLocal()
+    db = AsyncSessionLocal()
     try:
         # Check if title is already set (optimization)
-        conversation = db.query(Conversation).filter(Conversation.id == conversation_id).first()
+        conversation = await db.get(Conversation, conversation_id)
         if not conversation or conversation.title:
             return
         
         # Get first message
-        message = db.query(Message).filter(Message.conversation_id == conversation_id).order_by(Message.created_at).first()
+        message = (await db.execute(
+            select(Message).where(Message.conversation_id == conversation_id).order_by(Message.created_at).limit(1)
+        )).scalars().first()
         if not message:
             return
 
@@ -590,11 +830,11 @@ async def generate_conversation_title(conversation_id: int):
             title = "New Chat"
 
         conversation.title = title
-        db.commit()
+        await db.commit()
     except Exception as e:
         print(f"Error generating title: {e}")
     finally:
-        db.close()
+        await db.close()
 
 @app.post("/conversations")
 async def create_conversation(
@@ -606,32 +846,37 @@ async def create_conversation(
     Expects: Auth Header.
     Returns: `conversation_id`.
     """
-    user, db = await get_user_from_token(authorization)
+    user = await get_user_from_token(authorization)
+    db = AsyncSessionLocal()
     try:
         conversation = Conversation(
             user_id=user.id,
         )
         db.add(conversation)
-        db.commit()
-        db.refresh(conversation)
+        await db.commit()
+        await db.refresh(conversation)
         return {"status": "success", "conversation_id": conversation.id}
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         return {"status": "error", "message": str(e)}
     finally:
-        db.close()
+        await db.close()
 
 @app.get("/conversations")
 async def get_conversations(
     authorization: Optional[str] = Header(None)
 ):
     """Get all conversations for the user (limited to 50 most recent)"""
-    user, db = await get_user_from_token(authorization)
+    user = await get_user_from_token(authorization)
+    db = AsyncSessionLocal()
     try:
         # Limit to 50 most recent conversations for faster loading
-        conversations = db.query(Conversation).filter(
-            Conversation.user_id == user.id
-        ).order_by(Conversation.updated_at.desc()).limit(50).all()
+        conversations = (await db.execute(
+            select(Conversation)
+            .where(Conversation.user_id == user.id)
+            .order_by(Conversation.updated_at.desc())
+            .limit(50)
+        )).scalars().all()
         
         return {
             "status": "success",
@@ -648,17 +893,19 @@ async def get_conversations(
     except Exception as e:
         return {"status": "error", "message": str(e)}
     finally:
-        db.close()
+        await db.close()
 
 async def add_message_task(conversation_id: int, user_id: int, message_data: MessageCreate):
     """Background task to save message and handle auto-titling"""
-    db = SessionLocal()
+    db = AsyncSessionLocal()
     try:
         # Step 1: Ownership Verification
-        conversation = db.query(Conversation).filter(
-            Conversation.id == conversation_id, 
-            Conversation.user_id == user_id
-        ).first()
+        conversation = (await db.execute(
+            select(Conversation).where(
+                Conversation.id == conversation_id,
+                Conversation.user_id == user_id
+            )
+        )).scalars().first()
         
         if not conversation:
             print(f"⚠️ Background save failed: Conversation {conversation_id} not found")
@@ -671,7 +918,7 @@ async def add_message_task(conversation_id: int, user_id: int, message_data: Mes
             ai_response=message_data.ai_response
         )
         db.add(message)
-        db.commit()
+        await db.commit()
 
         # Step 3: Progressive Enhancement
         # If the conversation is new, generate an intelligent title from the first message
@@ -680,9 +927,9 @@ async def add_message_task(conversation_id: int, user_id: int, message_data: Mes
 
     except Exception as e:
         print(f"❌ Background message save error: {e}")
-        db.rollback()
+        await db.rollback()
     finally:
-        db.close()
+        await db.close()
 
 @app.post("/conversations/{conversation_id}/messages")
 async def add_message(
@@ -697,7 +944,7 @@ async def add_message(
     Expects: `user_query`, `ai_response`.
     Logic: Saves message via BackgroundTasks to avoid blocking the response.
     """
-    user, _ = await get_user_from_token(authorization)
+    user = await get_user_from_token(authorization)
     
     # Offload to background task
     background_tasks.add_task(add_message_task, conversation_id, user.id, message_data)
@@ -711,22 +958,27 @@ async def get_conversation_messages(
     authorization: Optional[str] = Header(None)
 ):
     """Fetch all messages for a specific conversation"""
-    user, db = await get_user_from_token(authorization)
+    user = await get_user_from_token(authorization)
+    db = AsyncSessionLocal()
     
     try:
         # Verify conversation belongs to user
-        conversation = db.query(Conversation).filter(
-            Conversation.id == conversation_id,
-            Conversation.user_id == user.id
-        ).first()
+        conversation = (await db.execute(
+            select(Conversation).where(
+                Conversation.id == conversation_id,
+                Conversation.user_id == user.id
+            )
+        )).scalars().first()
         
         if not conversation:
             raise HTTPException(status_code=404, detail="Conversation not found")
         
         # Fetch messages
-        messages = db.query(Message).filter(
-            Message.conversation_id == conversation_id
-        ).order_by(Message.created_at).all()
+        messages = (await db.execute(
+            select(Message)
+            .where(Message.conversation_id == conversation_id)
+            .order_by(Message.created_at)
+        )).scalars().all()
         
         flat_messages = []
         for msg in messages:
@@ -760,7 +1012,7 @@ async def get_conversation_messages(
     except Exception as e:
         return {"status": "error", "message": str(e)}
     finally:
-        db.close()
+        await db.close()
 
 
     # finally:
@@ -781,12 +1033,16 @@ async def get_notes(
     authorization: Optional[str] = Header(None)
 ):
     """Get all notes for the user (limited to 100 most recent)"""
-    user, db = await get_user_from_token(authorization)
+    user = await get_user_from_token(authorization)
+    db = AsyncSessionLocal()
     try:
         # Limit to 100 most recent notes for faster loading
-        notes = db.query(Note).filter(
-            Note.user_id == user.id
-        ).order_by(Note.created_at.desc()).limit(100).all()
+        notes = (await db.execute(
+            select(Note)
+            .where(Note.user_id == user.id)
+            .order_by(Note.created_at.desc())
+            .limit(100)
+        )).scalars().all()
         
         return {
             "status": "success",
@@ -808,7 +1064,7 @@ async def get_notes(
     except Exception as e:
         return {"status": "error", "message": str(e)}
     finally:
-        db.close()
+        await db.close()
 
 # ======================================================
 # [NEW] AGENTIC LOOP ENDPOINT
@@ -884,7 +1140,8 @@ async def create_note(
     authorization: Optional[str] = Header(None)
 ):
     """Create a single note"""
-    user, db = await get_user_from_token(authorization)
+    user = await get_user_from_token(authorization)
+    db = AsyncSessionLocal()
     try:
         note = Note(
             user_id=user.id,
@@ -897,14 +1154,14 @@ async def create_note(
             thumbnail_url=note_data.thumbnail_url
         )
         db.add(note)
-        db.commit()
-        db.refresh(note)
+        await db.commit()
+        await db.refresh(note)
         return {"status": "success", "note_id": note.id, "message": "Note created"}
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         return {"status": "error", "message": str(e)}
     finally:
-        db.close()
+        await db.close()
 
 @app.delete("/notes/{note_id}")
 async def delete_note(
@@ -912,26 +1169,29 @@ async def delete_note(
     authorization: Optional[str] = Header(None)
 ):
     """Delete a note"""
-    user, db = await get_user_from_token(authorization)
+    user = await get_user_from_token(authorization)
+    db = AsyncSessionLocal()
     try:
-        note = db.query(Note).filter(
-            Note.id == note_id,
-            Note.user_id == user.id
-        ).first()
+        note = (await db.execute(
+            select(Note).where(
+                Note.id == note_id,
+                Note.user_id == user.id
+            )
+        )).scalars().first()
         
         if not note:
             raise HTTPException(status_code=404, detail="Note not found")
             
-        db.delete(note)
-        db.commit()
+        await db.delete(note)
+        await db.commit()
         return {"status": "success", "message": "Note deleted"}
     except HTTPException:
         raise
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         return {"status": "error", "message": str(e)}
     finally:
-        db.close()
+        await db.close()
 
 # Deprecated Sync Endpoint - kept for backward compatibility if needed, but redundant now
 @app.post("/sync/notes")
@@ -940,17 +1200,20 @@ async def sync_notes(
     authorization: Optional[str] = Header(None)
 ):
     """Sync notes from extension"""
-    user, db = await get_user_from_token(authorization)
+    user = await get_user_from_token(authorization)
+    db = AsyncSessionLocal()
     
     try:
         synced_count = 0
         for note_data in notes:
             # Check if note already exists (deduplication)
-            existing_note = db.query(Note).filter(
-                Note.user_id == user.id,
-                Note.content == note_data.content,
-                Note.timestamp == note_data.timestamp
-            ).first()
+            existing_note = (await db.execute(
+                select(Note).where(
+                    Note.user_id == user.id,
+                    Note.content == note_data.content,
+                    Note.timestamp == note_data.timestamp
+                )
+            )).scalars().first()
 
             if existing_note:
                 continue
@@ -969,13 +1232,13 @@ async def sync_notes(
             db.add(note)
             synced_count += 1
         
-        db.commit()
+        await db.commit()
         return {"status": "success", "synced": synced_count}
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         return {"status": "error", "message": str(e)}
     finally:
-        db.close()
+        await db.close()
 
 @app.post("/sync/manifests")
 async def sync_manifests(
@@ -983,7 +1246,8 @@ async def sync_manifests(
     authorization: Optional[str] = Header(None)
 ):
     """Sync agent manifests from extension"""
-    user, db = await get_user_from_token(authorization)
+    user = await get_user_from_token(authorization)
+    db = AsyncSessionLocal()
     
     try:
         synced_count = 0
@@ -997,13 +1261,13 @@ async def sync_manifests(
             db.add(manifest)
             synced_count += 1
         
-        db.commit()
+        await db.commit()
         return {"status": "success", "synced": synced_count}
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         return {"status": "error", "message": str(e)}
     finally:
-        db.close()
+        await db.close()
 
 
 # ======================================================
@@ -1011,7 +1275,15 @@ async def sync_manifests(
 # ======================================================
 
 from db.models.media import Media
-from utils.r2_storage import r2_storage
+from utils.media_upload import (
+    stream_upload,
+    media_folder,
+    guess_content_type,
+    user_upload_prefix,
+    UploadTooLarge,
+    MEDIA_MAX_UPLOAD_MB,
+    MEDIA_PRESIGN_EXPIRY
+)
 import base64
 
 class MediaUpload(BaseModel):
@@ -1027,7 +1299,8 @@ async def upload_media(
     authorization: Optional[str] = Header(None)
 ):
     """Upload media file to R2 and save to database"""
-    user, db = await get_user_from_token(authorization)
+    user = await get_user_from_token(authorization)
+    db = AsyncSessionLocal()
     
     try:
         # Decode base64 file data
@@ -1035,16 +1308,10 @@ async def upload_media(
         file_size = len(file_bytes)
         
         # Determine folder based on source
-        folder_map = {
-            "uploaded": "uploads",
-            "circle_search": "circle-search",
-            "snapshot": "snapshots",
-            "generated": "generated"
-        }
-        folder = folder_map.get(media_data.source, "uploads")
+        folder = media_folder(media_data.source)
         
         # Upload to R2
-        success, file_url, error_msg = r2_storage.upload_file(
+        success, file_url, error_msg = await storage.upload_bytes(
             file_bytes=file_bytes,
             filename=media_data.filename,
             folder=folder
@@ -1064,8 +1331,8 @@ async def upload_media(
             file_metadata=media_data.file_metadata
         )
         db.add(media)
-        db.commit()
-        db.refresh(media)
+        await db.commit()
+        await db.refresh(media)
         
         return {
             "status": "success",
@@ -1075,10 +1342,143 @@ async def upload_media(
         }
     
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         return {"status": "error", "message": str(e)}
     finally:
-        db.close()
+        await db.close()
+
+async def save_media_row(user_id: int, file_type: str, source: str, file_url: str, filename: str, size: int, file_metadata: Optional[dict]) -> Media:
+    db = AsyncSessionLocal()
+    try:
+        media = Media(
+            user_id=user_id,
+            file_type=file_type,
+            source=source,
+            file_url=file_url,
+            original_filename=filename,
+            file_size_bytes=size,
+            file_metadata=file_metadata
+        )
+        db.add(media)
+        await db.commit()
+        await db.refresh(media)
+        return media
+    except Exception:
+        await db.rollback()
+        raise
+    finally:
+        await db.close()
+
+@app.post("/media/upload/stream")
+async def upload_media_stream(
+    request: Request,
+    filename: str,
+    file_type: str,
+    source: str = "uploaded",
+    authorization: Optional[str] = Header(None)
+):
+    """
+    Upload media as the raw request body (no base64/JSON). The body is piped to an R2
+    multipart upload chunk by chunk, so memory stays bounded regardless of file size.
+    """
+    user = await get_user_from_token(authorization)
+    content_type = guess_content_type(filename, request.headers.get("content-type"))
+
+    try:
+        uploaded = await stream_upload(request.stream(), filename, content_type, folder=media_folder(source))
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except Exception as e:
+        return {"status": "error", "message": f"R2 upload failed: {str(e)}"}
+
+    try:
+        media = await save_media_row(user.id, file_type, source, uploaded.file_url, filename, uploaded.size, None)
+    except Exception as e:
+        await storage.delete_file(uploaded.file_url)
+        return {"status": "error", "message": str(e)}
+
+    return {
+        "status": "success",
+        "media_id": media.id,
+        "file_url": uploaded.file_url,
+        "message": "Media uploaded successfully"
+    }
+
+class MediaPresignRequest(BaseModel):
+    filename: str
+    content_type: Optional[str] = None
+    source: str = "uploaded"
+
+@app.post("/media/upload/presign")
+async def presign_media_upload(
+    req: MediaPresignRequest,
+    authorization: Optional[str] = Header(None)
+):
+    """
+    Returns a presigned PUT URL so the client uploads straight to R2.
+    Call /media/upload/complete with the returned object_key afterwards.
+    """
+    user = await get_user_from_token(authorization)
+    content_type = guess_content_type(req.filename, req.content_type)
+    object_key = storage.new_object_key(req.filename, user_upload_prefix(media_folder(req.source), user.id).rstrip("/"))
+
+    upload_url = await storage.presigned_put(object_key, content_type, expiry=MEDIA_PRESIGN_EXPIRY)
+    if not upload_url:
+        return {"status": "error", "message": "Could not create upload URL"}
+
+    return {
+        "status": "success",
+        "upload_url": upload_url,
+        "object_key": object_key,
+        "headers": {"Content-Type": content_type},
+        "expires_in": MEDIA_PRESIGN_EXPIRY
+    }
+
+class MediaCompleteRequest(BaseModel):
+    object_key: str
+    filename: str
+    file_type: str
+    source: str = "uploaded"
+    file_metadata: Optional[dict] = None
+
+@app.post("/media/upload/complete")
+async def complete_media_upload(
+    req: MediaCompleteRequest,
+    authorization: Optional[str] = Header(None)
+):
+    """Registers an object uploaded through a presigned PUT URL in the user's media library."""
+    user = await get_user_from_token(authorization)
+    if not req.object_key.startswith(user_upload_prefix(media_folder(req.source), user.id)):
+        raise HTTPException(status_code=403, detail="Object does not belong to this user")
+
+    file_url = storage.public_url(req.object_key)
+    db = AsyncSessionLocal()
+    try:
+        existing = (await db.execute(select(Media.id).where(Media.file_url == file_url))).scalar_one_or_none()
+    finally:
+        await db.close()
+    if existing is not None:
+        raise HTTPException(status_code=409, detail="Upload already registered")
+
+    size = await storage.object_size(req.object_key)
+    if size is None:
+        return {"status": "error", "message": "Upload not found"}
+    # A presigned PUT does not enforce the size limit, so check it once the object exists
+    if size > MEDIA_MAX_UPLOAD_MB * 1024 * 1024:
+        await storage.delete_file(file_url)
+        raise HTTPException(status_code=413, detail=f"File exceeds {MEDIA_MAX_UPLOAD_MB}MB limit")
+
+    try:
+        media = await save_media_row(user.id, req.file_type, req.source, file_url, req.filename, size, req.file_metadata)
+    except Exception as e:
+        return {"status": "error", "message": str(e)}
+
+    return {
+        "status": "success",
+        "media_id": media.id,
+        "file_url": file_url,
+        "message": "Media uploaded successfully"
+    }
 
 @app.get("/media")
 async def get_media(
@@ -1087,17 +1487,20 @@ async def get_media(
     file_type: Optional[str] = None
 ):
     """Get all media for the user (limited to most recent)"""
-    user, db = await get_user_from_token(authorization)
+    user = await get_user_from_token(authorization)
+    db = AsyncSessionLocal()
     
     try:
-        query = db.query(Media).filter(Media.user_id == user.id)
+        query = select(Media).where(Media.user_id == user.id)
         
         # Filter by file type if specified
         if file_type:
-            query = query.filter(Media.file_type == file_type)
+            query = query.where(Media.file_type == file_type)
         
         # Order by most recent and limit
-        media_items = query.order_by(Media.created_at.desc()).limit(limit).all()
+        media_items = (await db.execute(
+            query.order_by(Media.created_at.desc()).limit(limit)
+        )).scalars().all()
         
         return {
             "status": "success",
@@ -1119,7 +1522,7 @@ async def get_media(
     except Exception as e:
         return {"status": "error", "message": str(e)}
     finally:
-        db.close()
+        await db.close()
 
 @app.delete("/media/{media_id}")
 async def delete_media(
@@ -1127,37 +1530,40 @@ async def delete_media(
     authorization: Optional[str] = Header(None)
 ):
     """Delete media from R2 and database"""
-    user, db = await get_user_from_token(authorization)
+    user = await get_user_from_token(authorization)
+    db = AsyncSessionLocal()
     
     try:
         # Find media item
-        media = db.query(Media).filter(
-            Media.id == media_id,
-            Media.user_id == user.id
-        ).first()
+        media = (await db.execute(
+            select(Media).where(
+                Media.id == media_id,
+                Media.user_id == user.id
+            )
+        )).scalars().first()
         
         if not media:
             raise HTTPException(status_code=404, detail="Media not found")
         
-        # Delete from R2
-        success, error_msg = r2_storage.delete_file(media.file_url)
+        # Delete from object storage
+        success, error_msg = await storage.delete_file(media.file_url)
         if not success:
             print(f"Warning: Failed to delete from R2: {error_msg}")
             # Continue with DB deletion even if R2 deletion fails
         
         # Delete from database
-        db.delete(media)
-        db.commit()
+        await db.delete(media)
+        await db.commit()
         
         return {"status": "success", "message": "Media deleted successfully"}
     
     except HTTPException:
         raise
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         return {"status": "error", "message": str(e)}
     finally:
-        db.close()
+        await db.close()
 
 
 
@@ -1171,7 +1577,7 @@ async def save_message_and_summary(conversation_id: int, user_query: str, ai_res
     if not conversation_id:
         return
 
-    db = SessionLocal()
+    db = AsyncSessionLocal()
     try:
         # 1. Save Message
         message = Message(
@@ -1182,7 +1588,7 @@ async def save_message_and_summary(conversation_id: int, user_query: str, ai_res
         db.add(message)
         
         # 2. Update Summary (Simple concatenation for now, or LLM based later)
-        conversation = db.query(Conversation).filter(Conversation.id == conversation_id).first()
+        conversation = await db.get(Conversation, conversation_id)
         if conversation:
             # If no title, generate one
             if not conversation.title:
@@ -1204,12 +1610,12 @@ async def save_message_and_summary(conversation_id: int, user_query: str, ai_res
             
             conversation.updated_at = datetime.utcnow()
             
-        db.commit()
+        await db.commit()
     except Exception as e:
         print(f"❌ Error saving message: {e}")
-        db.rollback()
+        await db.rollback()
     finally:
-        db.close()
+        await db.close()
 
 
 # @app.post("/generate/stream")
@@ -1374,12 +1780,11 @@ async def save_message_and_summary(conversation_id: int, user_query: str, ai_res
 #     )
 
 SIMILARITY_THRESHOLD = 0.15
+CACHE_REPLAY_CHUNK_CHARS = 200
 
 async def get_memory_context(user_id: str, conversation_id: int, query_embedding: list[float]):
 
-    db = SessionLocal()
-
-    try:
+    async with AsyncSessionLocal() as db:
 
         stmt = (
             select(QueryHistory)
@@ -1391,7 +1796,7 @@ async def get_memory_context(user_id: str, conversation_id: int, query_embedding
             .limit(5)
         )
 
-        results = db.execute(stmt).scalars().all()
+        results = (await db.execute(stmt)).scalars().all()
 
         memory = ""
 
@@ -1400,16 +1805,11 @@ async def get_memory_context(user_id: str, conversation_id: int, query_embedding
 
         return memory
 
-    finally:
-        db.close()
-
 async def get_similar_chat(user_id: str, query: str):
 
     query_embedding = await embed_text(query)
 
-    db: Session = SessionLocal()
-
-    try:
+    async with AsyncSessionLocal() as db:
 
         stmt = (
             select(
@@ -1421,7 +1821,7 @@ async def get_similar_chat(user_id: str, query: str):
             .limit(1)
         )
 
-        result = db.execute(stmt).first()
+        result = (await db.execute(stmt)).first()
 
         if result:
             chat, distance = result
@@ -1430,9 +1830,6 @@ async def get_similar_chat(user_id: str, query: str):
                 return chat.response
 
         return None
-
-    finally:
-        db.close()
 async def save_chat(
     user_id: str,
     url: str,
@@ -1440,27 +1837,23 @@ async def save_chat(
     response: str
 ):
 
-    combined_text = f"Query: {query}\nResponse: {response}"
-    combined_embedding = await embed_text(combined_text)
-
-    db: Session = SessionLocal()
+    query_embedding, response_embedding = await asyncio.gather(
+        embed_text(query), embed_text(response)
+    )
 
-    try:
+    async with AsyncSessionLocal() as db:
 
         chat = QueryHistory(
             user_id=user_id,
             url=url,
             query=query,
-            query_embedding=combined_embedding,
+            query_embedding=query_embedding,
             response=response,
-            response_embedding=combined_embedding
+            response_embedding=response_embedding
         )
 
         db.add(chat)
-        db.commit()
-
-    finally:
-        db.close()
+        await db.commit()
 
 
 
@@ -1469,63 +1862,25 @@ async def save_chat(
 # generate_stream endpoint
 # ============================================================
 
-# Keywords that indicate the user is asking about the current page
-
-# Keywords that indicate the user is asking specifically about the context of the active browser tab.
-# This heuristic prevents unnecessary Vector DB lookups for general talk (e.g., "Hi", "Tell me a joke").
-PAGE_CONTEXT_KEYWORDS = [
-    "this", "current", "here", "page", "these", "above",
-    "product", "item", "summarize", "summarise", "summary", "explain this",
-    "what does it say", "on this", "listed", "shown", "describe",
-    "content", "contents", "page contents", "the content",
-    "the contents", "material", "text", "texts", "the text",
-    "information", "details", "data", "info",
-    "this page", "this content", "this text", "this material",
-    "this info", "this information", "this thing",
-    "that page", "that content", "that text",
-    "the above", "above content", "above text",
-    "below", "below content", "this one", "that one",
-    "the previous", "the next",
-    "summarize this", "summarise this", "explain this",
-    "explain it", "describe this", "describe it",
-    "tell me about this", "tell me about it",
-    "what is this", "what's this",
-    "what does this say", "what does it say",
-    "give summary", "give a summary",
-    "brief this", "analyze this", "analyse this",
-    "this product", "this item", "this listing",
-    "the product", "the item", "the listing",
-    "product details", "item details",
-    "it", "this one", "that one", "the above one",
-    "shown here", "shown above", "shown below",
-    "on the page", "from the page",
-    "from here", "from this page",
-    "read this", "read it", "interpret this",
-    "what is written", "what's written",
-    "what is mentioned", "what's mentioned",
-    "what is described", "what's described",
-]
+@app.get("/cache/semantic/stats")
+async def semantic_cache_stats(authorization: Optional[str] = Header(None)):
+    """Hit/miss counters and lookup latency for the /generate/stream semantic cache."""
+    await get_user_from_token(authorization)
+    if not semantic_cache:
+        return {"enabled": False}
+    return {"enabled": True, **semantic_cache.stats()}
+
 
 def likely_page_context(query: str) -> bool:
     """
     Step: Intent detection for RAG (Retrieval-Augmented Generation).
-    Function: Scans user query for demonstrative pronouns and page-related verbs.
+    Function: Token-boundary scan for demonstrative pronouns and page-related verbs,
+    plus short subject-less follow-ups like "explain" or "what is that"
+    (see PAGE_CONTEXT_KEYWORDS / SHORT_FOLLOWUP_WORDS in utils/intent_router.py).
     Expects: `query` string.
     Returns: bool (True if context should be fetched).
     """
-    q = query.lower()
-
-    # Case 1: Direct keyword hit
-    if any(k in q for k in PAGE_CONTEXT_KEYWORDS):
-        return True
-
-    # Case 2: Short, vague queries like "summarize it" or "explain this"
-    if len(q.split()) <= 4 and any(
-        word in q for word in ["this", "it", "above", "here"]
-    ):
-        return True
-
-    return False
+    return intent_router.asks_about_page(query)
 
 
 @app.post("/generate/stream")
@@ -1545,11 +1900,19 @@ async def generate_stream(
         full_response = ""
 
         # Step 1: Identity & Authorization
+        authenticated = True
         try:
-            user, _ = await get_user_from_token(authorization)
+            user = await get_user_from_token(authorization)
             user_id = str(user.id)
         except:
             user_id = "default_user"
+            authenticated = False
+
+        if req.context is None and req.context_ref:
+            req.context = await resolve_context_ref(user_id, req.context_ref)
+            if req.context is None:
+                yield UNKNOWN_CONTEXT_REF_FRAME
+                return
 
         # Step 2: Memory Alignment (Windowing)
         # Keeps last 20 messages for context, preventing prompt size explosion
@@ -1565,12 +1928,48 @@ async def generate_stream(
             elif role in ["assistant", "ai", "bot"]:
                 chat_history.append(AIMessage(content=content))
 
-        # Step 3: Lazy RAG Retrieval
-        retrieved_context = ""
-        prompt_lower = req.prompt.lower()
-        
+        asks_about_current_page = likely_page_context(req.prompt)
+
+        # Step 3: Semantic Cache
+        # Only self-contained turns (no chat history, no image) from signed-in users are
+        # cached; anonymous callers all share "default_user", so they must never share
+        # answers. Page questions are scoped to the URL + fingerprint of the page they
+        # were answered from.
+        cache_scope = None
+        if semantic_cache and authenticated and not windowed_history and not req.image_url:
+            context_fingerprint = ""
+            if asks_about_current_page:
+                context_fingerprint = await semantic_cache.context_fingerprint(
+                    user_id, req.current_url, req.conversation_id, req.context
+                )
+            if context_fingerprint or not asks_about_current_page:
+                cache_scope = CacheScope(
+                    model=req.model,
+                    url=req.current_url if asks_about_current_page else None,
+                    context_fingerprint=context_fingerprint
+                )
+                hit = await semantic_cache.lookup(user_id, req.prompt, cache_scope)
+                if hit:
+                    print(f"⚡ Semantic cache hit (distance {hit.distance:.3f})")
+                    for start in range(0, len(hit.response), CACHE_REPLAY_CHUNK_CHARS):
+                        yield json.dumps({
+                            "type": "text",
+                            "data": hit.response[start:start + CACHE_REPLAY_CHUNK_CHARS]
+                        }) + "\n\n"
+                    yield json.dumps({"type": "done", "cached": True}) + "\n\n"
+
+                    if req.conversation_id:
+                        background_tasks.add_task(
+                            save_message_and_summary,
+                            req.conversation_id,
+                            req.prompt,
+                            hit.response
+                        )
+                    return
+
+        # Step 4: Lazy RAG Retrieval
         # Only query Vector DB if user specifically asks about the page
-        asks_about_current_page = any(keyword in prompt_lower for keyword in PAGE_CONTEXT_KEYWORDS)
+        retrieved_context = ""
 
         if asks_about_current_page and (req.current_url or req.conversation_id):
             # Function: Cosine similarity search in Pinecone (Asynchronous)
@@ -1582,7 +1981,7 @@ async def generate_stream(
             )
             print(f"📊 Retrieved {len(retrieved_context)} chars of page context")
 
-        # Step 4: Early Exit for Missing Context
+        # Step 5: Early Exit for Missing Context
         if asks_about_current_page and not retrieved_context:
             yield json.dumps({
                 "type": "text",
@@ -1591,7 +1990,7 @@ async def generate_stream(
             yield json.dumps({"type": "done"}) + "\n\n"
             return
 
-        # Step 5: Chain Orchestration
+        # Step 6: Chain Orchestration
         # Priority: current image_url wins → vision chain
         # Then: search history for an image (vision follow-up)
         # Then: retrieved_context → context-aware chain
@@ -1616,20 +2015,16 @@ async def generate_stream(
                 image_url=effective_image_url
             )
         elif retrieved_context or req.context:
-            # Step 5a: Context Fallback
+            # Step 6a: Context Fallback
             # If nothing was retrieved from Pinecone/Vector DB, use the raw context from the request
             final_context = retrieved_context
             if not final_context and req.context:
-                from utils.text_processing import extract_clean_text_from_dom, limit_context
+                from utils.context_packer import apack_context
                 raw = req.context
-                content = ""
                 if isinstance(raw, dict):
-                    content = raw.get("textContent") or raw.get("content")
-                    if not content:
-                        content = extract_clean_text_from_dom(raw.get("domTree", raw))
+                    final_context = await apack_context(raw, query=req.prompt)
                 
-                if content:
-                    final_context = limit_context(content, max_chunks=10) # ~5k chars limit
+                if final_context:
                     print(f"⚡ Using fallback context from request payload ({len(final_context)} chars)")
 
             if final_context:
@@ -1647,7 +2042,7 @@ async def generate_stream(
         else:
             chain = runnable_chain
 
-        # Step 6: Token Streaming (Modern SSE)
+        # Step 7: Token Streaming (Modern SSE)
         # Function: astream() sends LLM tokens as they arrive
         async for msg in chain.astream({
             "question": req.prompt,
@@ -1662,7 +2057,7 @@ async def generate_stream(
 
         yield json.dumps({"type": "done"}) + "\n\n"
 
-        # Step 7: Post-Chat Persistence
+        # Step 8: Post-Chat Persistence
         # Fire-and-forget task to save the turn to the main SQL database
         if req.conversation_id:
             background_tasks.add_task(
@@ -1672,8 +2067,18 @@ async def generate_stream(
                 full_response
             )
 
+        if cache_scope:
+            background_tasks.add_task(
+                semantic_cache.store,
+                user_id,
+                req.conversation_id,
+                req.prompt,
+                full_response,
+                cache_scope
+            )
+
     return StreamingResponse(
-        stream(),
+        with_query_embedding_scope(stream()),
         media_type="text/event-stream",
         headers={
             "Cache-Control": "no-cache",
@@ -1732,11 +2137,17 @@ async def agent_stream(
         try:
             # 0️⃣ PREPARE CONTEXT (VECTOR STORE)
             try:
-                user, _ = await get_user_from_token(authorization)
+                user = await get_user_from_token(authorization)
                 user_id = str(user.id)
             except:
                 user_id = "default_user"
 
+            if req.context is None and req.context_ref:
+                req.context = await resolve_context_ref(user_id, req.context_ref)
+                if req.context is None:
+                    yield UNKNOWN_CONTEXT_REF_FRAME
+                    return
+
             retrieved_context = await vector_store.get_relevant_context(
                 user_id, 
                 req.prompt, 
@@ -1746,15 +2157,9 @@ async def agent_stream(
 
             final_context_text = ""
             if req.context:
-                from utils.text_processing import extract_clean_text_from_dom
-                raw = req.context
-                if isinstance(raw, dict):
-                    content = raw.get("textContent") or raw.get("content")
-                    if not content:
-                        content = extract_clean_text_from_dom(raw.get("domTree"))
-                    final_context_text += f"\n\n[CURRENT PAGE CONTENT]:\n{content[:8000]}"
-                else:
-                    final_context_text += f"\n\n[CURRENT PAGE CONTENT]:\n{str(raw)[:8000]}"
+                from utils.context_packer import apack_context
+                content = await apack_context(req.context, query=req.prompt)
+                final_context_text += f"\n\n[CURRENT PAGE CONTENT]:\n{content}"
             
             if retrieved_context:
                 final_context_text += f"\n\n[RELEVANT RETRIEVED CONTEXT]:\n{retrieved_context}"
@@ -1767,7 +2172,7 @@ async def agent_stream(
 
             # 1️⃣ RUN GRAPH ONCE (PLANNING)
             # ======================================================
-            state = await app_graph.ainvoke({
+            state = await plan_turn({
                 "question": req.prompt,
                 "raw_html": context_payload,
                 "current_url": req.current_url,
@@ -1968,7 +2373,7 @@ async def agent_stream(
             }) + "\n\n"
 
     return StreamingResponse(
-        stream(),
+        with_query_embedding_scope(stream()),
         media_type="text/event-stream",
         headers={
             "Cache-Control": "no-cache",
@@ -2342,18 +2747,10 @@ ONLY return valid JSON."""
 # DOM CUSTOMIZATION ENDPOINT
 # -------------------------
 
-class DomElementModel(BaseModel):
-    tag: str
-    attrs: dict = Field(default_factory=dict)
-    style: Optional[dict] = None
-    text: Optional[str] = None
-    children: List['DomElementModel'] = []
-
-# Re-evaluate for recursive model support in Pydantic v2
-DomElementModel.model_rebuild()
-
 class CustomizeRequest(BaseModel):
-    elements: List[DomElementModel]
+    # Element dicts, or a flat-dom/1 tree; only the top-ranked 100 are read, so
+    # they are not validated node by node
+    elements: Union[List[dict], dict]
     requirements: str
 
 @app.post("/dom/customize")
@@ -2363,8 +2760,16 @@ async def customize_dom(req: CustomizeRequest):
     LLM returns targeted modifications (selector + style changes) instead of full element tree.
     """
     try:
-        # Convert Pydantic models to dict for the chain
-        elements_data = [el.model_dump() for el in req.elements]
+        if is_flat_dom(req.elements):
+            view = FlatDomView(req.elements)
+            elements_data = [
+                {"tag": view.tag(i), "text": view.text(i), "attrs": view.attributes(i)}
+                for i in range(len(view)) if view.tag(i) != TEXT_TAG
+            ]
+        elif isinstance(req.elements, list):
+            elements_data = [el for el in req.elements if isinstance(el, dict)]
+        else:
+            return {"success": False, "error": "elements must be a list or a flat-dom tree"}
         
         # Sort elements by "importance" (tag weight + area)
         tag_weights = {
@@ -2374,10 +2779,10 @@ async def customize_dom(req: CustomizeRequest):
         }
         
         def get_element_score(el):
-            tag = el.get("tag", "").lower()
+            tag = (el.get("tag") or "").lower()
             score = tag_weights.get(tag, 10)
             if el.get("text"): score += 20
-            rect = el.get("rect", {})
+            rect = el.get("rect") or {}
             if rect.get("width", 0) * rect.get("height", 0) > 10000: score += 15
             return score
 
@@ -2391,7 +2796,7 @@ async def customize_dom(req: CustomizeRequest):
                 "tag": el.get("tag"),
                 "text": el.get("text", "")[:60] if el.get("text") else None,
                 "currentStyles": {
-                    k: v for k, v in el.get("style", {}).items()
+                    k: v for k, v in (el.get("style") or {}).items()
                     if k in ["color", "backgroundColor", "fontSize", "padding", "borderRadius"]
                 }
             }
@@ -2956,126 +3361,157 @@ Example URLs:
 # ======================================================
 # ASYNC SNAPSHOT TASKS
 # ======================================================
+# Jobs live in a durable SQLite queue (snapshot_jobs.py) and are rendered by
+# snapshot_worker.py processes, so API restarts don't lose them and heavy renders
+# never compete with request handling in this process.
+
+SNAPSHOT_WORKER_MODE = os.getenv("SNAPSHOT_WORKER_MODE", "subprocess").lower()  # "subprocess" | "external"
+SNAPSHOT_EVENTS_KEEPALIVE = float(os.getenv("SNAPSHOT_EVENTS_KEEPALIVE", "15"))
+# The worker drains in-flight jobs for up to SNAPSHOT_LEASE_SECONDS, then closes its
+# renderers; give it that long plus this margin before killing it
+SNAPSHOT_WORKER_STOP_MARGIN = float(os.getenv("SNAPSHOT_WORKER_STOP_MARGIN", "15"))
+snapshot_worker_process = None
+
+
+@app.on_event("startup")
+async def start_snapshot_worker():
+    global snapshot_worker_process
+    if SNAPSHOT_WORKER_MODE != "subprocess":
+        return
+    snapshot_worker_process = await asyncio.create_subprocess_exec(
+        sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "snapshot_worker.py")
+    )
+    print(f"🚀 Snapshot worker started (pid {snapshot_worker_process.pid})")
 
-snapshot_tasks = {}
-
-async def run_snapshot_task(task_id: str, req: SnapshotRequest):
-    try:
-        async def progress_callback(progress: int, message: str):
-            snapshot_tasks[task_id]["progress"] = progress
-            snapshot_tasks[task_id]["message"] = message
 
-        if req.format == "markdown":
-            if req.raw_html:
-                md_content = get_markdown(req.url, req.raw_html)
-            else:
-                md_content = await generate_markdown_report(req.url)
-            
-            # For markdown, we just store the content in a temporary file
-            temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=".md")
-            with open(temp_file.name, "w") as f:
-                f.write(md_content)
-            output_path = temp_file.name
-        
-        elif req.format in ["pdf", "marketing_pdf", "business_report"]:
-            template = "smart"
-            if req.format == "marketing_pdf": template = "marketing"
-            elif req.format == "business_report": template = "business"
-            output_path = await generate_smart_pdf(req.url, template=template, html=req.raw_html, progress_callback=progress_callback)
-            
-        elif req.format == "docx":
-            output_path = await generate_word_doc(req.url, html=req.raw_html)
-            
-        elif req.format == "png":
-            temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=".png")
-            output_path = temp_file.name
-            temp_file.close()
-            await capture_page(req.url, output_path, "png", html=req.raw_html)
-            
-        elif req.format in ["research_paper", "ppt"]:
-            output_path = await generate_special_format(req.url, target_format=req.format, html=req.raw_html)
-        else:
-            snapshot_tasks[task_id]["status"] = "error"
-            snapshot_tasks[task_id]["error"] = "Invalid format"
-            return
+@app.on_event("shutdown")
+async def stop_snapshot_worker():
+    if snapshot_worker_process and snapshot_worker_process.returncode is None:
+        snapshot_worker_process.terminate()
+        try:
+            await asyncio.wait_for(
+                snapshot_worker_process.wait(), timeout=SNAPSHOT_LEASE_SECONDS + SNAPSHOT_WORKER_STOP_MARGIN
+            )
+        except asyncio.TimeoutError:
+            snapshot_worker_process.kill()
 
-        snapshot_tasks[task_id]["status"] = "completed"
-        snapshot_tasks[task_id]["progress"] = 100
-        snapshot_tasks[task_id]["file_path"] = output_path
-        snapshot_tasks[task_id]["filename"] = os.path.basename(output_path)
 
-    except Exception as e:
-        import traceback
-        traceback.print_exc()
-        snapshot_tasks[task_id]["status"] = "error"
-        snapshot_tasks[task_id]["error"] = str(e)
+async def get_completed_snapshot(task_id: str) -> dict:
+    job = await snapshot_queue.aget(task_id)
+    if not job or job["status"] != COMPLETED:
+        raise HTTPException(status_code=404, detail="File not ready or task not found")
+    return job
 
 
 @app.post("/snapshot")
-async def get_website_snapshot(req: SnapshotRequest, background_tasks: BackgroundTasks):
-    """
-    Initiate a background task to generate a snapshot.
-    """
-    task_id = str(uuid.uuid4())
-    snapshot_tasks[task_id] = {
-        "status": "processing",
-        "progress": 0,
-        "message": "Initializing...",
-        "format": req.format,
-        "url": req.url,
-        "file_path": None
-    }
-    
-    background_tasks.add_task(run_snapshot_task, task_id, req)
-    return {"task_id": task_id, "status": "processing"}
+async def get_website_snapshot(req: SnapshotRequest, authorization: Optional[str] = Header(None)):
+    """
+    Queue a snapshot job. Follow /snapshot/events/{task_id} (or poll /snapshot/status) for progress.
+    Authenticated requests also get the result added to the user's media library; an
+    expired or invalid token is treated as anonymous, since snapshots do not need a login.
+    """
+    payload = req.model_dump()
+    if authorization:
+        try:
+            payload["user_id"] = (await get_user_from_token(authorization)).id
+        except HTTPException:
+            pass
+    try:
+        task_id = await enqueue_snapshot(payload)
+    except InvalidSnapshotFormat:
+        return {"status": "error", "message": "Invalid format"}
+    return {"task_id": task_id, "status": "queued"}
 
 
 @app.get("/snapshot/status/{task_id}")
 async def get_snapshot_status(task_id: str):
-    if task_id not in snapshot_tasks:
+    job = await snapshot_queue.aget(task_id)
+    if not job:
         raise HTTPException(status_code=404, detail="Task not found")
-    return snapshot_tasks[task_id]
+    position = await snapshot_queue.aqueue_position(task_id) if job["status"] == QUEUED else None
+    return status_view(job, position)
+
+
+@app.get("/snapshot/events/{task_id}")
+async def stream_snapshot_events(task_id: str):
+    """
+    SSE stream of a snapshot job: one `status` frame per change (same payload as
+    /snapshot/status), ending after the `completed`/`error` frame. Replaces status polling.
+    """
+    job = await snapshot_queue.aget(task_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Task not found")
+
+    async def stream():
+        loop = asyncio.get_running_loop()
+        last_view = None
+        last_sent = loop.time()
+        while True:
+            job = await snapshot_queue.aget(task_id)
+            if not job:
+                yield json.dumps({"type": "error", "data": "Task not found"}) + "\n\n"
+                return
+
+            position = await snapshot_queue.aqueue_position(task_id) if job["status"] == QUEUED else None
+            view = status_view(job, position)
+            if view != last_view:
+                yield json.dumps({"type": "status", "data": view}) + "\n\n"
+                last_view, last_sent = view, loop.time()
+            elif loop.time() - last_sent >= SNAPSHOT_EVENTS_KEEPALIVE:
+                # Keep proxies from closing an idle connection
+                yield json.dumps({"type": "ping"}) + "\n\n"
+                last_sent = loop.time()
+
+            if job["status"] in (COMPLETED, ERROR):
+                return
+
+            # Queue position moves without the job itself changing, so re-check it more often
+            timeout = 2 if job["status"] == QUEUED else SNAPSHOT_EVENTS_KEEPALIVE
+            await snapshot_queue.wait_for_change(task_id, job["version"], timeout=timeout)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "Connection": "keep-alive",
+            "X-Accel-Buffering": "no",
+        },
+    )
+
+
+async def presigned_snapshot_redirect(job: dict, download_filename: Optional[str] = None) -> RedirectResponse:
+    url = await storage.presigned_get(
+        job["result"]["file_url"], expiry=SNAPSHOT_PRESIGN_EXPIRY, download_filename=download_filename
+    )
+    if not url:
+        raise HTTPException(status_code=502, detail="Could not sign download URL")
+    return RedirectResponse(url, status_code=307)
 
 
 @app.get("/snapshot/preview/{task_id}")
 async def preview_snapshot(task_id: str):
-    if task_id not in snapshot_tasks or snapshot_tasks[task_id]["status"] != "completed":
-        raise HTTPException(status_code=404, detail="File not ready or task not found")
-    
-    file_path = snapshot_tasks[task_id]["file_path"]
-    media_type = "application/pdf"
-    if snapshot_tasks[task_id]["format"] == "png": media_type = "image/png"
-    elif snapshot_tasks[task_id]["format"] == "markdown": media_type = "text/markdown"
-    
-    return FileResponse(file_path, media_type=media_type)
+    job = await get_completed_snapshot(task_id)
+    if job["result"].get("file_url"):
+        return await presigned_snapshot_redirect(job)
+    media_type = PREVIEW_MEDIA_TYPES.get(job["payload"]["format"], "application/pdf")
+    return FileResponse(job["result"]["file_path"], media_type=media_type)
 
 
 @app.get("/snapshot/download/{task_id}")
 async def download_snapshot(task_id: str):
-    if task_id not in snapshot_tasks or snapshot_tasks[task_id]["status"] != "completed":
-        raise HTTPException(status_code=404, detail="File not ready or task not found")
-    
-    file_path = snapshot_tasks[task_id]["file_path"]
-    format = snapshot_tasks[task_id]["format"]
-    
-    filename = f"snapshot_{task_id[:8]}"
-    if format == "pdf": filename += ".pdf"
-    elif format == "png": filename += ".png"
-    elif format == "markdown": filename += ".md"
-    elif format == "docx": filename += ".docx"
-    else: filename += ".pdf"
-
-    return FileResponse(file_path, filename=filename)
+    job = await get_completed_snapshot(task_id)
+    filename = download_filename(task_id, job["payload"]["format"])
+    if job["result"].get("file_url"):
+        return await presigned_snapshot_redirect(job, download_filename=filename)
+    return FileResponse(job["result"]["file_path"], filename=filename)
 
 
 @app.delete("/snapshot/{task_id}")
 async def delete_snapshot(task_id: str):
-    if task_id not in snapshot_tasks:
+    job = await snapshot_queue.adelete(task_id)
+    if not job:
         raise HTTPException(status_code=404, detail="Task not found")
-    
-    file_path = snapshot_tasks[task_id].get("file_path")
-    if file_path and os.path.exists(file_path):
-        os.remove(file_path)
-    
-    del snapshot_tasks[task_id]
+
+    await remove_job_files(job)
     return {"status": "success", "message": "Snapshot deleted"}
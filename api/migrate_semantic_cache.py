@@ -0,0 +1,35 @@
+from sqlalchemy import text
+from db.database import engine
+
+def migrate_semantic_cache():
+    print("🚀 Starting semantic cache migration...")
+    with engine.connect() as conn:
+        try:
+            for column in ("model", "context_fingerprint"):
+                result = conn.execute(text(
+                    "SELECT column_name FROM information_schema.columns "
+                    f"WHERE table_name='query_history' AND column_name='{column}'"
+                ))
+                if result.fetchone():
+                    print(f"ℹ️ '{column}' column already exists.")
+                else:
+                    print(f"➕ Adding '{column}' column to query_history table...")
+                    conn.execute(text(f"ALTER TABLE query_history ADD COLUMN {column} TEXT"))
+
+            print("➕ Ensuring semantic cache indexes...")
+            conn.execute(text(
+                "CREATE INDEX IF NOT EXISTS ix_query_history_cache_scope "
+                "ON query_history (user_id, model, context_fingerprint, created_at)"
+            ))
+            conn.execute(text(
+                "CREATE INDEX IF NOT EXISTS ix_query_history_query_embedding "
+                "ON query_history USING hnsw (query_embedding vector_cosine_ops)"
+            ))
+            conn.commit()
+            print("✅ Semantic cache migration complete!")
+        except Exception as e:
+            print(f"❌ Error during migration: {e}")
+            conn.rollback()
+
+if __name__ == "__main__":
+    migrate_semantic_cache()
@@ -0,0 +1,83 @@
+"""
+One-off migration: re-keys page-chunk vectors saved before ids were scoped per
+user/conversation.
+
+Old ids were md5(url)_<content_hash>; current ids are md5(user:conversation:url)_<content_hash>.
+Old vectors are never touched by the diff/delete path in process_and_save_context,
+so they linger in query results. This copies each one (values and metadata as-is,
+no re-embedding) to its scoped id, deletes the old id, and seeds the local page
+fingerprint index with the migrated chunk hashes so the next save of that page
+deletes chunks that have since disappeared.
+
+Run once per Pinecone index, on the host whose page_fingerprints.sqlite3 serves
+/context/save:
+    python migrate_vector_ids.py [--dry-run]
+"""
+import sys
+import asyncio
+import hashlib
+from collections import defaultdict
+
+from utils.page_fingerprint import page_fingerprints
+from utils.vector_index import PineconeIndexClient
+from utils.vector_store import vector_store, VectorStoreService
+
+
+def legacy_vector_id(url: str, content_hash: str) -> str:
+    return f"{hashlib.md5(url.encode()).hexdigest()}_{content_hash}"
+
+
+async def migrate_vector_ids(dry_run: bool = False):
+    print("🚀 Starting vector id migration...")
+    index = vector_store.index
+    if not isinstance(index, PineconeIndexClient):
+        print("ℹ️ Only Pinecone indexes hold pre-scoping vector ids; nothing to migrate.")
+        return
+
+    scanned, migrated = 0, 0
+    pages = defaultdict(set)  # (user_id, url, conversation_id) -> chunk hashes
+    try:
+        async for ids in index.list_ids():
+            scanned += len(ids)
+            records = await index.fetch(ids)
+
+            moved, old_ids = [], []
+            for vector_id, record in records.items():
+                metadata = record.get("metadata") or {}
+                url, content_hash = metadata.get("url"), metadata.get("content_hash")
+                if not url or not content_hash or vector_id != legacy_vector_id(url, content_hash):
+                    continue
+                user_id = str(metadata.get("user_id", ""))
+                conversation_id = int(metadata.get("conversation_id") or 0)
+                moved.append({
+                    "id": VectorStoreService._vector_id(user_id, conversation_id, url, content_hash),
+                    "values": record["values"],
+                    "metadata": metadata
+                })
+                old_ids.append(vector_id)
+                pages[(user_id, url, conversation_id)].add(content_hash)
+
+            if moved and not dry_run:
+                # Write the new ids first so a crash never loses a chunk
+                await index.upsert(moved)
+                await index.delete(old_ids)
+            migrated += len(moved)
+            print(f"➕ Scanned {scanned} vectors, {migrated} legacy ids {'found' if dry_run else 're-keyed'}")
+
+        seeded = 0
+        for (user_id, url, conversation_id), chunk_hashes in pages.items():
+            if dry_run or await page_fingerprints.aget(user_id, url, conversation_id) is not None:
+                continue
+            # Empty page hash never matches, so the next save diffs against these chunks
+            await page_fingerprints.aput(user_id, url, conversation_id, "", chunk_hashes)
+            seeded += 1
+
+        print(f"✅ Vector id migration complete! {migrated} vectors on {len(pages)} pages, {seeded} fingerprints seeded.")
+    except Exception as e:
+        print(f"❌ Error during migration: {e}")
+    finally:
+        await index.aclose()
+
+
+if __name__ == "__main__":
+    asyncio.run(migrate_vector_ids(dry_run="--dry-run" in sys.argv))
@@ -15,6 +15,8 @@ from langchain_core.runnables import RunnableLambda
 from youtube_transcript_api import YouTubeTranscriptApi
 import openai
 from concurrent.futures import ThreadPoolExecutor
+from utils.context_packer import pack_context, CONTEXT_PROMPT_TOKEN_BUDGET
+from utils.flat_dom import FlatDomView, is_flat_dom, TEXT_TAG
 
 
 
@@ -452,6 +454,8 @@ def format_questions_with_options(questions):
 
 def format_dom_for_llm(dom_tree, max_depth=12, current_depth=0):
     """Recursively format DOM tree into human-readable structure"""
+    if is_flat_dom(dom_tree):
+        return _format_flat_dom_for_llm(FlatDomView(dom_tree), max_depth)
     if not dom_tree or current_depth > max_depth:
         return ""
     
@@ -502,6 +506,64 @@ def format_dom_for_llm(dom_tree, max_depth=12, current_depth=0):
     return "\n".join(output)
 
 
+def _format_flat_dom_for_llm(view, max_depth=12):
+    """format_dom_for_llm for flat DOM payloads: one pre-order scan, same output."""
+    output = []
+    values, checked_nodes = view.value_map(), view.checked_set()
+    priority_attrs = ["id", "class", "href", "type", "name", "placeholder", "for", "value"]
+    ends = []  # subtree end index of each ancestor; len(ends) is the current depth
+    node, count = 0, len(view)
+
+    while node < count:
+        while ends and node >= ends[-1]:
+            ends.pop()
+        depth = len(ends)
+        size = view.sizes[node]
+        if depth > max_depth:
+            node += size
+            continue
+
+        tag = view.tag(node)
+        is_text_leaf = tag == TEXT_TAG
+        attrs = {} if is_text_leaf else view.attributes(node)
+        text = "" if is_text_leaf else (view.texts[node] or "")
+        value = values.get(node, "")
+        checked = node in checked_nodes
+
+        if size > 1:
+            ends.append(node + size)
+        node += 1
+
+        if not text and not value and size == 1 and not any(
+            key in attrs for key in ["href", "src", "action", "for"]
+        ):
+            continue
+
+        indent = "  " * depth
+        tag_parts = [f"{indent}<{'' if is_text_leaf else tag}"]
+        for attr in priority_attrs:
+            if attr in attrs and attrs[attr]:
+                val = attrs[attr]
+                if attr == "class" and len(val) > 80:
+                    val = val[:77] + "..."
+                tag_parts.append(f'{attr}="{val}"')
+        output.append(" ".join(tag_parts) + ">")
+
+        if text and len(text.strip()) > 0:
+            truncated_text = text.strip()[:300]
+            if len(text.strip()) > 300:
+                truncated_text += "..."
+            output.append(f"{indent}  📝 {truncated_text}")
+
+        if value:
+            output.append(f"{indent}  💬 value: {value[:150]}")
+
+        if checked:
+            output.append(f"{indent}  ✓ checked: {checked}")
+
+    return "\n".join(output)
+
+
 def create_context_aware_chain(page_context=None, use_context=False, video_transcripts=None, image_url=None):
     """
     Create context-aware chain with optional video transcripts and image
@@ -520,7 +582,7 @@ def create_context_aware_chain(page_context=None, use_context=False, video_trans
             f"Title: {head.get('title', 'N/A')}",
             f"Description: {head.get('description', '')}",
             "",
-            content[:12000],
+            pack_context(content, CONTEXT_PROMPT_TOKEN_BUDGET),
             "=" * 60
         ])
     
@@ -1025,6 +1087,72 @@ action_intent_llm = get_dynamic_llm(
 
 action_intent_chain = action_intent_prompt | action_intent_llm | JsonOutputParser()
 
+# ======================================================
+# TURN PLANNER - classifier + page/action/video analyzers in ONE call
+# ======================================================
+
+turn_planner_prompt = ChatPromptTemplate.from_template("""
+You are the planner for a browser assistant. Analyze the user query ONCE and
+return every routing decision needed for this turn.
+
+1. classification - what rich content is needed:
+   - VIDEO/YOUTUBE (video, watch, playlist, tutorial, course, lesson, DSA, programming):
+     needs_rich_content true, content_types ["youtube"] ONLY
+   - PRODUCT (buy, price, best phone, laptop, gadget, review):
+     needs_rich_content true, content_types ["products", "images"]
+   - VISUAL (show me, pictures, photos, gallery): content_types ["images"]
+   - TRAVEL/PLACES: content_types ["images", "youtube"], NO products
+   - PAGE CONTEXT (summarize, what's on page, questions, assignment, solve):
+     needs_rich_content false, content_types ["none"]
+   - SIMPLE (greetings, facts): needs_rich_content false, content_types ["none"]
+   - DO NOT mix products with educational content
+
+2. needs_context - TRUE if the query needs the CURRENT PAGE CONTENT
+   ("this page", summarize/explain the page, quiz/assignment/MCQs on the page,
+   what is shown on the page). FALSE for general knowledge, definitions,
+   unrelated tutorials, recommendations not tied to the page.
+
+3. needs_actions - TRUE if the query needs BROWSER ACTIONS: "open", "search",
+   "find", "look up", "go to", "navigate", "visit", platform names (spotify,
+   youtube, netflix, amazon, flipkart), multi-step tasks, web shopping/search.
+   FALSE for questions about the current page or video, explanations
+   ("explain", "what is", "how does").
+
+4. needs_video - TRUE only if the tab has a video AND the query is about it
+   (summarize/explain the video, timestamps, speaker, transcript).
+
+User query: {question}
+Page context available: {has_context}
+Current URL: {current_url}
+Page has videos: {has_videos}
+
+Return ONLY this JSON:
+{{
+  "classification": {{
+    "needs_rich_content": true/false,
+    "content_types": ["youtube", "products", "images", "none"],
+    "primary_intent": "video|product|visual|page_context|info",
+    "reason": "brief explanation"
+  }},
+  "needs_context": true/false,
+  "needs_actions": true/false,
+  "needs_video": true/false
+}}
+""")
+
+turn_planner_llm = get_dynamic_llm(
+    ChatOpenAI(
+        model="gpt-4o-mini",
+        temperature=0,
+        streaming=False,
+        api_key=OPENAI_API_KEY,
+        model_kwargs={"response_format": {"type": "json_object"}}
+    ),
+    ollama_json_llm
+)
+
+turn_planner_chain = turn_planner_prompt | turn_planner_llm | JsonOutputParser()
+
 
 # ======================================================
 # 🆕 DOM ACTION EXECUTOR PROMPT
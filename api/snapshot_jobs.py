@@ -0,0 +1,261 @@
+import os
+import time
+import asyncio
+import tempfile
+from typing import Optional
+from dotenv import load_dotenv
+
+from utils.job_queue import JobQueue, RUNNING, ERROR
+
+load_dotenv()
+
+# ======================================================
+# SNAPSHOT JOB CONFIG
+# ======================================================
+
+# Formats are grouped into job kinds; each kind has its own concurrency cap
+# (shared by every worker process on the host).
+SNAPSHOT_FORMAT_KINDS = {
+    "pdf": "pdf",
+    "marketing_pdf": "pdf",
+    "business_report": "pdf",
+    "png": "png",
+    "docx": "docx",
+    "markdown": "markdown",
+    "research_paper": "special",
+    "ppt": "special",
+}
+
+
+def _parse_limits(spec: str) -> dict[str, int]:
+    limits = {}
+    for part in spec.split(","):
+        if "=" in part:
+            kind, value = part.split("=", 1)
+            limits[kind.strip()] = int(value)
+    return limits
+
+
+SNAPSHOT_KIND_LIMITS = _parse_limits(os.getenv("SNAPSHOT_KIND_LIMITS", "pdf=2,png=2,docx=1,markdown=4,special=1"))
+# Interactive screenshots first, long LLM reports last
+SNAPSHOT_KIND_PRIORITIES = {"png": 10, "markdown": 5, "docx": 0, "pdf": 0, "special": -5}
+
+SNAPSHOT_MAX_ATTEMPTS = int(os.getenv("SNAPSHOT_MAX_ATTEMPTS", "2"))
+SNAPSHOT_RESULT_TTL = float(os.getenv("SNAPSHOT_RESULT_TTL", "3600"))
+SNAPSHOT_LEASE_SECONDS = float(os.getenv("SNAPSHOT_LEASE_SECONDS", "60"))
+SNAPSHOT_JOB_TIMEOUT = float(os.getenv("SNAPSHOT_JOB_TIMEOUT", "600"))
+
+# Rendered artifacts go to object storage and are served through presigned URLs
+SNAPSHOT_UPLOAD_ENABLED = os.getenv("SNAPSHOT_UPLOAD_ENABLED", "true").lower() == "true"
+SNAPSHOT_PRESIGN_EXPIRY = int(os.getenv("SNAPSHOT_PRESIGN_EXPIRY", "3600"))
+
+DOWNLOAD_EXTENSIONS = {"pdf": ".pdf", "png": ".png", "markdown": ".md", "docx": ".docx"}
+MEDIA_FILE_TYPES = {"pdf": "pdf", "special": "pdf", "png": "image", "docx": "docx", "markdown": "markdown"}
+PREVIEW_MEDIA_TYPES = {"png": "image/png", "markdown": "text/markdown"}
+
+snapshot_queue = JobQueue()
+
+
+class InvalidSnapshotFormat(ValueError):
+    pass
+
+
+def snapshot_kind(format: str) -> str:
+    kind = SNAPSHOT_FORMAT_KINDS.get(format)
+    if not kind:
+        raise InvalidSnapshotFormat(f"Invalid format: {format}")
+    return kind
+
+
+async def enqueue_snapshot(payload: dict) -> str:
+    """Validates the format and queues a snapshot job. Returns the job/task id."""
+    kind = snapshot_kind(payload.get("format"))
+    return await snapshot_queue.aenqueue(
+        kind,
+        payload,
+        priority=SNAPSHOT_KIND_PRIORITIES.get(kind, 0),
+        max_attempts=SNAPSHOT_MAX_ATTEMPTS
+    )
+
+
+# ======================================================
+# JOB EXECUTION (runs in snapshot_worker.py, never in the API process)
+# ======================================================
+
+async def run_snapshot_job(payload: dict, progress_callback) -> dict:
+    """
+    Renders one snapshot.
+    Expects: payload with `url`, `format`, optional `raw_html`.
+    Returns: {"file_path", "filename", "timings"} (timings in ms, per capture phase
+    for browser captures, plus the job total).
+    """
+    started = time.perf_counter()
+    file_path, timings = await _render_snapshot(payload, progress_callback)
+    timings["total"] = round((time.perf_counter() - started) * 1000, 1)
+    return {"file_path": file_path, "filename": os.path.basename(file_path), "timings": timings}
+
+
+async def _render_snapshot(payload: dict, progress_callback) -> tuple[str, dict]:
+    from renderers import get_markdown
+    from snapshot import (
+        capture_page,
+        discard_output,
+        generate_special_format,
+        generate_smart_pdf,
+        generate_word_doc,
+        generate_markdown_report
+    )
+    from utils.render_pool import render_pool
+
+    url = payload["url"]
+    format = payload["format"]
+    raw_html = payload.get("raw_html")
+
+    if format == "markdown":
+        await progress_callback(20, "Extracting readable content...")
+        if raw_html:
+            md_content = await render_pool.run(get_markdown, url, raw_html)
+        else:
+            md_content = await generate_markdown_report(url)
+
+        # For markdown, we just store the content in a temporary file
+        temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=".md")
+        temp_file.close()
+        try:
+            with open(temp_file.name, "w") as f:
+                f.write(md_content)
+        except BaseException:
+            discard_output(temp_file.name)
+            raise
+        return temp_file.name, {}
+
+    if format in ["pdf", "marketing_pdf", "business_report"]:
+        template = "smart"
+        if format == "marketing_pdf": template = "marketing"
+        elif format == "business_report": template = "business"
+        return await generate_smart_pdf(url, template=template, html=raw_html, progress_callback=progress_callback), {}
+
+    if format == "docx":
+        return await generate_word_doc(url, html=raw_html, progress_callback=progress_callback), {}
+
+    if format == "png":
+        temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=".png")
+        output_path = temp_file.name
+        temp_file.close()
+        try:
+            timings = await capture_page(url, output_path, "png", html=raw_html, progress_callback=progress_callback)
+        except BaseException:
+            # Covers a SNAPSHOT_JOB_TIMEOUT cancellation as well as capture errors
+            discard_output(output_path)
+            raise
+        return output_path, timings
+
+    if format in ["research_paper", "ppt"]:
+        return await generate_special_format(url, target_format=format, html=raw_html, progress_callback=progress_callback), {}
+
+    raise InvalidSnapshotFormat(f"Invalid format: {format}")
+
+
+async def _register_media(user_id: int, file_type: str, file_url: str, filename: str, size: int, metadata: dict) -> int:
+    from sqlalchemy import insert
+    from db.database import AsyncSessionLocal
+    from db.models.media import Media
+
+    # Core insert on the table: the worker never needs the ORM relationship graph
+    media = Media.__table__
+    async with AsyncSessionLocal() as db:
+        media_id = (await db.execute(
+            insert(media).values(
+                user_id=user_id,
+                file_type=file_type,
+                source="snapshot",
+                file_url=file_url,
+                original_filename=filename,
+                file_size_bytes=size,
+                file_metadata=metadata
+            ).returning(media.c.id)
+        )).scalar()
+        await db.commit()
+    return media_id
+
+
+async def store_snapshot_artifact(job_id: str, payload: dict, result: dict) -> dict:
+    """
+    Streams the rendered file to object storage (multipart), removes the local copy and, for
+    authenticated requests, registers it in the user's media library.
+    If the upload fails the job still completes with the local file.
+    """
+    if not SNAPSHOT_UPLOAD_ENABLED:
+        return result
+
+    from utils.storage import storage
+
+    file_path = result["file_path"]
+    format = payload["format"]
+    filename = download_filename(job_id, format)
+    size = os.path.getsize(file_path)
+
+    ok, file_url, error = await storage.upload_path(file_path, filename, None, "snapshots")
+    if not ok:
+        print(f"⚠️ Snapshot {job_id} kept on local disk: {error}")
+        return result
+
+    await remove_job_files({"result": result})
+    result = {**result, "file_path": None, "file_url": file_url, "filename": filename, "size": size}
+
+    if payload.get("user_id"):
+        try:
+            result["media_id"] = await _register_media(
+                payload["user_id"], MEDIA_FILE_TYPES.get(SNAPSHOT_FORMAT_KINDS[format], "pdf"), file_url, filename, size,
+                {"url": payload["url"], "format": format, "task_id": job_id}
+            )
+        except Exception as e:
+            print(f"⚠️ Snapshot {job_id} uploaded but not added to media library: {e}")
+    return result
+
+
+async def remove_job_files(job: dict) -> None:
+    """Removes a job's artifact. Objects in a user's media library are left to /media."""
+    result = job.get("result") or {}
+    file_path = result.get("file_path")
+    if file_path and os.path.exists(file_path):
+        try:
+            await asyncio.to_thread(os.remove, file_path)
+        except OSError as e:
+            print(f"⚠️ Could not remove snapshot file {file_path}: {e}")
+
+    if result.get("file_url") and not result.get("media_id"):
+        from utils.storage import storage
+        await storage.delete_file(result["file_url"])
+
+
+# ======================================================
+# API VIEWS
+# ======================================================
+
+def status_view(job: dict, queue_position: Optional[int] = None) -> dict:
+    """Shape returned by /snapshot/status (kept compatible with the extension poller)."""
+    payload = job.get("payload") or {}
+    result = job.get("result") or {}
+    view = {
+        "status": "processing" if job["status"] == RUNNING else job["status"],
+        "progress": job["progress"],
+        "message": job.get("message") or "",
+        "format": payload.get("format"),
+        "url": payload.get("url"),
+        "file_path": result.get("file_path"),
+        "file_url": result.get("file_url"),
+        "media_id": result.get("media_id"),
+        "filename": result.get("filename"),
+        "timings": result.get("timings"),
+        "attempts": job["attempts"],
+    }
+    if job["status"] == ERROR:
+        view["error"] = job.get("error") or "Unknown error occurred"
+    if queue_position is not None:
+        view["queue_position"] = queue_position
+    return view
+
+
+def download_filename(task_id: str, format: str) -> str:
+    return f"snapshot_{task_id[:8]}" + DOWNLOAD_EXTENSIONS.get(format, ".pdf")
@@ -0,0 +1,146 @@
+"""
+Snapshot worker: executes queued snapshot jobs outside the API process.
+
+    python snapshot_worker.py
+
+Run one or more per host (they share the SQLite queue; per-kind caps are global).
+With SNAPSHOT_WORKER_MODE=subprocess (default) the API starts one automatically.
+"""
+import os
+import sys
+import uuid
+import signal
+import socket
+import asyncio
+import traceback
+
+# Add the current directory to sys.path to import local modules
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from snapshot_jobs import (
+    snapshot_queue,
+    run_snapshot_job,
+    remove_job_files,
+    store_snapshot_artifact,
+    InvalidSnapshotFormat,
+    SNAPSHOT_KIND_LIMITS,
+    SNAPSHOT_LEASE_SECONDS,
+    SNAPSHOT_JOB_TIMEOUT,
+    SNAPSHOT_RESULT_TTL,
+)
+from utils.render_pool import render_pool
+from utils.snapshot_cache import snapshot_cache, SNAPSHOT_SCRAPE_TTL, SNAPSHOT_REPORT_TTL
+
+SNAPSHOT_WORKER_CONCURRENCY = int(os.getenv("SNAPSHOT_WORKER_CONCURRENCY", "3"))
+SNAPSHOT_POLL_INTERVAL = float(os.getenv("SNAPSHOT_POLL_INTERVAL", "0.5"))
+SNAPSHOT_GC_INTERVAL = float(os.getenv("SNAPSHOT_GC_INTERVAL", "60"))
+
+
+class SnapshotWorker:
+    def __init__(self, queue=snapshot_queue, concurrency: int = SNAPSHOT_WORKER_CONCURRENCY):
+        self.queue = queue
+        self.concurrency = concurrency
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.active: set[asyncio.Task] = set()
+        self.stopping = asyncio.Event()
+
+    async def _heartbeat(self, job_id: str, state: dict):
+        # Keeps the lease alive during long phases that report no progress
+        while True:
+            await asyncio.sleep(SNAPSHOT_LEASE_SECONDS / 3)
+            await asyncio.to_thread(
+                self.queue.update_progress, job_id, self.owner, state["progress"], state["message"], SNAPSHOT_LEASE_SECONDS
+            )
+
+    async def execute(self, job: dict):
+        job_id = job["id"]
+        state = {"progress": 0, "message": "Starting..."}
+
+        async def progress_callback(progress: int, message: str):
+            state.update(progress=progress, message=message)
+            await asyncio.to_thread(
+                self.queue.update_progress, job_id, self.owner, progress, message, SNAPSHOT_LEASE_SECONDS
+            )
+
+        heartbeat = asyncio.create_task(self._heartbeat(job_id, state))
+        try:
+            result = await asyncio.wait_for(
+                run_snapshot_job(job["payload"], progress_callback), timeout=SNAPSHOT_JOB_TIMEOUT
+            )
+            await progress_callback(95, "Uploading...")
+            result = await store_snapshot_artifact(job_id, job["payload"], result)
+            if not await asyncio.to_thread(self.queue.complete, job_id, self.owner, result, SNAPSHOT_RESULT_TTL):
+                # Lease was lost (job deleted or reclaimed); don't leak the file
+                await remove_job_files({"result": result})
+            print(f"✅ Snapshot job {job_id} completed {result['timings']}")
+        except Exception as e:
+            traceback.print_exc()
+            error = "Timed out" if isinstance(e, asyncio.TimeoutError) else str(e)
+            status = await asyncio.to_thread(
+                self.queue.fail, job_id, self.owner, error, SNAPSHOT_RESULT_TTL,
+                not isinstance(e, InvalidSnapshotFormat)
+            )
+            print(f"❌ Snapshot job {job_id} failed ({status}): {error}")
+        finally:
+            heartbeat.cancel()
+
+    async def collect_garbage(self):
+        for job in await asyncio.to_thread(self.queue.collect_expired):
+            await remove_job_files(job)
+        if snapshot_cache:
+            await asyncio.to_thread(snapshot_cache.prune, max(SNAPSHOT_SCRAPE_TTL, SNAPSHOT_REPORT_TTL))
+
+    async def shutdown_renderers(self):
+        # Only close the browser pool if a job actually started it
+        browser_pool = sys.modules.get("utils.browser_pool")
+        if browser_pool:
+            await browser_pool.browser_pool.close()
+        await asyncio.to_thread(render_pool.shutdown)
+
+    async def run(self):
+        print(f"🚀 Snapshot worker {self.owner} started (concurrency {self.concurrency}, limits {SNAPSHOT_KIND_LIMITS})")
+        loop = asyncio.get_running_loop()
+        last_gc = 0.0
+        # Spawn render processes (and their ReportLab/WeasyPrint imports) before the first job
+        render_pool.warm()
+
+        while not self.stopping.is_set():
+            if loop.time() - last_gc > SNAPSHOT_GC_INTERVAL:
+                await self.collect_garbage()
+                last_gc = loop.time()
+
+            job = None
+            if len(self.active) < self.concurrency:
+                job = await asyncio.to_thread(
+                    self.queue.claim, self.owner, SNAPSHOT_KIND_LIMITS, SNAPSHOT_LEASE_SECONDS,
+                    ttl_seconds=SNAPSHOT_RESULT_TTL
+                )
+
+            if job:
+                task = asyncio.create_task(self.execute(job))
+                self.active.add(task)
+                task.add_done_callback(self.active.discard)
+                continue
+
+            try:
+                await asyncio.wait_for(self.stopping.wait(), timeout=SNAPSHOT_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+
+        # Let in-flight jobs finish; unfinished ones are re-queued when their lease expires
+        if self.active:
+            await asyncio.wait(self.active, timeout=SNAPSHOT_LEASE_SECONDS)
+        await self.shutdown_renderers()
+        print(f"👋 Snapshot worker {self.owner} stopped")
+
+
+async def main():
+    worker = SnapshotWorker()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, worker.stopping.set)
+    await worker.run()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
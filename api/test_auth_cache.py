@@ -0,0 +1,57 @@
+import os
+import sys
+import asyncio
+import tempfile
+
+# Add the current directory to sys.path to import local modules
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from fastapi import HTTPException
+from utils.auth import AuthService, RevokedTokenStore, create_access_token
+
+async def expect_401(service, header):
+    try:
+        await service.authenticate(header)
+    except HTTPException as e:
+        assert e.status_code == 401, e.status_code
+        return
+    raise AssertionError("expected 401")
+
+async def test_auth_cache():
+    print("🚀 Starting Auth Principal Cache Test...")
+
+    path = os.path.join(tempfile.mkdtemp(), "revoked_tokens.sqlite3")
+    service = AuthService(RevokedTokenStore(path))
+    header = f"Bearer {create_access_token({'sub': 'test@example.com', 'uid': 42})}"
+
+    print("--- Step 1: uid claim authenticates without a database ---")
+    principal = await service.authenticate(header)
+    assert (principal.id, principal.email) == (42, "test@example.com")
+
+    print("--- Step 2: Second request is served from the principal cache ---")
+    assert service.principals.get(header.replace("Bearer ", "")) == principal
+    assert await service.authenticate(header) == principal
+
+    print("--- Step 3: Bad headers are rejected ---")
+    await expect_401(service, None)
+    await expect_401(service, "Bearer not-a-jwt")
+
+    print("--- Step 4: Logout revokes the token for every worker on the host ---")
+    other_worker = AuthService(RevokedTokenStore(path))
+    assert await other_worker.authenticate(header) == principal
+    assert await service.revoke(header)
+    await expect_401(service, header)
+    other_worker.revoked.refresh()  # normally runs in the background every AUTH_REVOCATION_REFRESH seconds
+    await expect_401(other_worker, header)
+
+    print("--- Step 5: Login invalidation drops cached principals ---")
+    fresh = f"Bearer {create_access_token({'sub': 'test@example.com', 'uid': 42})}"
+    await service.authenticate(fresh)
+    service.invalidate_user(42)
+    assert service.principals.get(fresh.replace("Bearer ", "")) is None
+    assert (await service.authenticate(fresh)).id == 42
+
+    print("\n✅ Auth principal cache verified successfully!")
+
+if __name__ == "__main__":
+    asyncio.run(test_auth_cache())
@@ -0,0 +1,40 @@
+import os
+import sys
+import tempfile
+
+# Add the current directory to sys.path to import local modules
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from utils.embedding_cache import EmbeddingCache
+
+def test_embedding_cache():
+    print("🚀 Starting Embedding Cache Test...")
+
+    path = os.path.join(tempfile.mkdtemp(), "embedding_cache.sqlite3")
+    model = "text-embedding-3-small"
+    vectors = {
+        "hash_a": [0.25, 0.5, 0.75],
+        "hash_b": [1.0, -1.0, 0.0],
+    }
+
+    print("--- Step 1: Miss on empty cache ---")
+    cache = EmbeddingCache(path=path, memory_items=1)
+    assert cache.get_many(model, ["hash_a", "hash_b"]) == {}, "Empty cache should miss"
+
+    print("--- Step 2: Store and read back (memory tier holds 1 item) ---")
+    cache.put_many(model, vectors)
+    found = cache.get_many(model, ["hash_a", "hash_b", "hash_c"])
+    assert found == vectors, f"Expected both vectors back, got {found}"
+
+    print("--- Step 3: Keys are scoped by model ---")
+    assert cache.get_many("nomic-embed-text", ["hash_a"]) == {}, "Other model must not hit"
+
+    print("--- Step 4: Disk tier survives a new process-level cache ---")
+    fresh = EmbeddingCache(path=path, memory_items=10)
+    assert fresh.get_many(model, ["hash_b"]) == {"hash_b": vectors["hash_b"]}
+    assert ("text-embedding-3-small", "hash_b") in fresh.memory, "Disk hit should warm memory tier"
+
+    print("\n✅ Embedding cache verified successfully!")
+
+if __name__ == "__main__":
+    test_embedding_cache()
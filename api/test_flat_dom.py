@@ -0,0 +1,54 @@
+import os
+import sys
+import tempfile
+
+# Add the current directory to sys.path to import local modules
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import ormsgpack
+
+from utils.flat_dom import encode_flat_dom, FlatDomView, FlatDomError, is_msgpack
+from utils.page_state import PageStateStore, page_key
+from utils.text_processing import extract_clean_text_from_dom
+
+def test_flat_dom():
+    print("🚀 Starting Flat DOM Format Test...")
+
+    tree = {"tag": "main", "attrs": {"class": "feed"}, "children": [
+        {"tag": "h2", "children": [{"type": "text", "content": "Title"}]},
+        {"tag": "p", "children": [{"type": "text", "content": "Body text"}]},
+        {"tag": "input", "attrs": {"name": "q"}, "value": "typed", "checked": True}
+    ]}
+
+    print("--- Step 1: Encoding shares tag/attribute names and round-trips ---")
+    flat = encode_flat_dom(tree)
+    assert flat["sizes"] == [6, 2, 1, 2, 1, 1]
+    assert flat["strings"].count("main") == 1
+    view = FlatDomView(ormsgpack.unpackb(ormsgpack.packb(flat)))
+    assert [view.tag(i) for i in view.children(0)] == ["h2", "p", "input"]
+    assert view.attributes(0) == {"class": "feed"}
+    assert view.value_map() == {5: "typed"} and view.checked_set() == {5}
+    assert view.to_nested() == tree
+
+    print("--- Step 2: Extractors read the flat form directly ---")
+    assert extract_clean_text_from_dom(flat) == extract_clean_text_from_dom(tree)
+
+    print("--- Step 3: Malformed payloads and content types ---")
+    try:
+        FlatDomView({**flat, "sizes": flat["sizes"][:-1]})
+        assert False, "Expected FlatDomError"
+    except FlatDomError:
+        pass
+    assert is_msgpack("application/msgpack; charset=binary")
+    assert not is_msgpack("application/json")
+
+    print("--- Step 4: Page state keeps flat uploads patchable ---")
+    store = PageStateStore(path=os.path.join(tempfile.mkdtemp(), "page_states.sqlite3"))
+    state = store.put("test_user_6789", page_key("https://example.com", 1), {"domTree": flat})
+    state = store.apply("test_user_6789", state.ref, 1, [{"op": "remove", "path": [2]}])
+    assert len(state.payload["domTree"]["children"]) == 2
+
+    print("\n✅ Flat DOM format verified successfully!")
+
+if __name__ == "__main__":
+    test_flat_dom()
@@ -0,0 +1,66 @@
+import os
+import sys
+import json
+import tempfile
+
+# Add the current directory to sys.path to import local modules
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from utils.intent_router import IntentRouter, NaiveBayesRouter, PhraseMatcher, tokenize
+
+def test_intent_router():
+    print("🚀 Starting Intent Router Test...")
+
+    print("--- Step 1: Phrases match on token boundaries only ---")
+    matcher = PhraseMatcher({"it": None, "this page": None})
+    assert not matcher.any(tokenize("go with the flow"))
+    assert matcher.any(tokenize("Explain it"))
+    assert [p for p, _ in matcher.find(tokenize("is THIS page ok?"))] == ["this page"]
+
+    router = IntentRouter(threshold=0.9)
+
+    print("--- Step 2: Obvious queries are decided locally ---")
+    decision = router.route("summarize this page")
+    assert decision.needs_context and not decision.needs_actions and not decision.needs_video
+    assert decision.classification["primary_intent"] == "page_context"
+    assert decision.confidence >= 0.9
+
+    decision = router.route("hi")
+    assert not (decision.needs_context or decision.needs_actions)
+    assert decision.confidence >= 0.9
+
+    print("--- Step 3: Ambiguous queries go to the LLM planner ---")
+    assert router.route("open spotify and play lofi").confidence < 0.9
+    assert router.route("what is this video about", has_video=True).confidence < 0.9
+
+    print("--- Step 4: Video flag is impossible without a YouTube URL ---")
+    assert not router.route("summarize this video", has_video=False).needs_video
+
+    print("--- Step 5: Page-question gate keeps short follow-ups, not bare 'it' ---")
+    for query in ["summarize it", "explain", "tl;dr", "what is that", "what does it mean", "summarize this page"]:
+        assert router.asks_about_page(query), query
+    for query in ["what is it", "is it raining in paris", "write a poem about the sea", "hi"]:
+        assert not router.asks_about_page(query), query
+
+    print("--- Step 6: Naive Bayes trains from planner logs and round-trips ---")
+    records = [
+        {"question": "open amazon and search shoes", "classification": {"primary_intent": "product"},
+         "needs_context": False, "needs_actions": True, "needs_video": False},
+        {"question": "what does this paragraph mean", "classification": {"primary_intent": "page_context"},
+         "needs_context": True, "needs_actions": False, "needs_video": False},
+    ] * 10
+    model = NaiveBayesRouter.train(records)
+    lp = model.log_proba("needs_actions", tokenize("open amazon"))
+    assert lp["true"] > lp["false"]
+
+    path = os.path.join(tempfile.mkdtemp(), "model.json")
+    model.save(path)
+    with open(path) as f:
+        assert json.load(f)["version"] == 1
+    assert NaiveBayesRouter.load(path).log_proba("needs_actions", tokenize("open amazon")) == lp
+    assert NaiveBayesRouter.load(path + ".missing") is None
+
+    print("\n✅ Intent router verified successfully!")
+
+if __name__ == "__main__":
+    test_intent_router()
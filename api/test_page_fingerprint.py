@@ -0,0 +1,74 @@
+import os
+import sys
+import asyncio
+import tempfile
+
+# Add the current directory to sys.path to import local modules
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from utils.page_fingerprint import PageFingerprintIndex, fingerprint_text
+from utils.embedding_cache import EmbeddingCache
+from utils.vector_index import InMemoryVectorIndex
+import utils.vector_store as vector_store_module
+
+class FlakyEmbeddings:
+    """Stands in for the Ollama client; fails until `up` is set."""
+    def __init__(self):
+        self.up = False
+
+    async def aembed_documents(self, texts):
+        if not self.up:
+            raise ConnectionError("embedding provider down")
+        return [[1.0] * 8 for _ in texts]
+
+async def save_during_outage(index: PageFingerprintIndex):
+    tmp = tempfile.mkdtemp()
+    vector_store_module.page_fingerprints = index
+    vector_store_module.embedding_cache = EmbeddingCache(path=os.path.join(tmp, "embedding_cache.sqlite3"))
+    service = vector_store_module.VectorStoreService()
+    service.index = InMemoryVectorIndex()
+    service.openai_embeddings = None
+    service.ollama_embeddings = FlakyEmbeddings()
+
+    user_id, url, text = "test_user_6789", "https://example.com/outage", "Paragraph about outages. " * 200
+    assert await service.process_and_save_context(user_id, 1, url, content=text) == 0
+    assert index.get(user_id, url, 1) is None, "Placeholder vectors must not be fingerprinted"
+    assert not await service.is_page_unchanged(user_id, url, 1, text)
+
+    service.ollama_embeddings.up = True
+    saved = await service.process_and_save_context(user_id, 1, url, content=text)
+    assert saved > 0, "Next save must embed the page again"
+    assert index.get(user_id, url, 1).page_hash == fingerprint_text(text)
+
+def test_page_fingerprint():
+    print("🚀 Starting Page Fingerprint Index Test...")
+
+    index = PageFingerprintIndex(path=os.path.join(tempfile.mkdtemp(), "page_fingerprints.sqlite3"))
+    user_id, url, conversation_id = "test_user_6789", "https://example.com/test-dedup", 9999
+
+    print("--- Step 1: Unknown page has no fingerprint ---")
+    assert index.get(user_id, url, conversation_id) is None
+
+    print("--- Step 2: Fingerprint is stable for identical text ---")
+    text = "This is a unique piece of content for testing deduplication logic." * 2000
+    assert fingerprint_text(text) == fingerprint_text(str(text))
+    assert fingerprint_text(text) != fingerprint_text(text + " ")
+
+    print("--- Step 3: Stored fingerprint round-trips through SQLite ---")
+    index.put(user_id, url, conversation_id, fingerprint_text(text), ["a", "b", "b"])
+    index.memory.clear()
+    stored = index.get(user_id, url, conversation_id)
+    assert stored.page_hash == fingerprint_text(text)
+    assert stored.chunk_hashes == {"a", "b"}
+
+    print("--- Step 4: Conversation is part of the key ---")
+    assert index.get(user_id, url, conversation_id + 1) is None
+    assert index.get(user_id, url, None) is None
+
+    print("--- Step 5: Embedding outage leaves the page unrecorded ---")
+    asyncio.run(save_during_outage(index))
+
+    print("\n✅ Page fingerprint index verified successfully!")
+
+if __name__ == "__main__":
+    test_page_fingerprint()
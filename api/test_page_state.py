@@ -0,0 +1,75 @@
+import os
+import sys
+import time
+import tempfile
+
+# Add the current directory to sys.path to import local modules
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from utils.page_state import (
+    PageStateStore,
+    PageStateError,
+    UnknownPageState,
+    VersionConflict,
+    page_key
+)
+
+def test_page_state():
+    print("🚀 Starting Page State Delta Test...")
+
+    store = PageStateStore(path=os.path.join(tempfile.mkdtemp(), "page_states.sqlite3"))
+    user_id, url = "test_user_6789", "https://example.com/feed"
+    tree = {"tag": "main", "children": [
+        {"tag": "h1", "text": "Feed"},
+        {"tag": "ul", "children": [{"tag": "li", "text": "first"}, {"tag": "li", "text": "second"}]}
+    ]}
+
+    print("--- Step 1: Full upload creates version 1 ---")
+    state = store.put(user_id, page_key(url, 7), {"url": url, "textContent": "Feed first second", "domTree": tree})
+    assert state.version == 1
+
+    print("--- Step 2: Node-level delta patches the stored tree ---")
+    state = store.apply(user_id, state.ref, 1, [
+        {"op": "insert", "path": [1, 0], "node": {"tag": "li", "text": "new"}},
+        {"op": "set", "path": [0], "fields": {"text": "Feed (3)"}}
+    ], {"title": "Feed"})
+    assert state.version == 2
+    assert [li["text"] for li in state.payload["domTree"]["children"][1]["children"]] == ["new", "first", "second"]
+    assert state.payload["domTree"]["children"][0]["text"] == "Feed (3)"
+    assert "textContent" not in state.payload, "Stale textContent must be dropped when the tree changes"
+    assert tree["children"][1]["children"][0]["text"] == "first", "Previous tree must not be mutated"
+
+    print("--- Step 3: Stale base version and unknown refs are rejected ---")
+    try:
+        store.apply(user_id, state.ref, 1, [])
+        assert False, "Expected VersionConflict"
+    except VersionConflict as e:
+        assert e.version == 2
+    try:
+        store.apply("another_user", state.ref, 2, [])
+        assert False, "Expected UnknownPageState"
+    except UnknownPageState:
+        pass
+    try:
+        store.apply(user_id, state.ref, 2, [{"op": "remove", "path": [5]}])
+        assert False, "Expected PageStateError"
+    except PageStateError:
+        pass
+
+    print("--- Step 4: Logged deltas replay after a memory miss ---")
+    store.memory.clear()
+    reloaded = store.get(user_id, state.ref)
+    assert reloaded.version == 2 and reloaded.payload == state.payload
+
+    print("--- Step 5: Reads keep an unchanged page alive past the TTL ---")
+    conn = store._connection()
+    conn.execute("UPDATE page_states SET updated_at = ? WHERE ref = ?", (time.time() - store.ttl + 5, state.ref))
+    conn.commit()
+    assert store.get(user_id, state.ref) is not None
+    touched = conn.execute("SELECT updated_at FROM page_states WHERE ref = ?", (state.ref,)).fetchone()[0]
+    assert time.time() - touched < 5, "get() must refresh updated_at"
+
+    print("\n✅ Page state deltas verified successfully!")
+
+if __name__ == "__main__":
+    test_page_state()
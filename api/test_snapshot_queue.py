@@ -0,0 +1,76 @@
+import os
+import sys
+import time
+import asyncio
+import tempfile
+
+# Add the current directory to sys.path to import local modules
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from utils.job_queue import JobQueue, QUEUED, RUNNING, COMPLETED, ERROR
+
+def test_snapshot_queue():
+    print("🚀 Starting Snapshot Job Queue Test...")
+
+    path = os.path.join(tempfile.mkdtemp(), "snapshot_jobs.sqlite3")
+    queue = JobQueue(path, retry_backoff=0)
+    limits = {"pdf": 1, "png": 2}
+
+    print("--- Step 1: Higher priority is claimed first, then FIFO ---")
+    pdf_a = queue.enqueue("pdf", {"format": "pdf"})
+    pdf_b = queue.enqueue("pdf", {"format": "pdf"})
+    png = queue.enqueue("png", {"format": "png"}, priority=10)
+    assert queue.queue_position(pdf_b) == 2
+    assert queue.claim("w1", limits, 30)["id"] == png
+    assert queue.claim("w1", limits, 30)["id"] == pdf_a
+
+    print("--- Step 2: Per-kind cap holds across workers ---")
+    other_worker = JobQueue(path)
+    assert other_worker.claim("w2", limits, 30) is None
+    assert queue.get(pdf_b)["status"] == QUEUED
+
+    print("--- Step 3: Progress renews the lease; only the owner may update ---")
+    version = queue.version(pdf_a)
+    assert queue.update_progress(pdf_a, "w1", 40, "Rendering...", 30)
+    assert not queue.update_progress(pdf_a, "w2", 50, "Stolen", 30)
+    assert queue.get(pdf_a)["progress"] == 40
+
+    print("--- Step 3b: Only real changes bump the version (heartbeats don't) ---")
+    assert queue.version(pdf_a) == version + 1
+    assert queue.update_progress(pdf_a, "w1", 40, "Rendering...", 30)
+    assert queue.version(pdf_a) == version + 1
+    assert asyncio.run(queue.wait_for_change(pdf_a, version + 1, timeout=0.3)) == version + 1
+    assert asyncio.run(queue.wait_for_change(pdf_a, version, timeout=5)) == version + 1
+
+    print("--- Step 4: Failures retry until max_attempts ---")
+    assert queue.fail(pdf_a, "w1", "boom", ttl_seconds=60) == QUEUED
+    job = queue.claim("w1", limits, 30)
+    assert job["id"] == pdf_a and job["attempts"] == 2
+    assert queue.fail(pdf_a, "w1", "boom", ttl_seconds=60, retryable=False) == ERROR
+    assert queue.get(pdf_a)["error"] == "boom"
+
+    print("--- Step 5: Expired leases are re-queued for another worker ---")
+    job = queue.claim("w1", limits, -1)
+    assert job["id"] == pdf_b and queue.get(pdf_b)["status"] == RUNNING
+    reclaimed = other_worker.claim("w2", limits, 30)
+    assert reclaimed["id"] == pdf_b and reclaimed["lease_owner"] == "w2"
+    assert not queue.complete(pdf_b, "w1", {"file_path": "/tmp/x"}, 60)
+
+    print("--- Step 5b: A lost lease on the last attempt fails the job and expires it ---")
+    lost = queue.enqueue("png", {"format": "png"}, max_attempts=1)
+    assert queue.claim("w1", limits, -1)["id"] == lost
+    assert other_worker.claim("w2", {"png": 0}, 30, ttl_seconds=60) is None
+    assert queue.get(lost)["status"] == ERROR and queue.get(lost)["expires_at"] is not None
+
+    print("--- Step 6: Completion and garbage collection ---")
+    assert other_worker.complete(pdf_b, "w2", {"file_path": "/tmp/x"}, 60)
+    assert queue.get(pdf_b)["status"] == COMPLETED
+    assert queue.get(pdf_b)["result"] == {"file_path": "/tmp/x"}
+    expired = queue.collect_expired(now=time.time() + 120)
+    assert {j["id"] for j in expired} == {pdf_a, pdf_b, lost}
+    assert queue.get(pdf_b) is None and queue.get(png)["status"] == RUNNING
+
+    print("✅ Snapshot Job Queue Test Passed!")
+
+if __name__ == "__main__":
+    test_snapshot_queue()
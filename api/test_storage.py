@@ -0,0 +1,119 @@
+import os
+import sys
+import asyncio
+import tempfile
+
+# Add the current directory to sys.path to import local modules
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from utils import media_upload
+from utils.storage import LocalStorageBackend
+from utils.media_upload import stream_upload, UploadTooLarge, user_upload_prefix
+
+PART = 1024
+
+class TrackingBackend(LocalStorageBackend):
+    """Local backend that records multipart calls and how many parts were in flight at once."""
+
+    def __init__(self, root: str, fail_part: int = 0):
+        super().__init__(root=root, base_url="http://test/storage")
+        self.fail_part = fail_part
+        self.active = 0
+        self.max_active = 0
+        self.calls = []
+
+    async def put_object(self, object_key, data, content_type, filename):
+        self.calls.append("put")
+        await super().put_object(object_key, data, content_type, filename)
+
+    async def create_multipart_upload(self, object_key, content_type, filename):
+        self.calls.append("create")
+        return await super().create_multipart_upload(object_key, content_type, filename)
+
+    async def upload_part(self, object_key, upload_id, part_number, data):
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        try:
+            # Earlier parts finish last, so completion order is reversed
+            await asyncio.sleep(0.05 / part_number)
+            if part_number == self.fail_part:
+                raise OSError("part upload failed")
+            return await super().upload_part(object_key, upload_id, part_number, data)
+        finally:
+            self.active -= 1
+
+    async def abort_multipart_upload(self, object_key, upload_id):
+        self.calls.append("abort")
+        await super().abort_multipart_upload(object_key, upload_id)
+
+    def leftovers(self):
+        return [
+            os.path.join(dirpath, name)
+            for dirpath, _, names in os.walk(self.root) for name in names
+        ] + os.listdir(os.path.join(self.root, ".multipart"))
+
+async def body(data: bytes, chunk: int = 300):
+    for i in range(0, len(data), chunk):
+        yield data[i:i + chunk]
+
+def test_storage():
+    print("🚀 Starting Storage Backend Test...")
+
+    # Tiny parts so multipart paths run without megabytes of test data
+    media_upload._MIN_PART_BYTES = PART
+    media_upload.R2_MULTIPART_CHUNK_MB = 0
+    media_upload.R2_MULTIPART_CONCURRENCY = 2
+    data = bytes(i % 251 for i in range(PART * 6 + 123))
+
+    print("--- Step 1: Local backend round-trips bytes and rejects escaping keys ---")
+    local = LocalStorageBackend(root=tempfile.mkdtemp(), base_url="http://test/storage")
+    ok, file_url, error = asyncio.run(local.upload_bytes(b"hello", "note.txt", "text/plain", "uploads"))
+    assert ok and not error and file_url.startswith("http://test/storage/uploads/")
+    object_key = file_url.replace("http://test/storage/", "")
+    assert asyncio.run(local.object_size(object_key)) == 5
+    assert asyncio.run(local.delete_file(file_url)) == (True, "")
+    assert asyncio.run(local.object_size(object_key)) is None
+    assert asyncio.run(local.object_size("../outside.txt")) is None
+    assert not asyncio.run(local.delete_file("http://test/storage/../outside.txt"))[0]
+
+    print("--- Step 2: Small bodies become a single PUT ---")
+    backend = TrackingBackend(tempfile.mkdtemp())
+    uploaded = asyncio.run(stream_upload(body(b"x" * 500), "small.bin", "application/octet-stream", backend=backend))
+    assert backend.calls == ["put"]
+    assert uploaded.size == 500 and uploaded.file_url == backend.public_url(uploaded.object_key)
+    with open(backend._path(uploaded.object_key), "rb") as f:
+        assert f.read() == b"x" * 500
+
+    print("--- Step 3: Parts assemble in order and stay within the parallel window ---")
+    backend = TrackingBackend(tempfile.mkdtemp())
+    prefix = user_upload_prefix("uploads", 42)
+    uploaded = asyncio.run(stream_upload(body(data), "big.bin", "application/octet-stream", prefix.rstrip("/"), backend=backend))
+    assert backend.calls == ["create"]
+    assert backend.max_active == media_upload.R2_MULTIPART_CONCURRENCY
+    assert uploaded.object_key.startswith(prefix) and uploaded.size == len(data)
+    with open(backend._path(uploaded.object_key), "rb") as f:
+        assert f.read() == data
+    assert os.listdir(os.path.join(backend.root, ".multipart")) == []
+
+    print("--- Step 4: Oversized bodies abort the multipart upload ---")
+    backend = TrackingBackend(tempfile.mkdtemp())
+    try:
+        asyncio.run(stream_upload(body(data), "big.bin", "application/octet-stream", max_bytes=PART * 3, backend=backend))
+        assert False, "Expected UploadTooLarge"
+    except UploadTooLarge:
+        pass
+    assert backend.calls == ["create", "abort"] and backend.leftovers() == []
+
+    print("--- Step 5: A failed part aborts the upload ---")
+    backend = TrackingBackend(tempfile.mkdtemp(), fail_part=2)
+    try:
+        asyncio.run(stream_upload(body(data), "big.bin", "application/octet-stream", backend=backend))
+        assert False, "Expected OSError"
+    except OSError:
+        pass
+    assert backend.calls == ["create", "abort"] and backend.leftovers() == []
+
+    print("\n✅ Storage backend and streamed uploads verified successfully!")
+
+if __name__ == "__main__":
+    test_storage()
@@ -0,0 +1,81 @@
+import asyncio
+import os
+import sys
+import tempfile
+
+# Add the current directory to sys.path to import local modules
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from utils.vector_index import InMemoryVectorIndex, ChromaVectorIndex, UpsertBatcher, to_chroma_where
+
+def make_vectors(user_id: str, count: int, dim: int = 8):
+    return [
+        {
+            "id": f"{user_id}_{i}",
+            "values": [float((i + j) % 5) for j in range(dim)],
+            "metadata": {"user_id": user_id, "url": "https://example.com", "conversation_id": 1, "content": f"chunk {i}"}
+        }
+        for i in range(count)
+    ]
+
+async def test_vector_index():
+    print("🚀 Starting Vector Index Test...")
+
+    print("--- Step 1: Concurrent saves from many users are coalesced ---")
+    index = InMemoryVectorIndex(max_batch_size=10)
+    counts = await asyncio.gather(*(index.upsert(make_vectors(f"user_{u}", 7)) for u in range(6)))
+    assert counts == [7] * 6
+    assert len(index) == 42
+    # 42 vectors in batches of 10 -> 5 shared requests instead of 6 per-user ones
+    assert index.batcher.batches_sent == 5, f"Expected 5 batches, got {index.batcher.batches_sent}"
+
+    print("--- Step 2: Metadata filter scopes queries per user ---")
+    matches = await index.query(make_vectors("user_3", 1)[0]["values"], top_k=3, filter={"user_id": "user_3"})
+    assert len(matches) == 3 and all(m["metadata"]["user_id"] == "user_3" for m in matches)
+    assert matches[0]["id"] == "user_3_0" and matches[0]["score"] > 0.99
+
+    print("--- Step 3: Delete removes vectors ---")
+    await index.delete(["user_3_0"])
+    matches = await index.query(make_vectors("user_3", 1)[0]["values"], top_k=1, filter={"user_id": {"$eq": "user_3"}})
+    assert matches[0]["id"] != "user_3_0"
+
+    print("--- Step 4: A failed batch fails every caller in it ---")
+    async def failing_send(vectors, namespace):
+        raise RuntimeError("upstream 500")
+    batcher = UpsertBatcher(failing_send, linger_ms=0)
+    try:
+        await batcher.submit(make_vectors("user_x", 3))
+        raise AssertionError("submit should have raised")
+    except RuntimeError:
+        pass
+
+    print("--- Step 5: Byte cap splits oversized batches ---")
+    sizes = []
+    async def record_send(vectors, namespace):
+        sizes.append(len(vectors))
+    batcher = UpsertBatcher(record_send, max_batch_size=100, max_batch_bytes=100_000, linger_ms=0)
+    await batcher.submit(make_vectors("user_y", 20, dim=1536))
+    assert sum(sizes) == 20 and max(sizes) < 20, f"Expected byte-capped batches, got {sizes}"
+
+    print("--- Step 6: Embedded HNSW backend (offline) ---")
+    assert to_chroma_where({"user_id": "1", "url": "u"}) == {"$and": [{"user_id": {"$eq": "1"}}, {"url": {"$eq": "u"}}]}
+    try:
+        chroma = ChromaVectorIndex(path=tempfile.mkdtemp(), shards=4)
+    except ImportError:
+        print("⚠️ chromadb not installed, skipping HNSW backend checks")
+    else:
+        for u in range(6):
+            await chroma.upsert(make_vectors(f"user_{u}", 7))
+        probe = make_vectors("user_3", 1)[0]["values"]
+        matches = await chroma.query(probe, top_k=3, filter={"user_id": "user_3", "conversation_id": 1})
+        assert len(matches) == 3 and all(m["metadata"]["user_id"] == "user_3" for m in matches)
+        assert matches[0]["score"] > 0.99
+        await chroma.delete(["user_3_0"])
+        matches = await chroma.query(probe, top_k=10, filter={"user_id": "user_3"})
+        assert "user_3_0" not in [m["id"] for m in matches] and len(matches) == 6
+        assert await chroma.query(probe, filter={"user_id": "nobody"}) == []
+
+    print("\n✅ Vector index verified successfully!")
+
+if __name__ == "__main__":
+    asyncio.run(test_vector_index())
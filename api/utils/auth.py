@@ -0,0 +1,235 @@
+import os
+import time
+import uuid
+import sqlite3
+import asyncio
+import hashlib
+from threading import Lock
+from datetime import datetime, timedelta
+from typing import NamedTuple, Optional
+from fastapi import HTTPException
+from jose import JWTError, jwt
+from sqlalchemy import select
+from dotenv import load_dotenv
+
+from sync_schemas import SECRET_KEY, ALGORITHM, ACCESS_TOKEN_EXPIRE_MINUTES
+from utils.lru_cache import LRUCache
+from utils.sqlite_store import SQLiteStore
+
+load_dotenv()
+
+API_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+AUTH_PRINCIPAL_CACHE_TTL = float(os.getenv("AUTH_PRINCIPAL_CACHE_TTL", "300"))
+AUTH_PRINCIPAL_CACHE_ITEMS = int(os.getenv("AUTH_PRINCIPAL_CACHE_ITEMS", "10000"))
+AUTH_REVOCATION_PATH = os.getenv("AUTH_REVOCATION_PATH", os.path.join(API_DIR, "revoked_tokens.sqlite3"))
+# How often each worker pulls logouts made on other workers into its memory denylist
+AUTH_REVOCATION_REFRESH = float(os.getenv("AUTH_REVOCATION_REFRESH", "2"))
+
+
+class Principal(NamedTuple):
+    """Authenticated caller, built from JWT claims (no ORM session attached)."""
+    id: int
+    email: str
+    token_id: str
+    expires_at: float
+
+
+def create_access_token(data: dict):
+    """
+    Issues a session JWT. Callers pass `sub` (email) and `uid` (users.id) so requests
+    can be authenticated from the claims alone; `jti` makes the token revocable.
+    """
+    to_encode = data.copy()
+    now = datetime.utcnow()
+    to_encode.update({
+        "exp": now + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES),
+        "iat": now,
+        "jti": uuid.uuid4().hex
+    })
+    return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+
+
+def _bearer_token(authorization: Optional[str]) -> str:
+    if not authorization or not authorization.startswith("Bearer "):
+        raise HTTPException(status_code=401, detail="Missing or invalid authorization header")
+    return authorization.replace("Bearer ", "")
+
+
+def _token_id(token: str, payload: dict) -> str:
+    # Tokens issued before `jti` existed are identified by their hash
+    return payload.get("jti") or hashlib.sha256(token.encode()).hexdigest()
+
+
+class RevokedTokenStore(SQLiteStore):
+    """
+    Host-local denylist of logged-out token ids, shared by every worker process.
+    Rows are kept only until the token would have expired anyway.
+
+    Requests check only the in-memory copy; `refresh` (run off the event loop
+    every AUTH_REVOCATION_REFRESH seconds) pulls in revocations from other workers.
+    """
+
+    SCHEMA = ("""
+        CREATE TABLE IF NOT EXISTS revoked_tokens (
+            token_id TEXT PRIMARY KEY,
+            expires_at REAL NOT NULL
+        )
+    """,)
+
+    def __init__(self, path: str = AUTH_REVOCATION_PATH):
+        super().__init__(path)
+        self.memory = LRUCache(max_items=AUTH_PRINCIPAL_CACHE_ITEMS)
+        self.refreshed_at = 0.0
+        self._refresh_task: Optional[asyncio.Task] = None
+
+    def revoke(self, token_id: str, expires_at: float) -> None:
+        ttl = max(expires_at - time.time(), 1)
+        self.memory.set(token_id, True, ttl=ttl)
+        try:
+            with self._lock:
+                conn = self._connection()
+                conn.execute("INSERT OR REPLACE INTO revoked_tokens VALUES (?, ?)", (token_id, expires_at))
+                conn.execute("DELETE FROM revoked_tokens WHERE expires_at < ?", (time.time(),))
+                conn.commit()
+        except sqlite3.Error as e:
+            print(f"⚠️ Token revocation write failed: {e}")
+
+    def is_revoked_cached(self, token_id: str) -> bool:
+        """Memory-only check for the request hot path."""
+        return bool(self.memory.get(token_id))
+
+    def refresh(self) -> None:
+        """Loads every unexpired revocation into memory (the table only holds live tokens)."""
+        now = time.time()
+        try:
+            with self._lock:
+                rows = self._connection().execute(
+                    "SELECT token_id, expires_at FROM revoked_tokens WHERE expires_at > ?", (now,)
+                ).fetchall()
+        except sqlite3.Error as e:
+            print(f"⚠️ Token revocation refresh failed: {e}")
+            return
+        finally:
+            self.refreshed_at = now
+        for token_id, expires_at in rows:
+            self.memory.set(token_id, True, ttl=expires_at - now)
+
+    def schedule_refresh(self) -> None:
+        """Starts a background refresh when the memory copy is stale (never blocks the caller)."""
+        if time.time() - self.refreshed_at < AUTH_REVOCATION_REFRESH:
+            return
+        if self._refresh_task is not None and not self._refresh_task.done():
+            return
+        self._refresh_task = asyncio.get_running_loop().create_task(asyncio.to_thread(self.refresh))
+
+    def is_revoked(self, token_id: str) -> bool:
+        if self.memory.get(token_id):
+            return True
+        try:
+            with self._lock:
+                row = self._connection().execute(
+                    "SELECT expires_at FROM revoked_tokens WHERE token_id = ?", (token_id,)
+                ).fetchone()
+        except sqlite3.Error as e:
+            print(f"⚠️ Token revocation read failed: {e}")
+            return False
+        if row and row[0] > time.time():
+            self.memory.set(token_id, True, ttl=row[0] - time.time())
+            return True
+        return False
+
+
+class AuthService:
+    """
+    Resolves `Authorization: Bearer <jwt>` to a Principal.
+
+    Hot path (token already seen and not revoked): two in-memory LRU hits, no JWT
+    decode, no SQLite read and no Postgres round trip. Tokens carrying `uid` never
+    touch the database; legacy email-only tokens are looked up once and cached.
+    """
+
+    def __init__(self, revoked: Optional[RevokedTokenStore] = None):
+        self.principals = LRUCache(max_items=AUTH_PRINCIPAL_CACHE_ITEMS, ttl=AUTH_PRINCIPAL_CACHE_TTL)
+        self.revoked = revoked or RevokedTokenStore()
+        self._tokens_by_user: dict[int, set] = {}
+        self._lock = Lock()
+
+    def _remember(self, token: str, principal: Principal) -> None:
+        ttl = min(AUTH_PRINCIPAL_CACHE_TTL, max(principal.expires_at - time.time(), 0))
+        if ttl <= 0:
+            return
+        self.principals.set(token, principal, ttl=ttl)
+        with self._lock:
+            # Forget tokens the LRU already evicted so the index stays bounded
+            tokens = {t for t in self._tokens_by_user.get(principal.id, ()) if t in self.principals}
+            tokens.add(token)
+            self._tokens_by_user[principal.id] = tokens
+
+    async def _lookup_user_id(self, email: str) -> int:
+        from db.database import AsyncSessionLocal
+        from db.models.user import User
+
+        async with AsyncSessionLocal() as db:
+            user_id = (await db.execute(select(User.id).where(User.email == email))).scalar()
+        if user_id is None:
+            raise HTTPException(status_code=404, detail="User not found")
+        return user_id
+
+    async def authenticate(self, authorization: Optional[str]) -> Principal:
+        token = _bearer_token(authorization)
+
+        principal = self.principals.get(token)
+        if principal is None:
+            try:
+                payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+            except JWTError:
+                raise HTTPException(status_code=401, detail="Invalid token")
+
+            email = payload.get("sub")
+            if email is None:
+                raise HTTPException(status_code=401, detail="Invalid token")
+
+            user_id = payload.get("uid")
+            if user_id is None:
+                user_id = await self._lookup_user_id(email)
+
+            principal = Principal(
+                id=int(user_id),
+                email=email,
+                token_id=_token_id(token, payload),
+                expires_at=float(payload.get("exp") or 0)
+            )
+            if await asyncio.to_thread(self.revoked.is_revoked, principal.token_id):
+                raise HTTPException(status_code=401, detail="Token revoked")
+            self._remember(token, principal)
+            return principal
+
+        # Logouts on other workers reach the memory denylist within AUTH_REVOCATION_REFRESH
+        self.revoked.schedule_refresh()
+        if principal.expires_at <= time.time() or self.revoked.is_revoked_cached(principal.token_id):
+            self.principals.pop(token)
+            raise HTTPException(status_code=401, detail="Invalid token")
+        return principal
+
+    def invalidate_user(self, user_id: int) -> None:
+        """Drops every cached principal for a user (e.g. on a fresh login)."""
+        with self._lock:
+            tokens = self._tokens_by_user.pop(user_id, set())
+        for token in tokens:
+            self.principals.pop(token)
+
+    async def revoke(self, authorization: Optional[str]) -> bool:
+        """Logout: denylists the token until its expiry. Returns False for unusable tokens."""
+        try:
+            token = _bearer_token(authorization)
+            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        except (HTTPException, JWTError):
+            return False
+
+        self.principals.pop(token)
+        await asyncio.to_thread(self.revoked.revoke, _token_id(token, payload), float(payload.get("exp") or 0))
+        return True
+
+
+auth_service = AuthService()
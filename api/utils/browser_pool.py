@@ -0,0 +1,145 @@
+import os
+import asyncio
+from contextlib import asynccontextmanager
+from dotenv import load_dotenv
+from playwright.async_api import async_playwright, Browser, Page
+
+load_dotenv()
+
+BROWSER_POOL_SIZE = int(os.getenv("BROWSER_POOL_SIZE", "2"))
+BROWSER_POOL_MAX_PAGES = int(os.getenv("BROWSER_POOL_MAX_PAGES", "4"))
+BROWSER_MAX_USES = int(os.getenv("BROWSER_MAX_USES", "50"))
+BROWSER_MAX_JS_HEAP_MB = float(os.getenv("BROWSER_MAX_JS_HEAP_MB", "512"))
+BROWSER_LAUNCH_ARGS = ["--no-sandbox", "--disable-setuid-sandbox", "--disable-dev-shm-usage"]
+
+DEFAULT_USER_AGENT = "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/121.0.0.0 Safari/537.36"
+
+
+class _PooledBrowser:
+    def __init__(self, browser: Browser):
+        self.browser = browser
+        self.uses = 0
+        self.active = 0
+        self.retiring = False
+        browser.on("disconnected", lambda _: setattr(self, "retiring", True))
+
+    @property
+    def available(self) -> bool:
+        return not self.retiring and self.browser.is_connected()
+
+
+class BrowserPool:
+    """
+    Long-lived Chromium instances shared by every capture in the process.
+
+    - Each `page()` gets a fresh, isolated context (cookies/storage) on a warm browser.
+    - At most `max_pages` pages are open at once; callers wait for a slot.
+    - A browser is retired after `max_uses` pages or when a page's JS heap exceeds
+      `max_heap_mb` (leaky sites), and closed once its last page is released.
+    - Crashed/disconnected browsers are dropped and replaced on demand.
+    """
+
+    def __init__(
+        self,
+        size: int = BROWSER_POOL_SIZE,
+        max_pages: int = BROWSER_POOL_MAX_PAGES,
+        max_uses: int = BROWSER_MAX_USES,
+        max_heap_mb: float = BROWSER_MAX_JS_HEAP_MB
+    ):
+        self.size = size
+        self.max_uses = max_uses
+        self.max_heap_bytes = max_heap_mb * 1024 * 1024
+        self._pages = asyncio.Semaphore(max_pages)
+        self._lock = asyncio.Lock()
+        self._playwright = None
+        self._browsers: list[_PooledBrowser] = []
+        self._stats = {"launches": 0, "retired": 0, "pages": 0}
+
+    async def _launch(self) -> _PooledBrowser:
+        if not self._playwright:
+            self._playwright = await async_playwright().start()
+        browser = await self._playwright.chromium.launch(args=BROWSER_LAUNCH_ARGS)
+        self._stats["launches"] += 1
+        print(f"🚀 Browser pool launched Chromium ({len(self._browsers) + 1}/{self.size})")
+        return _PooledBrowser(browser)
+
+    async def _close(self, pooled: _PooledBrowser) -> None:
+        if pooled in self._browsers:
+            self._browsers.remove(pooled)
+        self._stats["retired"] += 1
+        try:
+            await pooled.browser.close()
+        except Exception as e:
+            print(f"⚠️ Browser pool close failed: {e}")
+
+    async def _checkout(self) -> _PooledBrowser:
+        async with self._lock:
+            # Drop retired browsers that have no pages left
+            for pooled in [b for b in self._browsers if not b.available and b.active == 0]:
+                await self._close(pooled)
+
+            live = [b for b in self._browsers if b.available]
+            if len(live) < self.size and (not live or min(b.active for b in live) > 0):
+                pooled = await self._launch()
+                self._browsers.append(pooled)
+            else:
+                pooled = min(live, key=lambda b: b.active)
+
+            pooled.active += 1
+            pooled.uses += 1
+            if pooled.uses >= self.max_uses:
+                pooled.retiring = True
+            return pooled
+
+    async def _checkin(self, pooled: _PooledBrowser) -> None:
+        async with self._lock:
+            pooled.active -= 1
+            if not pooled.available and pooled.active == 0:
+                await self._close(pooled)
+
+    async def _check_heap(self, pooled: _PooledBrowser, page: Page) -> None:
+        try:
+            heap = await page.evaluate("() => (performance.memory && performance.memory.usedJSHeapSize) || 0")
+        except Exception:
+            return
+        if heap > self.max_heap_bytes:
+            print(f"♻️ Retiring browser: JS heap {heap / 1024 / 1024:.0f} MB")
+            pooled.retiring = True
+
+    @asynccontextmanager
+    async def page(self, user_agent: str = DEFAULT_USER_AGENT, **context_options):
+        """Yields a page in a new browser context; the context is closed afterwards."""
+        async with self._pages:
+            pooled = await self._checkout()
+            self._stats["pages"] += 1
+            context = None
+            try:
+                context = await pooled.browser.new_context(user_agent=user_agent, **context_options)
+                page = await context.new_page()
+                yield page
+                await self._check_heap(pooled, page)
+            finally:
+                if context:
+                    try:
+                        await context.close()
+                    except Exception:
+                        pooled.retiring = True
+                await self._checkin(pooled)
+
+    def stats(self) -> dict:
+        return {
+            **self._stats,
+            "browsers": len(self._browsers),
+            "active_pages": sum(b.active for b in self._browsers)
+        }
+
+    async def close(self) -> None:
+        async with self._lock:
+            for pooled in list(self._browsers):
+                await self._close(pooled)
+            if self._playwright:
+                await self._playwright.stop()
+                self._playwright = None
+
+
+browser_pool = BrowserPool()
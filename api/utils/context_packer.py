@@ -0,0 +1,243 @@
+import os
+import re
+import math
+import hashlib
+from collections import Counter
+from typing import Any, Iterator, Optional
+from dotenv import load_dotenv
+
+from utils.text_processing import CHARS_PER_TOKEN, iter_dom_text
+
+load_dotenv()
+
+# Page text given to the planner / agent per turn
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "2000"))
+# Everything that ends up in the context-aware chat prompt (page + retrieved context)
+CONTEXT_PROMPT_TOKEN_BUDGET = int(os.getenv("CONTEXT_PROMPT_TOKEN_BUDGET", "3000"))
+CONTEXT_CHUNK_CHARS = int(os.getenv("CONTEXT_CHUNK_CHARS", "800"))
+# With a query, rank chunks drawn from up to this multiple of the budget
+CONTEXT_RANK_POOL = float(os.getenv("CONTEXT_RANK_POOL", "4"))
+CONTEXT_RANKER = os.getenv("CONTEXT_RANKER", "bm25").lower()  # "none" | "bm25" | "embedding"
+
+TRUNCATED_MARKER = "\n\n...[Content Truncated]..."
+GAP_MARKER = "\n\n[...]\n\n"
+
+_SOURCE_SLICE = 4096
+_BREAKS = ("\n\n", "\n", ". ", " ")
+_WORD = re.compile(r"\w+")
+
+
+def estimate_tokens(text: str) -> int:
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+# ======================================================
+# STREAMING CHUNKER
+# ======================================================
+
+def iter_source_text(source: Any) -> Iterator[str]:
+    """
+    Text of a page context as a lazy stream of segments. Accepts plain text, an
+    extension payload ({"textContent" | "content" | "domTree"}) or a bare DOM tree.
+    """
+    if not source:
+        return
+    if isinstance(source, dict):
+        text = source.get("textContent") or source.get("content")
+        if not text:
+            yield from iter_dom_text(source.get("domTree", source))
+            return
+        source = text
+    if not isinstance(source, str):
+        source = str(source)
+    for start in range(0, len(source), _SOURCE_SLICE):
+        yield source[start:start + _SOURCE_SLICE]
+
+
+def _cut(buffer: str, size: int) -> int:
+    """Index to cut `buffer` at: the last natural break in its second half, else `size`."""
+    for sep in _BREAKS:
+        index = buffer.rfind(sep, size // 2, size)
+        if index != -1:
+            return index + len(sep)
+    return size
+
+
+def iter_chunks(segments: Iterator[str], chunk_chars: int = CONTEXT_CHUNK_CHARS) -> Iterator[str]:
+    """Regroups a segment stream into ~`chunk_chars` chunks that end on paragraph/sentence/word breaks."""
+    buffer = ""
+    for segment in segments:
+        buffer += segment
+        while len(buffer) >= chunk_chars:
+            cut = _cut(buffer, chunk_chars)
+            yield buffer[:cut]
+            buffer = buffer[cut:]
+    if buffer.strip():
+        yield buffer
+
+
+# ======================================================
+# RANKING
+# ======================================================
+
+def _terms(text: str) -> list[str]:
+    return _WORD.findall(text.lower())
+
+
+def bm25_scores(query: str, chunks: list[str], k1: float = 1.5, b: float = 0.75) -> list[float]:
+    query_terms = set(_terms(query))
+    if not query_terms or not chunks:
+        return [0.0] * len(chunks)
+
+    docs = [Counter(_terms(chunk)) for chunk in chunks]
+    avg_len = sum(sum(doc.values()) for doc in docs) / len(docs) or 1
+    n = len(docs)
+    idf = {}
+    for term in query_terms:
+        df = sum(1 for doc in docs if term in doc)
+        idf[term] = math.log(1 + (n - df + 0.5) / (df + 0.5))
+
+    scores = []
+    for doc in docs:
+        length = sum(doc.values())
+        score = 0.0
+        for term in query_terms:
+            tf = doc.get(term)
+            if tf:
+                score += idf[term] * tf * (k1 + 1) / (tf + k1 * (1 - b + b * length / avg_len))
+        scores.append(score)
+    return scores
+
+
+async def embedding_scores(query: str, chunks: list[str]) -> list[float]:
+    """Cosine similarity to the query, reusing the content-addressed chunk embedding cache."""
+    from embedding import embed_text
+    from utils.vector_store import vector_store
+
+    query_vec = await embed_text(query)
+    chunk_vecs, _ = await vector_store._embed_chunks_cached(
+        chunks, [hashlib.md5(c.encode()).hexdigest() for c in chunks]
+    )
+
+    def norm(vec):
+        return math.sqrt(sum(x * x for x in vec)) or 1.0
+
+    query_norm = norm(query_vec)
+    return [
+        sum(q * c for q, c in zip(query_vec, vec)) / (query_norm * norm(vec))
+        for vec in chunk_vecs
+    ]
+
+
+# ======================================================
+# PACKING
+# ======================================================
+
+def _take_in_order(chunks: Iterator[str], budget_chars: int) -> str:
+    packed = []
+    used = 0
+    for chunk in chunks:
+        if used + len(chunk) > budget_chars:
+            remaining = budget_chars - used
+            if remaining > CONTEXT_CHUNK_CHARS // 4:
+                packed.append(chunk[:_cut(chunk, remaining)])
+            return "".join(packed).rstrip() + TRUNCATED_MARKER
+        packed.append(chunk)
+        used += len(chunk)
+    return "".join(packed).strip()
+
+
+def _rank_pool(source: Any, budget_chars: int) -> tuple[list[str], bool]:
+    """Chunks from the start of the page up to the ranking pool size, plus whether more remained."""
+    pool_chars = int(budget_chars * CONTEXT_RANK_POOL)
+    pool = []
+    used = 0
+    for chunk in iter_chunks(iter_source_text(source)):
+        if used >= pool_chars:
+            return pool, True
+        pool.append(chunk)
+        used += len(chunk)
+    return pool, False
+
+
+def _select(pool: list[str], scores: list[float], budget_chars: int) -> str:
+    """Best-scoring chunks that fit, reassembled in page order."""
+    chosen = []
+    used = 0
+    for index in sorted(range(len(pool)), key=lambda i: (-scores[i], i)):
+        if used + len(pool[index]) <= budget_chars:
+            chosen.append(index)
+            used += len(pool[index])
+
+    parts = []
+    previous = None
+    for index in sorted(chosen):
+        chunk = pool[index]
+        if previous is not None and index != previous + 1:
+            parts[-1] = parts[-1].rstrip()
+            parts.append(GAP_MARKER)
+            chunk = chunk.lstrip()
+        parts.append(chunk)
+        previous = index
+    return "".join(parts).strip()
+
+
+def _fits(source: Any, budget_chars: int) -> bool:
+    return isinstance(source, str) and len(source) <= budget_chars
+
+
+def pack_context(
+    source: Any,
+    budget_tokens: int = CONTEXT_TOKEN_BUDGET,
+    query: Optional[str] = None,
+    ranker: str = CONTEXT_RANKER
+) -> str:
+    """
+    Packs page text into `budget_tokens`.
+
+    Without a query (or with ranker "none") text is streamed from the extractor in
+    page order and extraction stops as soon as the budget is full. With a query,
+    chunks from the first CONTEXT_RANK_POOL x budget of text are ranked by BM25 and
+    the most relevant ones are kept, in page order. Use `apack_context` for the
+    embedding ranker.
+    """
+    budget_chars = budget_tokens * CHARS_PER_TOKEN
+    if _fits(source, budget_chars):
+        return source.strip()
+
+    if not query or ranker == "none":
+        return _take_in_order(iter_chunks(iter_source_text(source)), budget_chars)
+
+    pool, more = _rank_pool(source, budget_chars)
+    if sum(len(chunk) for chunk in pool) <= budget_chars:
+        return "".join(pool).strip()
+
+    scores = bm25_scores(query, pool)
+    if not any(scores):
+        return _take_in_order(iter(pool), budget_chars)
+    return _select(pool, scores, budget_chars) + (TRUNCATED_MARKER if more else "")
+
+
+async def apack_context(
+    source: Any,
+    budget_tokens: int = CONTEXT_TOKEN_BUDGET,
+    query: Optional[str] = None,
+    ranker: str = CONTEXT_RANKER
+) -> str:
+    """`pack_context` for async callers; also supports ranker "embedding" (falls back to BM25)."""
+    budget_chars = budget_tokens * CHARS_PER_TOKEN
+    if ranker != "embedding" or not query or _fits(source, budget_chars):
+        return pack_context(source, budget_tokens, query, ranker)
+
+    pool, more = _rank_pool(source, budget_chars)
+    if sum(len(chunk) for chunk in pool) <= budget_chars:
+        return "".join(pool).strip()
+
+    try:
+        scores = await embedding_scores(query, pool)
+    except Exception as e:
+        print(f"⚠️ Embedding ranking failed, using BM25: {e}")
+        scores = bm25_scores(query, pool)
+    if not any(scores):
+        return _take_in_order(iter(pool), budget_chars)
+    return _select(pool, scores, budget_chars) + (TRUNCATED_MARKER if more else "")
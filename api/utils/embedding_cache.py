@@ -0,0 +1,130 @@
+import os
+import time
+import sqlite3
+import asyncio
+from array import array
+from dotenv import load_dotenv
+
+from utils.lru_cache import LRUCache
+from utils.sqlite_store import SQLiteStore
+
+load_dotenv()
+
+API_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+EMBEDDING_CACHE_ENABLED = os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() == "true"
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", os.path.join(API_DIR, "embedding_cache.sqlite3"))
+EMBEDDING_CACHE_MEMORY_ITEMS = int(os.getenv("EMBEDDING_CACHE_MEMORY_ITEMS", "20000"))
+
+# SQLite caps the number of bound parameters per statement; stay well below it.
+_SQL_BATCH = 500
+
+
+class EmbeddingCache(SQLiteStore):
+    """
+    Content-addressed embedding cache keyed by (model, content_hash).
+
+    Two tiers:
+    - Memory: LRU of recently used vectors (per process).
+    - Disk: SQLite table shared by every worker on the host, vectors stored as float32 blobs.
+
+    The same chunk text always produces the same vector for a given model, so a page
+    re-saved on every tab refresh (or by many users) only hits the embedding provider once.
+    """
+
+    SCHEMA = ("""
+        CREATE TABLE IF NOT EXISTS embeddings (
+            model TEXT NOT NULL,
+            content_hash TEXT NOT NULL,
+            vector BLOB NOT NULL,
+            created_at REAL NOT NULL,
+            PRIMARY KEY (model, content_hash)
+        )
+    """,)
+
+    def __init__(self, path: str = EMBEDDING_CACHE_PATH, memory_items: int = EMBEDDING_CACHE_MEMORY_ITEMS):
+        super().__init__(path)
+        self.memory = LRUCache(max_items=memory_items)
+
+    @staticmethod
+    def _encode(vector: list[float]) -> bytes:
+        return array("f", vector).tobytes()
+
+    @staticmethod
+    def _decode(blob: bytes) -> list[float]:
+        vec = array("f")
+        vec.frombytes(blob)
+        return vec.tolist()
+
+    # --------------------------------------------------------
+    # Lookup
+    # --------------------------------------------------------
+    def get_many(self, model: str, content_hashes: list[str]) -> dict[str, list[float]]:
+        """Returns {content_hash: vector} for every hash found in memory or on disk."""
+        found: dict[str, list[float]] = {}
+        missing: list[str] = []
+
+        for h in dict.fromkeys(content_hashes):
+            vec = self.memory.get((model, h))
+            if vec is not None:
+                found[h] = vec
+            else:
+                missing.append(h)
+
+        if not missing:
+            return found
+
+        try:
+            with self._lock:
+                conn = self._connection()
+                for start in range(0, len(missing), _SQL_BATCH):
+                    batch = missing[start:start + _SQL_BATCH]
+                    placeholders = ",".join("?" for _ in batch)
+                    rows = conn.execute(
+                        f"SELECT content_hash, vector FROM embeddings WHERE model = ? AND content_hash IN ({placeholders})",
+                        [model, *batch]
+                    ).fetchall()
+                    for content_hash, blob in rows:
+                        vec = self._decode(blob)
+                        found[content_hash] = vec
+                        self.memory.set((model, content_hash), vec)
+        except sqlite3.Error as e:
+            print(f"⚠️ Embedding cache read failed: {e}")
+
+        return found
+
+    # --------------------------------------------------------
+    # Store
+    # --------------------------------------------------------
+    def put_many(self, model: str, vectors: dict[str, list[float]]) -> None:
+        if not vectors:
+            return
+
+        for h, vec in vectors.items():
+            self.memory.set((model, h), vec)
+
+        now = time.time()
+        rows = [(model, h, self._encode(vec), now) for h, vec in vectors.items()]
+
+        try:
+            with self._lock:
+                conn = self._connection()
+                conn.executemany(
+                    "INSERT OR REPLACE INTO embeddings (model, content_hash, vector, created_at) VALUES (?, ?, ?, ?)",
+                    rows
+                )
+                conn.commit()
+        except sqlite3.Error as e:
+            print(f"⚠️ Embedding cache write failed: {e}")
+
+    # --------------------------------------------------------
+    # Async wrappers (keep SQLite I/O off the event loop)
+    # --------------------------------------------------------
+    async def aget_many(self, model: str, content_hashes: list[str]) -> dict[str, list[float]]:
+        return await asyncio.to_thread(self.get_many, model, content_hashes)
+
+    async def aput_many(self, model: str, vectors: dict[str, list[float]]) -> None:
+        await asyncio.to_thread(self.put_many, model, vectors)
+
+
+embedding_cache = EmbeddingCache() if EMBEDDING_CACHE_ENABLED else None
@@ -0,0 +1,217 @@
+import os
+from typing import Iterator, Optional
+from dotenv import load_dotenv
+
+load_dotenv()
+
+FLAT_DOM_FORMAT = "flat-dom/1"
+# Content types whose request bodies are MessagePack rather than JSON
+MSGPACK_CONTENT_TYPES = ("application/msgpack", "application/x-msgpack", "application/vnd.msgpack")
+MSGPACK_MAX_BODY_MB = int(os.getenv("MSGPACK_MAX_BODY_MB", "64"))
+
+# Universal Extractor text leaves are encoded as nodes with this tag
+TEXT_TAG = "#text"
+
+
+class FlatDomError(ValueError):
+    pass
+
+
+# ======================================================
+# WIRE FORMAT
+# ======================================================
+#
+# A domTree as columns over its nodes in pre-order, instead of nested objects:
+#
+#   {
+#     "format": "flat-dom/1",
+#     "strings": ["main", "p", "class", "href"],   # tag and attribute names
+#     "tags":    [0, 1, 1],                        # index into strings, per node
+#     "sizes":   [3, 1, 1],                        # subtree size (node included)
+#     "texts":   [null, "Hello", "World"],         # direct text
+#     "attrs":   [null, [2, "lead"], null],        # [name index, value, ...]
+#     "values":  [[2, "typed"]],                   # sparse [node, value] (form fields)
+#     "checked": [2]                               # sparse node indexes
+#   }
+#
+# A node's first child is i + 1 and its next sibling is i + sizes[i], so trees
+# are walked with plain index arithmetic and no per-node objects.
+
+
+def encode_flat_dom(tree: dict) -> dict:
+    """Nested domTree (domExtractor.js or Universal Extractor shape) -> flat columns."""
+    strings, string_ids = [], {}
+    tags, sizes, texts, attrs, values, checked = [], [], [], [], [], []
+
+    def intern(s: str) -> int:
+        sid = string_ids.get(s)
+        if sid is None:
+            sid = string_ids[s] = len(strings)
+            strings.append(s)
+        return sid
+
+    # (node, index of its parent's slot) - sizes are filled in on the way back up
+    stack = [(tree, None)]
+    parents = []
+    while stack:
+        node, parent = stack.pop()
+        index = len(tags)
+        parents.append(parent)
+        sizes.append(1)
+        if isinstance(node, str):
+            node = {"type": "text", "content": node}
+        if not isinstance(node, dict):
+            node = {}
+
+        if node.get("type") == "text":
+            tags.append(intern(TEXT_TAG))
+            texts.append(node.get("content"))
+            attrs.append(None)
+        else:
+            tags.append(intern(node.get("tag") or ""))
+            texts.append(node.get("text"))
+            node_attrs = node.get("attrs")
+            if node_attrs:
+                flat = []
+                for name, value in node_attrs.items():
+                    flat.append(intern(name))
+                    flat.append(value)
+                attrs.append(flat)
+            else:
+                attrs.append(None)
+            if node.get("value") is not None:
+                values.append([index, node["value"]])
+            if node.get("checked"):
+                checked.append(index)
+            children = node.get("children")
+            if children:
+                stack.extend((child, index) for child in reversed(children))
+
+    for index in range(len(parents) - 1, 0, -1):
+        sizes[parents[index]] += sizes[index]
+
+    return {
+        "format": FLAT_DOM_FORMAT,
+        "strings": strings,
+        "tags": tags,
+        "sizes": sizes,
+        "texts": texts,
+        "attrs": attrs,
+        "values": values,
+        "checked": checked
+    }
+
+
+def is_flat_dom(tree) -> bool:
+    return isinstance(tree, dict) and tree.get("format") == FLAT_DOM_FORMAT
+
+
+# ======================================================
+# VIEW
+# ======================================================
+
+class FlatDomView:
+    """
+    Read-only accessors over a decoded flat domTree. Holds the decoded columns
+    as-is (nothing is copied or converted into per-node dicts); nodes are ints.
+    """
+
+    __slots__ = ("strings", "tags", "sizes", "texts", "attrs", "_values", "_checked")
+
+    def __init__(self, data: dict):
+        if not is_flat_dom(data):
+            raise FlatDomError("Not a flat-dom/1 payload")
+        try:
+            self.strings = data["strings"]
+            self.tags = data["tags"]
+            self.sizes = data["sizes"]
+        except KeyError as e:
+            raise FlatDomError(f"Flat DOM is missing {e.args[0]!r}")
+        count = len(self.tags)
+        self.texts = data.get("texts") or [None] * count
+        self.attrs = data.get("attrs") or [None] * count
+        if len(self.sizes) != count or len(self.texts) != count or len(self.attrs) != count:
+            raise FlatDomError("Flat DOM columns have different lengths")
+        if count and self.sizes[0] != count:
+            raise FlatDomError("Flat DOM root size does not cover all nodes")
+        self._values = data.get("values") or ()
+        self._checked = data.get("checked") or ()
+
+    def __len__(self) -> int:
+        return len(self.tags)
+
+    def tag(self, node: int) -> str:
+        return self.strings[self.tags[node]]
+
+    def text(self, node: int) -> Optional[str]:
+        return self.texts[node]
+
+    def attr_items(self, node: int) -> Iterator[tuple[str, str]]:
+        flat = self.attrs[node]
+        if flat:
+            strings = self.strings
+            for k in range(0, len(flat), 2):
+                yield strings[flat[k]], flat[k + 1]
+
+    def attributes(self, node: int) -> dict:
+        return dict(self.attr_items(node))
+
+    def children(self, node: int) -> Iterator[int]:
+        sizes = self.sizes
+        child, end = node + 1, node + sizes[node]
+        while child < end:
+            yield child
+            child += sizes[child]
+
+    def value_map(self) -> dict:
+        return {node: value for node, value in self._values}
+
+    def checked_set(self) -> set:
+        return set(self._checked)
+
+    def to_nested(self, node: int = 0) -> dict:
+        """Rebuilds the nested dict form (for code paths that patch or re-serialize the tree)."""
+        if not len(self):
+            return {}
+        values, checked = self.value_map(), self.checked_set()
+
+        def build(i: int) -> dict:
+            tag = self.tag(i)
+            if tag == TEXT_TAG:
+                return {"type": "text", "content": self.texts[i] or ""}
+            out = {"tag": tag}
+            if self.attrs[i]:
+                out["attrs"] = self.attributes(i)
+            if self.texts[i] is not None:
+                out["text"] = self.texts[i]
+            if i in values:
+                out["value"] = values[i]
+            if i in checked:
+                out["checked"] = True
+            if self.sizes[i] > 1:
+                out["children"] = []
+            return out
+
+        root = build(node)
+        stack = [(node, root)]
+        while stack:
+            i, out = stack.pop()
+            for child in self.children(i):
+                built = build(child)
+                out["children"].append(built)
+                if self.sizes[child] > 1:
+                    stack.append((child, built))
+        return root
+
+
+# ======================================================
+# MESSAGEPACK BODIES
+# ======================================================
+
+def is_msgpack(content_type: Optional[str]) -> bool:
+    return bool(content_type) and content_type.split(";")[0].strip().lower() in MSGPACK_CONTENT_TYPES
+
+
+def decode_msgpack(body: bytes):
+    import ormsgpack
+    return ormsgpack.unpackb(body)
@@ -0,0 +1,422 @@
+import os
+import re
+import json
+import math
+import time
+from collections import Counter, defaultdict
+from typing import Iterable, NamedTuple, Optional
+from dotenv import load_dotenv
+
+load_dotenv()
+
+API_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+INTENT_ROUTER_ENABLED = os.getenv("INTENT_ROUTER_ENABLED", "true").lower() == "true"
+INTENT_ROUTER_THRESHOLD = float(os.getenv("INTENT_ROUTER_THRESHOLD", "0.9"))
+INTENT_ROUTER_MODEL_PATH = os.getenv("INTENT_ROUTER_MODEL_PATH", os.path.join(API_DIR, "intent_router_model.json"))
+PLANNER_DECISION_LOG = os.getenv("PLANNER_DECISION_LOG", "")  # JSONL path; empty disables logging
+
+INTENTS = ("video", "product", "visual", "page_context", "info")
+BINARY_HEADS = ("needs_context", "needs_actions", "needs_video")
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+(?:'[a-z]+)?")
+
+
+def tokenize(text: str) -> list[str]:
+    return _TOKEN_RE.findall(text.lower())
+
+
+# ======================================================
+# PHRASE MATCHER - token-boundary trie (no "it" inside "with")
+# ======================================================
+
+class PhraseMatcher:
+    """
+    Trie over word tokens. Every phrase is matched on token boundaries only and all
+    phrases are found in a single left-to-right pass, bounded by the longest phrase.
+    """
+
+    def __init__(self, phrases: dict[str, object]):
+        self.root: dict = {}
+        self.max_len = 0
+        for phrase, payload in phrases.items():
+            tokens = tokenize(phrase)
+            if not tokens:
+                continue
+            node = self.root
+            for tok in tokens:
+                node = node.setdefault(tok, {})
+            node[None] = (phrase, payload)
+            self.max_len = max(self.max_len, len(tokens))
+
+    def find(self, tokens: list[str]) -> list[tuple[str, object]]:
+        hits = []
+        for start in range(len(tokens)):
+            node = self.root
+            for tok in tokens[start:start + self.max_len]:
+                node = node.get(tok)
+                if node is None:
+                    break
+                if None in node:
+                    hits.append(node[None])
+        return hits
+
+    def any(self, tokens: list[str]) -> bool:
+        for start in range(len(tokens)):
+            node = self.root
+            for tok in tokens[start:start + self.max_len]:
+                node = node.get(tok)
+                if node is None:
+                    break
+                if None in node:
+                    return True
+        return False
+
+
+# Recall-oriented gate for page RAG in /generate/stream (previously a substring scan).
+PAGE_CONTEXT_KEYWORDS = [
+    "this", "current", "here", "page", "these", "above",
+    "product", "item", "summarize", "summarise", "summary", "explain this",
+    "what does it say", "on this", "listed", "shown", "describe",
+    "content", "contents", "page contents", "the content",
+    "the contents", "material", "text", "texts", "the text",
+    "information", "details", "data", "info",
+    "this page", "this content", "this text", "this material",
+    "this info", "this information", "this thing",
+    "that page", "that content", "that text",
+    "the above", "above content", "above text",
+    "below", "below content", "this one", "that one",
+    "the previous", "the next",
+    "summarize this", "summarise this", "explain this",
+    "explain it", "describe this", "describe it",
+    "tell me about this", "tell me about it",
+    "what is this", "what's this",
+    "what does this say", "what does it say",
+    "give summary", "give a summary",
+    "brief this", "analyze this", "analyse this",
+    "this product", "this item", "this listing",
+    "the product", "the item", "the listing",
+    "product details", "item details",
+    "this one", "that one", "the above one",
+    "shown here", "shown above", "shown below",
+    "on the page", "from the page",
+    "from here", "from this page",
+    "read this", "read it", "interpret this",
+    "what is written", "what's written",
+    "what is mentioned", "what's mentioned",
+    "what is described", "what's described",
+]
+
+# Short follow-ups with no subject of their own ("explain", "tl;dr", "what is that")
+# refer to the page. Bare "it" is not enough: "what is it" is usually about the chat.
+SHORT_FOLLOWUP_MAX_TOKENS = 4
+SHORT_FOLLOWUP_WORDS = frozenset({
+    "this", "that", "these", "those", "above", "here",
+    "explain", "summarize", "summarise", "elaborate", "simplify", "tldr", "tl", "mean", "meaning",
+})
+
+# Logit contributions per head. Phrases overlap on purpose ("summarize this" also
+# hits "summarize"), so strong phrases accumulate.
+_GREETINGS = ["hi", "hello", "hey", "thanks", "thank you", "good morning", "good night", "bye"]
+
+HEAD_PHRASES: dict[str, dict[str, float]] = {
+    "needs_context": {
+        **{p: 4.0 for p in [
+            "this page", "the page", "on the page", "from the page", "this article", "this site",
+            "this website", "summarize", "summarise", "summary", "tldr", "this text", "this content",
+            "the above", "this product", "this listing", "these questions", "this question",
+            "this quiz", "this assignment", "mcq", "mcqs", "solve this", "answer these",
+            "what is written", "what's written", "what is mentioned", "shown here", "read this",
+        ]},
+        **{p: 2.5 for p in ["explain this", "describe this", "describe it", "what is this", "what's this", "on this", "from here"]},
+        **{p: 1.0 for p in ["this", "these", "it", "here", "above", "below", "current", "listed", "shown"]},
+        **{p: -3.0 for p in _GREETINGS},
+        **{p: -2.0 for p in ["open", "go to", "search for", "play"]},
+    },
+    "needs_actions": {
+        **{p: 4.0 for p in [
+            "open", "go to", "navigate", "navigate to", "visit", "search for", "look up",
+            "find me", "play", "launch", "take me to",
+        ]},
+        **{p: 2.5 for p in ["search", "find", "spotify", "netflix", "amazon", "flipkart", "google", "then"]},
+        **{p: 1.0 for p in ["youtube", "buy", "videos"]},
+        **{p: -3.0 for p in [
+            "summarize", "summarise", "summary", "explain", "what is", "what's", "how does",
+            "this page", "this video", "these questions", "solve this", "define", *_GREETINGS,
+        ]},
+    },
+    "needs_video": {
+        **{p: 4.0 for p in ["this video", "the video", "transcript", "subtitles", "timestamp", "timestamps", "speaker", "this clip"]},
+        **{p: 2.5 for p in ["video", "summarize", "summarise", "summary", "what is he", "what is she", "what are they"]},
+        **{p: -3.0 for p in ["open", "search for", *_GREETINGS]},
+    },
+}
+
+HEAD_BIAS = {"needs_context": -2.0, "needs_actions": -2.5, "needs_video": -2.0}
+
+INTENT_PHRASES: dict[str, dict[str, float]] = {
+    "video": {
+        **{p: 4.0 for p in ["tutorial", "tutorials", "course", "lesson", "lessons", "playlist", "watch", "videos", "lecture"]},
+        **{p: 2.0 for p in ["learn", "dsa", "programming", "video"]},
+    },
+    "product": {
+        **{p: 4.0 for p in ["buy", "price", "prices", "cheapest", "deal", "deals", "under", "budget"]},
+        **{p: 2.0 for p in ["best", "laptop", "laptops", "phone", "phones", "headphones", "gadget", "review", "reviews"]},
+    },
+    "visual": {
+        **{p: 4.0 for p in ["pictures", "photos", "images", "gallery", "wallpaper", "wallpapers"]},
+        **{p: 2.0 for p in ["show me", "destination", "travel", "visit"]},
+    },
+    "page_context": {
+        **{p: 4.0 for p in [
+            "this page", "on the page", "summarize", "summarise", "summary", "these questions",
+            "this assignment", "this quiz", "solve this", "mcqs", "what is written",
+        ]},
+        **{p: 2.0 for p in ["this", "these", "above"]},
+    },
+    "info": {
+        **{p: 4.0 for p in _GREETINGS},
+        **{p: 2.0 for p in ["what is", "who is", "define", "explain", "how does", "why"]},
+    },
+}
+
+INTENT_BIAS = {"video": 0.0, "product": 0.0, "visual": 0.0, "page_context": 0.0, "info": 1.5}
+
+CONTENT_TYPES = {
+    "video": ["youtube"],
+    "product": ["products", "images"],
+    "visual": ["images"],
+    "page_context": ["none"],
+    "info": ["none"],
+}
+
+
+def _sigmoid(x: float) -> float:
+    if x >= 0:
+        return 1.0 / (1.0 + math.exp(-x))
+    z = math.exp(x)
+    return z / (1.0 + z)
+
+
+def _softmax(scores: dict[str, float]) -> dict[str, float]:
+    top = max(scores.values())
+    exp = {k: math.exp(v - top) for k, v in scores.items()}
+    total = sum(exp.values())
+    return {k: v / total for k, v in exp.items()}
+
+
+# ======================================================
+# OPTIONAL CLASSIFIER - multinomial naive Bayes from logged planner decisions
+# ======================================================
+
+def _features(tokens: list[str]) -> list[str]:
+    return tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+
+
+class NaiveBayesRouter:
+    """
+    One multinomial naive Bayes model per head (intent + the three flags), trained
+    on question text -> LLM planner decision. Pure Python, microseconds per query.
+    """
+
+    def __init__(self, heads: Optional[dict] = None):
+        # heads[name] = {"labels": {label: {"docs": n, "total": n, "counts": {feat: n}}}, "vocab": n}
+        self.heads = heads or {}
+
+    @staticmethod
+    def _label(record: dict, head: str) -> Optional[str]:
+        if head == "intent":
+            intent = (record.get("classification") or {}).get("primary_intent")
+            return intent if intent in INTENTS else None
+        if head not in record:
+            return None
+        return "true" if record[head] else "false"
+
+    @classmethod
+    def train(cls, records: Iterable[dict]) -> "NaiveBayesRouter":
+        stats = defaultdict(lambda: defaultdict(lambda: {"docs": 0, "total": 0, "counts": Counter()}))
+        vocab = defaultdict(set)
+
+        for record in records:
+            feats = _features(tokenize(record.get("question") or ""))
+            for head in ("intent", *BINARY_HEADS):
+                label = cls._label(record, head)
+                if label is None:
+                    continue
+                entry = stats[head][label]
+                entry["docs"] += 1
+                entry["total"] += len(feats)
+                entry["counts"].update(feats)
+                vocab[head].update(feats)
+
+        heads = {
+            head: {
+                "labels": {label: {**entry, "counts": dict(entry["counts"])} for label, entry in labels.items()},
+                "vocab": len(vocab[head]),
+            }
+            for head, labels in stats.items()
+        }
+        return cls(heads)
+
+    def log_proba(self, head: str, tokens: list[str]) -> Optional[dict[str, float]]:
+        model = self.heads.get(head)
+        if not model or len(model["labels"]) < 2:
+            return None
+
+        feats = _features(tokens)
+        docs = sum(entry["docs"] for entry in model["labels"].values())
+        vocab = model["vocab"] + 1
+        scores = {}
+        for label, entry in model["labels"].items():
+            score = math.log(entry["docs"] / docs)
+            denom = math.log(entry["total"] + vocab)
+            counts = entry["counts"]
+            for feat in feats:
+                score += math.log(counts.get(feat, 0) + 1) - denom
+            scores[label] = score
+
+        top = max(scores.values())
+        norm = top + math.log(sum(math.exp(s - top) for s in scores.values()))
+        return {label: s - norm for label, s in scores.items()}
+
+    def save(self, path: str) -> None:
+        with open(path, "w") as f:
+            json.dump({"version": 1, "heads": self.heads}, f)
+
+    @classmethod
+    def load(cls, path: str) -> Optional["NaiveBayesRouter"]:
+        try:
+            with open(path) as f:
+                return cls(json.load(f)["heads"])
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError) as e:
+            print(f"⚠️ Intent router model not loaded ({path}): {e}")
+            return None
+
+
+# ======================================================
+# ROUTER
+# ======================================================
+
+class RouteDecision(NamedTuple):
+    classification: dict
+    needs_context: bool
+    needs_actions: bool
+    needs_video: bool
+    confidence: float          # min confidence across all heads
+    scores: dict               # per-head confidence, for logging/eval
+
+
+# Cap on how far the learned model can move a head's logit, so a small or skewed
+# training log can't override strong keyword evidence on its own.
+_MODEL_LOGIT_CAP = 6.0
+
+
+class IntentRouter:
+    def __init__(self, model: Optional[NaiveBayesRouter] = None, threshold: float = INTENT_ROUTER_THRESHOLD):
+        self.model = model
+        self.threshold = threshold
+        self.page_keywords = PhraseMatcher({p: None for p in PAGE_CONTEXT_KEYWORDS})
+        self.head_matchers = {head: PhraseMatcher(phrases) for head, phrases in HEAD_PHRASES.items()}
+        self.intent_matchers = {intent: PhraseMatcher(phrases) for intent, phrases in INTENT_PHRASES.items()}
+
+    def asks_about_page(self, query: str) -> bool:
+        """Cheap recall-oriented check used to gate page retrieval."""
+        tokens = tokenize(query)
+        if self.page_keywords.any(tokens):
+            return True
+        return len(tokens) <= SHORT_FOLLOWUP_MAX_TOKENS and any(t in SHORT_FOLLOWUP_WORDS for t in tokens)
+
+    def _binary(self, head: str, tokens: list[str]) -> float:
+        logit = HEAD_BIAS[head] + sum(w for _, w in self.head_matchers[head].find(tokens))
+        if self.model:
+            lp = self.model.log_proba(head, tokens)
+            if lp and "true" in lp and "false" in lp:
+                logit += max(-_MODEL_LOGIT_CAP, min(_MODEL_LOGIT_CAP, lp["true"] - lp["false"]))
+        return _sigmoid(logit)
+
+    def _intent(self, tokens: list[str]) -> dict[str, float]:
+        scores = {
+            intent: INTENT_BIAS[intent] + sum(w for _, w in self.intent_matchers[intent].find(tokens))
+            for intent in INTENTS
+        }
+        if self.model:
+            lp = self.model.log_proba("intent", tokens)
+            if lp:
+                for intent in INTENTS:
+                    scores[intent] += max(-_MODEL_LOGIT_CAP, lp.get(intent, -_MODEL_LOGIT_CAP))
+        return _softmax(scores)
+
+    def route(self, question: str, has_video: bool = False) -> RouteDecision:
+        tokens = tokenize(question)
+
+        p_context = self._binary("needs_context", tokens)
+        p_actions = self._binary("needs_actions", tokens)
+        # No YouTube URL on the tab means nothing to transcribe: certain False.
+        p_video = self._binary("needs_video", tokens) if has_video else 0.0
+
+        intent_probs = self._intent(tokens)
+        intent = max(intent_probs, key=intent_probs.get)
+
+        scores = {
+            "intent": intent_probs[intent],
+            "needs_context": max(p_context, 1 - p_context),
+            "needs_actions": max(p_actions, 1 - p_actions),
+            "needs_video": max(p_video, 1 - p_video),
+        }
+
+        return RouteDecision(
+            classification={
+                "needs_rich_content": intent in ("video", "product", "visual"),
+                "content_types": CONTENT_TYPES[intent],
+                "primary_intent": intent,
+                "reason": "local router"
+            },
+            needs_context=p_context >= 0.5,
+            needs_actions=p_actions >= 0.5,
+            needs_video=p_video >= 0.5,
+            confidence=min(scores.values()),
+            scores=scores,
+        )
+
+    def confident(self, decision: RouteDecision) -> bool:
+        return INTENT_ROUTER_ENABLED and decision.confidence >= self.threshold
+
+
+def log_planner_decision(question: str, has_video: bool, state: dict, source: str) -> None:
+    """Appends an LLM planner decision to PLANNER_DECISION_LOG (training data for the router)."""
+    if not PLANNER_DECISION_LOG:
+        return
+    record = {
+        "ts": time.time(),
+        "question": question,
+        "has_video": has_video,
+        "classification": state.get("classification") or {},
+        "needs_context": bool(state.get("needs_context")),
+        "needs_actions": bool(state.get("needs_actions")),
+        "needs_video": bool(state.get("needs_video")),
+        "source": source,
+    }
+    try:
+        with open(PLANNER_DECISION_LOG, "a") as f:
+            f.write(json.dumps(record) + "\n")
+    except OSError as e:
+        print(f"⚠️ Planner decision log write failed: {e}")
+
+
+def load_planner_decisions(path: str) -> list[dict]:
+    records = []
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                continue
+    return records
+
+
+intent_router = IntentRouter(NaiveBayesRouter.load(INTENT_ROUTER_MODEL_PATH))
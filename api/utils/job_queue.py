@@ -0,0 +1,275 @@
+import os
+import json
+import time
+import uuid
+import sqlite3
+import asyncio
+from typing import Optional
+from dotenv import load_dotenv
+
+from utils.sqlite_store import SQLiteStore
+
+load_dotenv()
+
+API_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SNAPSHOT_QUEUE_PATH = os.getenv("SNAPSHOT_QUEUE_PATH", os.path.join(API_DIR, "snapshot_jobs.sqlite3"))
+
+# Job states
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+ERROR = "error"
+
+_JSON_FIELDS = ("payload", "result")
+
+
+class JobQueue(SQLiteStore):
+    """
+    Durable job queue in a host-local SQLite file (WAL), shared by the API workers
+    that enqueue/poll and the worker processes that execute jobs.
+
+    - Jobs are claimed highest `priority` first, then FIFO.
+    - A claim takes a lease; workers renew it with progress updates. Jobs whose
+      lease expired (worker crashed/restarted) are re-queued or failed.
+    - `limits` caps running jobs per `kind`, counted across every worker process.
+    - Failed attempts are retried with exponential backoff up to `max_attempts`.
+    - Finished jobs carry `expires_at`; `collect_expired` hands them to the caller
+      for artifact cleanup and deletes the rows.
+    """
+
+    SCHEMA = ("""
+        CREATE TABLE IF NOT EXISTS jobs (
+            id TEXT PRIMARY KEY,
+            kind TEXT NOT NULL,
+            priority INTEGER NOT NULL DEFAULT 0,
+            status TEXT NOT NULL,
+            payload TEXT NOT NULL,
+            result TEXT,
+            progress INTEGER NOT NULL DEFAULT 0,
+            message TEXT,
+            error TEXT,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            max_attempts INTEGER NOT NULL DEFAULT 3,
+            lease_owner TEXT,
+            lease_expires REAL,
+            run_after REAL NOT NULL,
+            created_at REAL NOT NULL,
+            updated_at REAL NOT NULL,
+            finished_at REAL,
+            expires_at REAL,
+            version INTEGER NOT NULL DEFAULT 0
+        )
+    """, """
+        CREATE INDEX IF NOT EXISTS ix_jobs_claim ON jobs (status, priority DESC, created_at)
+    """, """
+        CREATE INDEX IF NOT EXISTS ix_jobs_expires ON jobs (expires_at)
+    """)
+
+    def __init__(self, path: str = SNAPSHOT_QUEUE_PATH, retry_backoff: float = 5.0):
+        super().__init__(path)
+        self.retry_backoff = retry_backoff
+
+    @staticmethod
+    def _row(cursor, row) -> dict:
+        job = {col[0]: value for col, value in zip(cursor.description, row)}
+        for field in _JSON_FIELDS:
+            if job.get(field):
+                job[field] = json.loads(job[field])
+        return job
+
+    def _execute(self, sql: str, params=()) -> sqlite3.Cursor:
+        with self._lock:
+            conn = self._connection()
+            cursor = conn.execute(sql, params)
+            conn.commit()
+            return cursor
+
+    # --------------------------------------------------------
+    # Producer side
+    # --------------------------------------------------------
+    def enqueue(self, kind: str, payload: dict, priority: int = 0, max_attempts: int = 3, job_id: Optional[str] = None) -> str:
+        job_id = job_id or str(uuid.uuid4())
+        now = time.time()
+        self._execute(
+            "INSERT INTO jobs (id, kind, priority, status, payload, message, max_attempts, run_after, created_at, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (job_id, kind, priority, QUEUED, json.dumps(payload), "Queued...", max_attempts, now, now, now)
+        )
+        return job_id
+
+    def get(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            cursor = self._connection().execute("SELECT * FROM jobs WHERE id = ?", (job_id,))
+            row = cursor.fetchone()
+            return self._row(cursor, row) if row else None
+
+    def delete(self, job_id: str) -> Optional[dict]:
+        job = self.get(job_id)
+        if job:
+            self._execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+        return job
+
+    def version(self, job_id: str) -> Optional[int]:
+        """Change counter of a job (cheap point read for change polling). None if it doesn't exist."""
+        with self._lock:
+            row = self._connection().execute("SELECT version FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return row[0] if row else None
+
+    def queue_position(self, job_id: str) -> Optional[int]:
+        """Number of queued jobs that will be claimed before this one."""
+        job = self.get(job_id)
+        if not job or job["status"] != QUEUED:
+            return None
+        with self._lock:
+            (ahead,) = self._connection().execute(
+                "SELECT COUNT(*) FROM jobs WHERE status = ? AND (priority > ? OR (priority = ? AND created_at < ?))",
+                (QUEUED, job["priority"], job["priority"], job["created_at"])
+            ).fetchone()
+        return ahead
+
+    # --------------------------------------------------------
+    # Worker side
+    # --------------------------------------------------------
+    def claim(
+        self, owner: str, limits: dict[str, int], lease_seconds: float, default_limit: int = 1, ttl_seconds: float = 3600
+    ) -> Optional[dict]:
+        """
+        Atomically leases the best runnable job whose kind is under its concurrency cap.
+        Jobs failed here for losing their worker on the last attempt expire after
+        `ttl_seconds`, like jobs failed through `fail`.
+        """
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                # Expired leases: the worker died mid-job
+                conn.execute(
+                    "UPDATE jobs SET status = CASE WHEN attempts >= max_attempts THEN ? ELSE ? END, "
+                    "error = CASE WHEN attempts >= max_attempts THEN 'Worker lost while running job' ELSE error END, "
+                    "finished_at = CASE WHEN attempts >= max_attempts THEN ? ELSE finished_at END, "
+                    "expires_at = CASE WHEN attempts >= max_attempts THEN ? ELSE expires_at END, "
+                    "lease_owner = NULL, lease_expires = NULL, updated_at = ?, version = version + 1 "
+                    "WHERE status = ? AND lease_expires < ?",
+                    (ERROR, QUEUED, now, now + ttl_seconds, now, RUNNING, now)
+                )
+
+                running = dict(conn.execute(
+                    "SELECT kind, COUNT(*) FROM jobs WHERE status = ? GROUP BY kind", (RUNNING,)
+                ).fetchall())
+                full = [k for k in set(limits) | set(running) if running.get(k, 0) >= limits.get(k, default_limit)]
+
+                sql = "SELECT * FROM jobs WHERE status = ? AND run_after <= ?"
+                params: list = [QUEUED, now]
+                if full:
+                    sql += f" AND kind NOT IN ({','.join('?' for _ in full)})"
+                    params += full
+                cursor = conn.execute(sql + " ORDER BY priority DESC, created_at LIMIT 1", params)
+                row = cursor.fetchone()
+                if not row:
+                    conn.commit()
+                    return None
+
+                job = self._row(cursor, row)
+                conn.execute(
+                    "UPDATE jobs SET status = ?, attempts = attempts + 1, lease_owner = ?, lease_expires = ?, "
+                    "message = ?, error = NULL, updated_at = ?, version = version + 1 WHERE id = ?",
+                    (RUNNING, owner, now + lease_seconds, "Starting...", now, job["id"])
+                )
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+
+        job.update(status=RUNNING, attempts=job["attempts"] + 1, lease_owner=owner, version=job["version"] + 1)
+        return job
+
+    def update_progress(self, job_id: str, owner: str, progress: int, message: str, lease_seconds: float) -> bool:
+        """
+        Records progress and renews the lease. False if the job is no longer ours.
+        `version` only moves when progress/message actually change, so lease
+        heartbeats don't wake event-stream listeners.
+        """
+        now = time.time()
+        cursor = self._execute(
+            "UPDATE jobs SET version = version + (progress IS NOT ? OR message IS NOT ?), "
+            "progress = ?, message = ?, lease_expires = ?, updated_at = ? "
+            "WHERE id = ? AND lease_owner = ? AND status = ?",
+            (progress, message, progress, message, now + lease_seconds, now, job_id, owner, RUNNING)
+        )
+        return cursor.rowcount == 1
+
+    def complete(self, job_id: str, owner: str, result: dict, ttl_seconds: float) -> bool:
+        now = time.time()
+        cursor = self._execute(
+            "UPDATE jobs SET status = ?, progress = 100, message = ?, result = ?, lease_owner = NULL, "
+            "lease_expires = NULL, updated_at = ?, finished_at = ?, expires_at = ?, version = version + 1 "
+            "WHERE id = ? AND lease_owner = ? AND status = ?",
+            (COMPLETED, "Completed", json.dumps(result), now, now, now + ttl_seconds, job_id, owner, RUNNING)
+        )
+        return cursor.rowcount == 1
+
+    def fail(self, job_id: str, owner: str, error: str, ttl_seconds: float, retryable: bool = True) -> str:
+        """Re-queues with backoff while attempts remain; otherwise marks the job failed."""
+        job = self.get(job_id)
+        if not job or job["lease_owner"] != owner:
+            return job["status"] if job else ERROR
+
+        now = time.time()
+        if retryable and job["attempts"] < job["max_attempts"]:
+            delay = self.retry_backoff * (2 ** (job["attempts"] - 1))
+            self._execute(
+                "UPDATE jobs SET status = ?, error = ?, message = ?, lease_owner = NULL, lease_expires = NULL, "
+                "run_after = ?, updated_at = ?, version = version + 1 WHERE id = ? AND lease_owner = ?",
+                (QUEUED, error, f"Retrying (attempt {job['attempts'] + 1}/{job['max_attempts']})...",
+                 now + delay, now, job_id, owner)
+            )
+            return QUEUED
+
+        self._execute(
+            "UPDATE jobs SET status = ?, error = ?, message = ?, lease_owner = NULL, lease_expires = NULL, "
+            "updated_at = ?, finished_at = ?, expires_at = ?, version = version + 1 WHERE id = ? AND lease_owner = ?",
+            (ERROR, error, "Failed", now, now, now + ttl_seconds, job_id, owner)
+        )
+        return ERROR
+
+    def collect_expired(self, now: Optional[float] = None) -> list[dict]:
+        """Deletes finished jobs past their TTL and returns them (for artifact cleanup)."""
+        now = now or time.time()
+        with self._lock:
+            conn = self._connection()
+            cursor = conn.execute("SELECT * FROM jobs WHERE expires_at IS NOT NULL AND expires_at < ?", (now,))
+            jobs = [self._row(cursor, row) for row in cursor.fetchall()]
+            if jobs:
+                conn.executemany("DELETE FROM jobs WHERE id = ?", [(job["id"],) for job in jobs])
+            conn.commit()
+        return jobs
+
+    # --------------------------------------------------------
+    # Async wrappers (keep SQLite I/O off the event loop)
+    # --------------------------------------------------------
+    async def aenqueue(self, kind: str, payload: dict, priority: int = 0, max_attempts: int = 3) -> str:
+        return await asyncio.to_thread(self.enqueue, kind, payload, priority, max_attempts)
+
+    async def aget(self, job_id: str) -> Optional[dict]:
+        return await asyncio.to_thread(self.get, job_id)
+
+    async def adelete(self, job_id: str) -> Optional[dict]:
+        return await asyncio.to_thread(self.delete, job_id)
+
+    async def aqueue_position(self, job_id: str) -> Optional[int]:
+        return await asyncio.to_thread(self.queue_position, job_id)
+
+    async def wait_for_change(self, job_id: str, after_version: int, timeout: float, interval: float = 0.25) -> Optional[int]:
+        """
+        Waits until the job's version moves past `after_version` (or it disappears).
+        Returns the new version, `after_version` on timeout, or None if the job is gone.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while True:
+            version = await asyncio.to_thread(self.version, job_id)
+            if version is None or version != after_version or loop.time() >= deadline:
+                return version
+            await asyncio.sleep(interval)
@@ -0,0 +1,120 @@
+import os
+import asyncio
+import mimetypes
+from typing import AsyncIterator, NamedTuple, Optional
+from dotenv import load_dotenv
+
+from utils.r2_storage import R2_MULTIPART_CHUNK_MB, R2_MULTIPART_CONCURRENCY
+from utils.storage import storage
+
+load_dotenv()
+
+MEDIA_MAX_UPLOAD_MB = int(os.getenv("MEDIA_MAX_UPLOAD_MB", "200"))
+MEDIA_PRESIGN_EXPIRY = int(os.getenv("MEDIA_PRESIGN_EXPIRY", "900"))
+
+# S3/R2 require every part except the last to be at least 5MB
+_MIN_PART_BYTES = 5 * 1024 * 1024
+
+MEDIA_FOLDERS = {
+    "uploaded": "uploads",
+    "circle_search": "circle-search",
+    "snapshot": "snapshots",
+    "generated": "generated"
+}
+
+
+class UploadTooLarge(ValueError):
+    pass
+
+
+class UploadedObject(NamedTuple):
+    object_key: str
+    file_url: str
+    size: int
+
+
+def media_folder(source: str) -> str:
+    return MEDIA_FOLDERS.get(source, "uploads")
+
+
+def guess_content_type(filename: str, content_type: Optional[str] = None) -> str:
+    if content_type and content_type not in ("application/octet-stream", "application/x-www-form-urlencoded"):
+        return content_type
+    guessed, _ = mimetypes.guess_type(filename)
+    return guessed or "application/octet-stream"
+
+
+def user_upload_prefix(folder: str, user_id: int) -> str:
+    """Presigned uploads are confined to a per-user prefix so /complete can verify ownership."""
+    return f"{folder}/users/{user_id}/"
+
+
+async def stream_upload(
+    chunks: AsyncIterator[bytes],
+    filename: str,
+    content_type: str,
+    folder: str = "uploads",
+    max_bytes: int = MEDIA_MAX_UPLOAD_MB * 1024 * 1024,
+    backend=None
+) -> UploadedObject:
+    """
+    Pipes an async byte stream into object storage without holding the file in memory.
+
+    Bytes are gathered into part-sized buffers (R2_MULTIPART_CHUNK_MB); full parts are
+    uploaded in the background, at most R2_MULTIPART_CONCURRENCY at a time, so memory per
+    upload stays around (concurrency + 1) parts regardless of file size. Bodies smaller
+    than one part become a single PUT. Raises UploadTooLarge past `max_bytes`; any failure
+    aborts the multipart upload so no parts are left behind.
+    """
+    backend = backend or storage
+    part_bytes = max(R2_MULTIPART_CHUNK_MB * 1024 * 1024, _MIN_PART_BYTES)
+    object_key = backend.new_object_key(filename, folder)
+    buffer = bytearray()
+    upload_id = None
+    in_flight: set[asyncio.Task] = set()
+    parts = []
+    size = 0
+
+    async def drain(limit: int):
+        while len(in_flight) > limit:
+            done, _ = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                in_flight.discard(task)
+                parts.append(task.result())
+
+    try:
+        async for chunk in chunks:
+            if not chunk:
+                continue
+            size += len(chunk)
+            if size > max_bytes:
+                raise UploadTooLarge(f"File exceeds {max_bytes // (1024 * 1024)}MB limit")
+            buffer += chunk
+
+            while len(buffer) >= part_bytes:
+                if upload_id is None:
+                    upload_id = await backend.create_multipart_upload(object_key, content_type, filename)
+                part = bytes(buffer[:part_bytes])
+                del buffer[:part_bytes]
+                part_number = len(parts) + len(in_flight) + 1
+                in_flight.add(asyncio.create_task(backend.upload_part(object_key, upload_id, part_number, part)))
+                # Backpressure: stop reading the body while the part window is full
+                await drain(R2_MULTIPART_CONCURRENCY - 1)
+
+        if upload_id is None:
+            await backend.put_object(object_key, bytes(buffer), content_type, filename)
+        else:
+            if buffer:
+                part_number = len(parts) + len(in_flight) + 1
+                in_flight.add(asyncio.create_task(backend.upload_part(object_key, upload_id, part_number, bytes(buffer))))
+            await drain(0)
+            parts.sort(key=lambda p: p["PartNumber"])
+            await backend.complete_multipart_upload(object_key, upload_id, parts)
+    except BaseException:
+        for task in in_flight:
+            task.cancel()
+        if upload_id is not None:
+            await backend.abort_multipart_upload(object_key, upload_id)
+        raise
+
+    return UploadedObject(object_key, backend.public_url(object_key), size)
@@ -0,0 +1,111 @@
+import os
+import json
+import time
+import sqlite3
+import asyncio
+import hashlib
+from typing import NamedTuple, Optional
+from dotenv import load_dotenv
+
+from utils.lru_cache import LRUCache
+from utils.sqlite_store import SQLiteStore
+
+load_dotenv()
+
+API_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PAGE_FINGERPRINT_PATH = os.getenv("PAGE_FINGERPRINT_PATH", os.path.join(API_DIR, "page_fingerprints.sqlite3"))
+
+
+class PageFingerprint(NamedTuple):
+    page_hash: str
+    chunk_hashes: frozenset
+
+
+def fingerprint_text(text: str) -> str:
+    """
+    Hash of the cleaned page text, fed in 64KB blocks so large pages are never
+    re-encoded as a single bytes copy.
+    """
+    h = hashlib.blake2b(digest_size=16)
+    for start in range(0, len(text), 65536):
+        h.update(text[start:start + 65536].encode("utf-8", "surrogatepass"))
+    return h.hexdigest()
+
+
+class PageFingerprintIndex(SQLiteStore):
+    """
+    (user_id, url, conversation_id) -> fingerprint of the last successfully saved page.
+
+    Lets /context/save skip byte-identical pages entirely and, for changed pages,
+    diff the chunk hash sets so only new chunks are embedded/upserted and only
+    removed chunks are deleted from the vector index.
+    """
+
+    SCHEMA = ("""
+        CREATE TABLE IF NOT EXISTS page_fingerprints (
+            user_id TEXT NOT NULL,
+            url TEXT NOT NULL,
+            conversation_id INTEGER NOT NULL,
+            page_hash TEXT NOT NULL,
+            chunk_hashes TEXT NOT NULL,
+            updated_at REAL NOT NULL,
+            PRIMARY KEY (user_id, url, conversation_id)
+        )
+    """,)
+
+    def __init__(self, path: str = PAGE_FINGERPRINT_PATH, memory_items: int = 10000):
+        super().__init__(path)
+        self.memory = LRUCache(max_items=memory_items)
+
+    @staticmethod
+    def _key(user_id, url: str, conversation_id: Optional[int]) -> tuple:
+        return (str(user_id), url, int(conversation_id or 0))
+
+    def get(self, user_id, url: str, conversation_id: Optional[int]) -> Optional[PageFingerprint]:
+        key = self._key(user_id, url, conversation_id)
+        cached = self.memory.get(key)
+        if cached is not None:
+            return cached
+
+        try:
+            with self._lock:
+                row = self._connection().execute(
+                    "SELECT page_hash, chunk_hashes FROM page_fingerprints WHERE user_id = ? AND url = ? AND conversation_id = ?",
+                    key
+                ).fetchone()
+        except sqlite3.Error as e:
+            print(f"⚠️ Page fingerprint read failed: {e}")
+            return None
+
+        if not row:
+            return None
+
+        fingerprint = PageFingerprint(row[0], frozenset(json.loads(row[1])))
+        self.memory.set(key, fingerprint)
+        return fingerprint
+
+    def put(self, user_id, url: str, conversation_id: Optional[int], page_hash: str, chunk_hashes) -> None:
+        key = self._key(user_id, url, conversation_id)
+        fingerprint = PageFingerprint(page_hash, frozenset(chunk_hashes))
+        self.memory.set(key, fingerprint)
+
+        try:
+            with self._lock:
+                conn = self._connection()
+                conn.execute(
+                    "INSERT OR REPLACE INTO page_fingerprints VALUES (?, ?, ?, ?, ?, ?)",
+                    (*key, page_hash, json.dumps(sorted(fingerprint.chunk_hashes)), time.time())
+                )
+                conn.commit()
+        except sqlite3.Error as e:
+            print(f"⚠️ Page fingerprint write failed: {e}")
+
+    async def aget(self, user_id, url: str, conversation_id: Optional[int]) -> Optional[PageFingerprint]:
+        return await asyncio.to_thread(self.get, user_id, url, conversation_id)
+
+    async def aput(self, user_id, url: str, conversation_id: Optional[int], page_hash: str, chunk_hashes) -> None:
+        await asyncio.to_thread(self.put, user_id, url, conversation_id, page_hash, chunk_hashes)
+
+
+page_fingerprints = PageFingerprintIndex()
@@ -0,0 +1,159 @@
+import os
+import time
+from contextlib import contextmanager
+from urllib.parse import urlparse
+from dotenv import load_dotenv
+from playwright.async_api import Page, Route
+
+load_dotenv()
+
+CAPTURE_NAV_TIMEOUT_MS = int(os.getenv("CAPTURE_NAV_TIMEOUT_MS", "30000"))
+CAPTURE_LOAD_TIMEOUT_MS = int(os.getenv("CAPTURE_LOAD_TIMEOUT_MS", "8000"))
+CAPTURE_QUIET_MS = int(os.getenv("CAPTURE_QUIET_MS", "400"))
+CAPTURE_QUIESCENCE_TIMEOUT_MS = int(os.getenv("CAPTURE_QUIESCENCE_TIMEOUT_MS", "4000"))
+CAPTURE_MAX_SCROLL_PX = int(os.getenv("CAPTURE_MAX_SCROLL_PX", "30000"))
+CAPTURE_IMAGE_TIMEOUT_MS = int(os.getenv("CAPTURE_IMAGE_TIMEOUT_MS", "1500"))
+CAPTURE_BLOCK_REQUESTS = os.getenv("CAPTURE_BLOCK_REQUESTS", "true").lower() == "true"
+
+# Nothing here changes what a screenshot looks like in a useful way
+BLOCKED_RESOURCE_TYPES = {"font", "media", "websocket", "eventsource", "manifest"}
+BLOCKED_HOSTS = (
+    "doubleclick.net", "googlesyndication.com", "googletagmanager.com", "google-analytics.com",
+    "googleadservices.com", "adservice.google.com", "facebook.net", "connect.facebook.com",
+    "hotjar.com", "segment.io", "segment.com", "mixpanel.com", "amplitude.com", "intercom.io",
+    "clarity.ms", "taboola.com", "outbrain.com", "criteo.com", "adnxs.com", "scorecardresearch.com",
+    "newrelic.com", "nr-data.net", "sentry.io", "fullstory.com", "optimizely.com",
+)
+
+
+class PhaseTimer:
+    """Collects wall-clock milliseconds per capture phase (reported in the job status)."""
+
+    def __init__(self):
+        self.timings: dict[str, float] = {}
+
+    def record(self, name: str, started: float) -> None:
+        self.timings[name] = round((time.perf_counter() - started) * 1000, 1)
+
+    @contextmanager
+    def phase(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, start)
+
+
+def is_blocked_host(url: str) -> bool:
+    host = urlparse(url).hostname or ""
+    return any(host == blocked or host.endswith("." + blocked) for blocked in BLOCKED_HOSTS)
+
+
+async def install_request_blocking(page: Page) -> dict:
+    """Aborts ad/tracker/font/media requests. Returns a live counter of blocked requests."""
+    counts = {"blocked": 0}
+
+    async def handle(route: Route):
+        request = route.request
+        if request.resource_type in BLOCKED_RESOURCE_TYPES or is_blocked_host(request.url):
+            counts["blocked"] += 1
+            await route.abort()
+        else:
+            await route.continue_()
+
+    await page.route("**/*", handle)
+    return counts
+
+
+async def navigate(page: Page, url: str = None, html: str = None) -> None:
+    """
+    DOM-ready navigation plus a bounded wait for `load`; the quiescence check below
+    replaces the old open-ended `networkidle` wait (long-polling sites never go idle).
+    """
+    if html:
+        await page.set_content(html, wait_until="domcontentloaded")
+    else:
+        try:
+            await page.goto(url, wait_until="domcontentloaded", timeout=CAPTURE_NAV_TIMEOUT_MS)
+        except Exception as e:
+            print(f"⚠️ Navigation to {url} did not reach DOMContentLoaded: {e}")
+    try:
+        await page.wait_for_load_state("load", timeout=CAPTURE_LOAD_TIMEOUT_MS)
+    except Exception:
+        pass
+
+
+async def wait_for_dom_quiescence(page: Page, quiet_ms: int = CAPTURE_QUIET_MS, timeout_ms: int = CAPTURE_QUIESCENCE_TIMEOUT_MS) -> bool:
+    """Resolves once no DOM mutation happened for `quiet_ms`. False if it hit the timeout."""
+    return await page.evaluate("""
+        ([quietMs, timeoutMs]) => new Promise((resolve) => {
+            let quietTimer;
+            const observer = new MutationObserver(() => {
+                clearTimeout(quietTimer);
+                quietTimer = setTimeout(done, quietMs, true);
+            });
+            const hardTimer = setTimeout(done, timeoutMs, false);
+            function done(quiet) {
+                observer.disconnect();
+                clearTimeout(quietTimer);
+                clearTimeout(hardTimer);
+                resolve(quiet);
+            }
+            observer.observe(document.documentElement, {
+                childList: true, subtree: true, attributes: true, characterData: true
+            });
+            quietTimer = setTimeout(done, quietMs, true);
+        })
+    """, [quiet_ms, timeout_ms])
+
+
+async def scroll_and_load_images(page: Page, max_px: int = CAPTURE_MAX_SCROLL_PX, image_timeout_ms: int = CAPTURE_IMAGE_TIMEOUT_MS) -> dict:
+    """
+    Scrolls one viewport at a time so lazy content enters the viewport, waiting only
+    for images that are actually still loading. Stops at the bottom (once the page
+    stops growing) or at `max_px`. Returns {steps, height, images_waited}.
+    """
+    return await page.evaluate("""
+        async ([maxPx, imageTimeoutMs]) => {
+            const frame = () => new Promise(r => requestAnimationFrame(() => r()));
+            const waitForImage = (img) => new Promise((resolve) => {
+                if (img.complete) return resolve();
+                const t = setTimeout(resolve, imageTimeoutMs);
+                const finish = () => { clearTimeout(t); resolve(); };
+                img.addEventListener('load', finish, { once: true });
+                img.addEventListener('error', finish, { once: true });
+            });
+            const pendingInViewport = () => Array.from(document.images).filter((img) => {
+                if (img.complete) return false;
+                const rect = img.getBoundingClientRect();
+                return rect.bottom >= 0 && rect.top <= window.innerHeight;
+            });
+
+            const step = Math.max(window.innerHeight, 200);
+            let steps = 0, waited = 0, lastHeight = 0, stableAtBottom = 0;
+            while (window.scrollY < maxPx) {
+                const before = window.scrollY;
+                window.scrollBy(0, step);
+                steps++;
+                await frame();
+                const pending = pendingInViewport();
+                if (pending.length) {
+                    waited += pending.length;
+                    await Promise.all(pending.map(waitForImage));
+                }
+                const height = document.documentElement.scrollHeight;
+                // A scroll that doesn't move (e.g. overflow: hidden on body) counts as the bottom
+                const atBottom = window.scrollY === before || window.scrollY + window.innerHeight >= height - 2;
+                if (atBottom) {
+                    // Infinite-scroll pages grow after reaching the bottom; give them one frame
+                    stableAtBottom = height === lastHeight ? stableAtBottom + 1 : 0;
+                    if (stableAtBottom >= 1) break;
+                    await frame();
+                }
+                lastHeight = height;
+            }
+            window.scrollTo(0, 0);
+            await frame();
+            return { steps, height: document.documentElement.scrollHeight, images_waited: waited };
+        }
+    """, [max_px, image_timeout_ms])
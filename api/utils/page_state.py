@@ -0,0 +1,344 @@
+import os
+import json
+import time
+import sqlite3
+import asyncio
+import hashlib
+from typing import NamedTuple, Optional
+from dotenv import load_dotenv
+
+from utils.flat_dom import FlatDomView, is_flat_dom
+from utils.lru_cache import LRUCache
+from utils.sqlite_store import SQLiteStore
+
+load_dotenv()
+
+API_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PAGE_STATE_PATH = os.getenv("PAGE_STATE_PATH", os.path.join(API_DIR, "page_states.sqlite3"))
+PAGE_STATE_TTL = float(os.getenv("PAGE_STATE_TTL", "21600"))
+PAGE_STATE_MEMORY_ITEMS = int(os.getenv("PAGE_STATE_MEMORY_ITEMS", "128"))
+PAGE_STATE_MAX_OPS = int(os.getenv("PAGE_STATE_MAX_OPS", "2000"))
+# Deltas are logged; the full page is rewritten once this many have piled up
+PAGE_STATE_COMPACT_EVERY = int(os.getenv("PAGE_STATE_COMPACT_EVERY", "20"))
+# Reads push back expiry at most this often (a tab that is only read, never patched, stays alive)
+PAGE_STATE_TOUCH_EVERY = float(os.getenv("PAGE_STATE_TOUCH_EVERY", "60"))
+
+# Top-level payload fields a delta may overwrite (the tree itself changes via ops)
+DELTA_FIELDS = {"title", "url", "textContent", "metadata", "word_count", "extractedAt"}
+
+
+class PageStateError(ValueError):
+    """Malformed delta (bad op, path or field)."""
+
+
+class UnknownPageState(KeyError):
+    pass
+
+
+class VersionConflict(Exception):
+    def __init__(self, version: int):
+        super().__init__(f"Page state is at version {version}")
+        self.version = version
+
+
+class PageState(NamedTuple):
+    ref: str
+    version: int
+    payload: dict
+
+
+def page_key(url: str, tab_id: Optional[int] = None) -> str:
+    return f"tab:{tab_id}" if tab_id is not None else f"url:{url}"
+
+
+def page_ref(user_id, key: str) -> str:
+    return hashlib.blake2b(f"{user_id}\x00{key}".encode(), digest_size=12).hexdigest()
+
+
+# ======================================================
+# PATCHES
+# ======================================================
+
+def _child_index(children: list, index, insert: bool = False) -> int:
+    limit = len(children) if insert else len(children) - 1
+    if not isinstance(index, int) or isinstance(index, bool) or not 0 <= index <= limit:
+        raise PageStateError(f"Path index {index!r} out of range")
+    return index
+
+
+def _set_fields(node: dict, fields) -> dict:
+    if not isinstance(fields, dict) or "children" in fields:
+        raise PageStateError("'set' needs a fields object without children")
+    node = dict(node)
+    for key, value in fields.items():
+        if value is None:
+            node.pop(key, None)
+        else:
+            node[key] = value
+    return node
+
+
+def apply_op(root: dict, op: dict) -> dict:
+    """
+    Applies one node-level patch and returns the new tree. Only the nodes along
+    `path` are copied, so readers still holding the previous tree are unaffected.
+
+    Ops address nodes by child indexes from the root of `domTree`:
+        {"op": "replace", "path": [0, 2], "node": {...}}
+        {"op": "insert",  "path": [0, 2], "node": {...}}   # before index 2
+        {"op": "remove",  "path": [0, 2]}
+        {"op": "set",     "path": [0, 2], "fields": {"text": "...", "attrs": null}}
+    """
+    if not isinstance(op, dict):
+        raise PageStateError("Op must be an object")
+    kind, path = op.get("op"), op.get("path")
+    if kind not in ("replace", "insert", "remove", "set") or not isinstance(path, list):
+        raise PageStateError(f"Invalid op: {kind!r}")
+    if kind in ("replace", "insert") and not isinstance(op.get("node"), dict):
+        raise PageStateError(f"'{kind}' needs a node object")
+
+    if not path:
+        if kind == "replace":
+            return op["node"]
+        if kind == "set":
+            return _set_fields(root or {}, op.get("fields"))
+        raise PageStateError(f"Cannot {kind} the root node")
+    if not isinstance(root, dict):
+        raise PageStateError("Page state has no tree to patch")
+
+    new_root = dict(root)
+    parent = new_root
+    for index in path[:-1]:
+        children = list(parent.get("children") or ())
+        i = _child_index(children, index)
+        if not isinstance(children[i], dict):
+            raise PageStateError("Path goes through a text value")
+        children[i] = dict(children[i])
+        parent["children"] = children
+        parent = children[i]
+
+    children = list(parent.get("children") or ())
+    last = path[-1]
+    if kind == "insert":
+        children.insert(_child_index(children, last, insert=True), op["node"])
+    elif kind == "replace":
+        children[_child_index(children, last)] = op["node"]
+    elif kind == "remove":
+        del children[_child_index(children, last)]
+    else:
+        i = _child_index(children, last)
+        if not isinstance(children[i], dict):
+            raise PageStateError("Cannot set fields on a text value")
+        children[i] = _set_fields(children[i], op.get("fields"))
+    parent["children"] = children
+    return new_root
+
+
+def apply_delta(payload: dict, ops: list, fields: Optional[dict] = None) -> dict:
+    """New page payload after `ops` (on domTree) and top-level `fields`."""
+    fields = fields or {}
+    unknown = set(fields) - DELTA_FIELDS
+    if unknown:
+        raise PageStateError(f"Unknown fields: {', '.join(sorted(unknown))}")
+
+    payload = dict(payload)
+    if ops:
+        tree = payload.get("domTree")
+        for op in ops:
+            tree = apply_op(tree, op)
+        payload["domTree"] = tree
+        # Stale page text would win over the patched tree; consumers re-extract instead
+        if "textContent" not in fields:
+            payload.pop("textContent", None)
+    for key, value in fields.items():
+        if value is None:
+            payload.pop(key, None)
+        else:
+            payload[key] = value
+    return payload
+
+
+# ======================================================
+# STORE
+# ======================================================
+
+class PageStateStore(SQLiteStore):
+    """
+    Latest extracted page per (user, tab or URL), so the extension uploads a page
+    once and afterwards sends node-level deltas; chat requests carry only its ref.
+
+    Each row holds a full snapshot at `base_version` plus a log of the deltas
+    applied since (compacted every PAGE_STATE_COMPACT_EVERY versions), so a delta
+    costs a small insert rather than re-serializing the page. Readers keep parsed
+    pages in a memory LRU and only check the version in SQLite, which keeps
+    workers on the same host consistent.
+    """
+
+    SCHEMA = ("""
+        CREATE TABLE IF NOT EXISTS page_states (
+            ref TEXT PRIMARY KEY,
+            user_id TEXT NOT NULL,
+            page_key TEXT NOT NULL,
+            version INTEGER NOT NULL,
+            base_version INTEGER NOT NULL,
+            payload TEXT NOT NULL,
+            updated_at REAL NOT NULL
+        )
+    """, """
+        CREATE TABLE IF NOT EXISTS page_state_deltas (
+            ref TEXT NOT NULL,
+            version INTEGER NOT NULL,
+            delta TEXT NOT NULL,
+            PRIMARY KEY (ref, version)
+        )
+    """, """
+        CREATE INDEX IF NOT EXISTS idx_page_states_updated ON page_states (updated_at)
+    """)
+
+    def __init__(self, path: str = PAGE_STATE_PATH, memory_items: int = PAGE_STATE_MEMORY_ITEMS, ttl: float = PAGE_STATE_TTL):
+        super().__init__(path)
+        self.ttl = ttl
+        self.memory = LRUCache(max_items=memory_items)
+        self._last_prune = 0.0
+
+    def put(self, user_id, key: str, payload: dict) -> PageState:
+        """Stores a full page upload as the next version for this tab/URL."""
+        if is_flat_dom(payload.get("domTree")):
+            # Deltas address nodes by nested child paths, so keep the nested form
+            payload = {**payload, "domTree": FlatDomView(payload["domTree"]).to_nested()}
+        ref = page_ref(user_id, key)
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                row = conn.execute("SELECT version FROM page_states WHERE ref = ?", (ref,)).fetchone()
+                version = (row[0] if row else 0) + 1
+                conn.execute(
+                    "INSERT OR REPLACE INTO page_states (ref, user_id, page_key, version, base_version, payload, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (ref, str(user_id), key, version, version, json.dumps(payload), now)
+                )
+                conn.execute("DELETE FROM page_state_deltas WHERE ref = ?", (ref,))
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+        state = PageState(ref, version, payload)
+        self.memory.set(ref, state)
+
+        # Uploads are the natural place to expire abandoned tabs
+        if now - self._last_prune > 3600:
+            self._last_prune = now
+            self.prune()
+        return state
+
+    def _load(self, conn: sqlite3.Connection, ref: str, user_id) -> Optional[PageState]:
+        """Current state for `ref` (caller holds the lock), replaying logged deltas on a memory miss."""
+        row = conn.execute(
+            "SELECT user_id, version, base_version, updated_at FROM page_states WHERE ref = ?", (ref,)
+        ).fetchone()
+        now = time.time()
+        if not row or row[0] != str(user_id) or now - row[3] > self.ttl:
+            return None
+        _, version, base_version, updated_at = row
+        if now - updated_at > PAGE_STATE_TOUCH_EVERY:
+            conn.execute("UPDATE page_states SET updated_at = ? WHERE ref = ?", (now, ref))
+
+        cached = self.memory.get(ref)
+        if cached is not None and cached.version == version:
+            return cached
+
+        payload = json.loads(conn.execute("SELECT payload FROM page_states WHERE ref = ?", (ref,)).fetchone()[0])
+        for (delta,) in conn.execute(
+            "SELECT delta FROM page_state_deltas WHERE ref = ? AND version > ? ORDER BY version", (ref, base_version)
+        ):
+            delta = json.loads(delta)
+            payload = apply_delta(payload, delta["ops"], delta["fields"])
+        state = PageState(ref, version, payload)
+        self.memory.set(ref, state)
+        return state
+
+    def get(self, user_id, ref: str) -> Optional[PageState]:
+        """Current state, or None if unknown/expired. Reading a state keeps it alive."""
+        try:
+            with self._lock:
+                conn = self._connection()
+                state = self._load(conn, ref, user_id)
+                conn.commit()
+                return state
+        except sqlite3.Error as e:
+            print(f"⚠️ Page state read failed: {e}")
+            return None
+
+    def apply(self, user_id, ref: str, base_version: int, ops: list, fields: Optional[dict] = None) -> PageState:
+        """
+        Applies a delta made against `base_version`.
+        Raises UnknownPageState, VersionConflict (client must re-upload) or PageStateError.
+        """
+        if len(ops) > PAGE_STATE_MAX_OPS:
+            raise PageStateError(f"Too many ops ({len(ops)} > {PAGE_STATE_MAX_OPS}); upload the full page instead")
+        fields = fields or {}
+        now = time.time()
+
+        with self._lock:
+            conn = self._connection()
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                state = self._load(conn, ref, user_id)
+                if state is None:
+                    raise UnknownPageState(ref)
+                if state.version != base_version:
+                    raise VersionConflict(state.version)
+
+                payload = apply_delta(state.payload, ops, fields)
+                version = state.version + 1
+                base_version = conn.execute("SELECT base_version FROM page_states WHERE ref = ?", (ref,)).fetchone()[0]
+
+                if version - base_version >= PAGE_STATE_COMPACT_EVERY:
+                    conn.execute(
+                        "UPDATE page_states SET version = ?, base_version = ?, payload = ?, updated_at = ? WHERE ref = ?",
+                        (version, version, json.dumps(payload), now, ref)
+                    )
+                    conn.execute("DELETE FROM page_state_deltas WHERE ref = ?", (ref,))
+                else:
+                    conn.execute(
+                        "INSERT INTO page_state_deltas (ref, version, delta) VALUES (?, ?, ?)",
+                        (ref, version, json.dumps({"ops": ops, "fields": fields}))
+                    )
+                    conn.execute("UPDATE page_states SET version = ?, updated_at = ? WHERE ref = ?", (version, now, ref))
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+
+        state = PageState(ref, version, payload)
+        self.memory.set(ref, state)
+        return state
+
+    def prune(self) -> int:
+        cutoff = time.time() - self.ttl
+        try:
+            with self._lock:
+                conn = self._connection()
+                conn.execute(
+                    "DELETE FROM page_state_deltas WHERE ref IN (SELECT ref FROM page_states WHERE updated_at < ?)", (cutoff,)
+                )
+                cursor = conn.execute("DELETE FROM page_states WHERE updated_at < ?", (cutoff,))
+                conn.commit()
+                return cursor.rowcount
+        except sqlite3.Error as e:
+            print(f"⚠️ Page state prune failed: {e}")
+            return 0
+
+    async def aput(self, user_id, key: str, payload: dict) -> PageState:
+        return await asyncio.to_thread(self.put, user_id, key, payload)
+
+    async def aget(self, user_id, ref: str) -> Optional[PageState]:
+        return await asyncio.to_thread(self.get, user_id, ref)
+
+    async def aapply(self, user_id, ref: str, base_version: int, ops: list, fields: Optional[dict] = None) -> PageState:
+        return await asyncio.to_thread(self.apply, user_id, ref, base_version, ops, fields)
+
+
+page_states = PageStateStore()
@@ -1,5 +1,6 @@
 import boto3
 from botocore.client import Config
+from boto3.s3.transfer import TransferConfig
 from botocore.exceptions import ClientError
 import os
 from typing import Optional, Tuple
@@ -15,6 +16,10 @@ R2_SECRET_ACCESS_KEY = os.getenv("R2_SECRET_ACCESS_KEY", "9bc4aed8e61ce289fb9b3b
 R2_BUCKET_NAME = os.getenv("R2_BUCKET_NAME", "ai-extension")
 R2_ENDPOINT_URL = f"https://{R2_ACCOUNT_ID}.r2.cloudflarestorage.com"
 R2_PUBLIC_URL = os.getenv("R2_PUBLIC_URL", "https://cdn.aradhangini.com")
+R2_MULTIPART_CHUNK_MB = int(os.getenv("R2_MULTIPART_CHUNK_MB", "8"))
+R2_MULTIPART_CONCURRENCY = int(os.getenv("R2_MULTIPART_CONCURRENCY", "4"))
+R2_MAX_POOL_CONNECTIONS = int(os.getenv("R2_MAX_POOL_CONNECTIONS", "32"))
+R2_MAX_ATTEMPTS = int(os.getenv("R2_MAX_ATTEMPTS", "5"))
 
 class R2Storage:
     """Cloudflare R2 Storage Manager"""
@@ -25,7 +30,12 @@ class R2Storage:
             endpoint_url=R2_ENDPOINT_URL,
             aws_access_key_id=R2_ACCESS_KEY_ID,
             aws_secret_access_key=R2_SECRET_ACCESS_KEY,
-            config=Config(signature_version='s3v4'),
+            # One pooled client shared by every thread; adaptive mode retries throttling/5xx with backoff
+            config=Config(
+                signature_version='s3v4',
+                max_pool_connections=R2_MAX_POOL_CONNECTIONS,
+                retries={'max_attempts': R2_MAX_ATTEMPTS, 'mode': 'adaptive'}
+            ),
             region_name='auto'  # R2 uses 'auto' for region
         )
         self.bucket_name = R2_BUCKET_NAME
@@ -87,6 +97,128 @@ class R2Storage:
             print(error_msg)
             return False, "", error_msg
     
+    def upload_path(
+        self,
+        file_path: str,
+        filename: str,
+        content_type: Optional[str] = None,
+        folder: str = "uploads"
+    ) -> Tuple[bool, str, str]:
+        """
+        Upload a file from disk to R2, streamed in multipart chunks (never read fully into memory)
+        
+        Args:
+            file_path: Local path of the file
+            filename: Original filename (used for extension, content type and metadata)
+            content_type: MIME type (auto-detected if None)
+            folder: Folder path in bucket (e.g., 'uploads', 'snapshots')
+        
+        Returns:
+            Tuple of (success: bool, file_url: str, error_message: str)
+        """
+        try:
+            file_ext = os.path.splitext(filename)[1]
+            object_key = f"{folder}/{datetime.now().strftime('%Y/%m/%d')}/{uuid.uuid4().hex}{file_ext}"
+            
+            if not content_type:
+                content_type, _ = mimetypes.guess_type(filename)
+                if not content_type:
+                    content_type = 'application/octet-stream'
+            
+            chunk = R2_MULTIPART_CHUNK_MB * 1024 * 1024
+            self.s3_client.upload_file(
+                Filename=file_path,
+                Bucket=self.bucket_name,
+                Key=object_key,
+                ExtraArgs={
+                    'ContentType': content_type,
+                    'Metadata': {
+                        'original_filename': filename,
+                        'uploaded_at': datetime.utcnow().isoformat()
+                    }
+                },
+                Config=TransferConfig(
+                    multipart_threshold=chunk,
+                    multipart_chunksize=chunk,
+                    max_concurrency=R2_MULTIPART_CONCURRENCY
+                )
+            )
+            
+            return True, f"{R2_PUBLIC_URL}/{object_key}", ""
+        
+        except ClientError as e:
+            error_msg = f"R2 upload failed: {str(e)}"
+            print(error_msg)
+            return False, "", error_msg
+        except Exception as e:
+            error_msg = f"Unexpected error during upload: {str(e)}"
+            print(error_msg)
+            return False, "", error_msg
+    
+    # --------------------------------------------------------
+    # Multipart / presigned primitives (streaming uploads)
+    # --------------------------------------------------------
+    def put_object(self, object_key: str, data: bytes, content_type: str, filename: str) -> None:
+        self.s3_client.put_object(
+            Bucket=self.bucket_name,
+            Key=object_key,
+            Body=data,
+            ContentType=content_type,
+            Metadata={'original_filename': filename, 'uploaded_at': datetime.utcnow().isoformat()}
+        )
+    
+    def create_multipart_upload(self, object_key: str, content_type: str, filename: str) -> str:
+        response = self.s3_client.create_multipart_upload(
+            Bucket=self.bucket_name,
+            Key=object_key,
+            ContentType=content_type,
+            Metadata={'original_filename': filename, 'uploaded_at': datetime.utcnow().isoformat()}
+        )
+        return response['UploadId']
+    
+    def upload_part(self, object_key: str, upload_id: str, part_number: int, data: bytes) -> dict:
+        response = self.s3_client.upload_part(
+            Bucket=self.bucket_name,
+            Key=object_key,
+            UploadId=upload_id,
+            PartNumber=part_number,
+            Body=data
+        )
+        return {'PartNumber': part_number, 'ETag': response['ETag']}
+    
+    def complete_multipart_upload(self, object_key: str, upload_id: str, parts: list) -> None:
+        self.s3_client.complete_multipart_upload(
+            Bucket=self.bucket_name,
+            Key=object_key,
+            UploadId=upload_id,
+            MultipartUpload={'Parts': parts}
+        )
+    
+    def abort_multipart_upload(self, object_key: str, upload_id: str) -> None:
+        try:
+            self.s3_client.abort_multipart_upload(Bucket=self.bucket_name, Key=object_key, UploadId=upload_id)
+        except ClientError as e:
+            print(f"Failed to abort multipart upload {object_key}: {str(e)}")
+    
+    def object_size(self, object_key: str) -> Optional[int]:
+        """Size of an object in bytes, or None if it doesn't exist"""
+        try:
+            return self.s3_client.head_object(Bucket=self.bucket_name, Key=object_key)['ContentLength']
+        except ClientError:
+            return None
+    
+    def generate_presigned_put(self, object_key: str, content_type: str, expiry: int = 900) -> Optional[str]:
+        """Presigned PUT URL so clients can upload straight to R2 (must send the same Content-Type)"""
+        try:
+            return self.s3_client.generate_presigned_url(
+                'put_object',
+                Params={'Bucket': self.bucket_name, 'Key': object_key, 'ContentType': content_type},
+                ExpiresIn=expiry
+            )
+        except ClientError as e:
+            print(f"Failed to generate presigned upload URL: {str(e)}")
+            return None
+    
     def delete_file(self, file_url: str) -> Tuple[bool, str]:
         """
         Delete a file from R2
@@ -117,13 +249,14 @@ class R2Storage:
             print(error_msg)
             return False, error_msg
     
-    def generate_presigned_url(self, file_url: str, expiry: int = 3600) -> Optional[str]:
+    def generate_presigned_url(self, file_url: str, expiry: int = 3600, download_filename: Optional[str] = None) -> Optional[str]:
         """
         Generate a presigned URL for temporary access
         
         Args:
             file_url: Full URL of the file
             expiry: URL expiry time in seconds (default: 1 hour)
+            download_filename: If set, the response is served as an attachment with this name
         
         Returns:
             Presigned URL or None if failed
@@ -132,12 +265,16 @@ class R2Storage:
             # Extract object key from URL
             object_key = file_url.replace(f"{R2_PUBLIC_URL}/", "")
             
+            params = {
+                'Bucket': self.bucket_name,
+                'Key': object_key
+            }
+            if download_filename:
+                params['ResponseContentDisposition'] = f'attachment; filename="{download_filename}"'
+            
             presigned_url = self.s3_client.generate_presigned_url(
                 'get_object',
-                Params={
-                    'Bucket': self.bucket_name,
-                    'Key': object_key
-                },
+                Params=params,
                 ExpiresIn=expiry
             )
             
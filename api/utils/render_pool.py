@@ -0,0 +1,133 @@
+import os
+import asyncio
+import importlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from threading import Lock
+from dotenv import load_dotenv
+
+load_dotenv()
+
+RENDER_POOL_WORKERS = int(os.getenv("RENDER_POOL_WORKERS", "2"))
+RENDER_TIMEOUT_SECONDS = float(os.getenv("RENDER_TIMEOUT_SECONDS", "180"))
+RENDER_MAX_MEMORY_MB = int(os.getenv("RENDER_MAX_MEMORY_MB", "2048"))
+RENDER_MAX_TASKS_PER_CHILD = int(os.getenv("RENDER_MAX_TASKS_PER_CHILD", "100"))
+# Imported once per worker process so the first render doesn't pay for them. Only
+# the renderer module: workers never need the browser, LLM or cache layers.
+RENDER_WARM_IMPORTS = tuple(m for m in os.getenv("RENDER_WARM_IMPORTS", "renderers").split(",") if m)
+
+
+class RenderError(RuntimeError):
+    pass
+
+
+def _init_worker(max_memory_mb: int, warm_imports: tuple, started) -> None:
+    # Lets the pool kill this worker if a render hangs
+    started.put(os.getpid())
+    if max_memory_mb > 0:
+        try:
+            import resource
+            limit = max_memory_mb * 1024 * 1024
+            resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+        except (ImportError, ValueError, OSError) as e:
+            print(f"⚠️ Render worker memory cap not applied: {e}")
+    for module in warm_imports:
+        importlib.import_module(module)
+
+
+class RenderPool:
+    """
+    Process pool for CPU-heavy synchronous renders (ReportLab, WeasyPrint, python-docx).
+
+    Submitted functions must be importable top-level callables with picklable
+    arguments. Each worker caps its address space at `max_memory_mb` (a runaway
+    render raises MemoryError instead of taking the host down) and is replaced
+    after `max_tasks_per_child` jobs. A render that exceeds its timeout, or a
+    worker that dies, causes the pool to be torn down and rebuilt; renders that
+    were in flight on it fail with RenderError (the snapshot queue retries them).
+    """
+
+    def __init__(
+        self,
+        workers: int = RENDER_POOL_WORKERS,
+        timeout: float = RENDER_TIMEOUT_SECONDS,
+        max_memory_mb: int = RENDER_MAX_MEMORY_MB,
+        max_tasks_per_child: int = RENDER_MAX_TASKS_PER_CHILD,
+        warm_imports: tuple = RENDER_WARM_IMPORTS
+    ):
+        self.workers = workers
+        self.timeout = timeout
+        self.max_memory_mb = max_memory_mb
+        self.max_tasks_per_child = max_tasks_per_child
+        self.warm_imports = warm_imports
+        self._executor = None
+        self._started = None  # queue of worker pids reported by _init_worker
+        self._worker_pids = set()
+        self._lock = Lock()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                # max_tasks_per_child requires the spawn start method
+                context = multiprocessing.get_context("spawn")
+                self._started = context.SimpleQueue()
+                self._worker_pids = set()
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=context,
+                    initializer=_init_worker,
+                    initargs=(self.max_memory_mb, self.warm_imports, self._started),
+                    max_tasks_per_child=self.max_tasks_per_child or None
+                )
+            return self._executor
+
+    def _reset(self, executor: ProcessPoolExecutor) -> None:
+        with self._lock:
+            if self._executor is not executor:
+                return  # Another render already rebuilt it
+            self._executor = None
+            started, pids = self._started, self._worker_pids
+        while not started.empty():
+            pids.add(started.get())
+        # Hung renders never return, so their processes have to be killed. Only live
+        # children are matched, so a pid reused after a recycled worker exited is safe.
+        for process in multiprocessing.active_children():
+            if process.pid in pids:
+                try:
+                    process.kill()
+                except Exception:
+                    pass
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def warm(self) -> None:
+        """Starts the worker processes ahead of the first render."""
+        executor = self._get_executor()
+        for _ in range(self.workers):
+            executor.submit(int)
+
+    async def run(self, fn, *args, timeout: float = None):
+        executor = self._get_executor()
+        loop = asyncio.get_running_loop()
+        try:
+            return await asyncio.wait_for(
+                loop.run_in_executor(executor, fn, *args),
+                timeout=timeout or self.timeout
+            )
+        except asyncio.TimeoutError:
+            print(f"⚠️ Render {fn.__name__} timed out; restarting render pool")
+            self._reset(executor)
+            raise RenderError(f"{fn.__name__} timed out after {timeout or self.timeout:g}s")
+        except BrokenProcessPool:
+            print(f"⚠️ Render worker died during {fn.__name__}; restarting render pool")
+            self._reset(executor)
+            raise RenderError(f"{fn.__name__} crashed the render worker")
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+
+render_pool = RenderPool()
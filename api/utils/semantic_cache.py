@@ -0,0 +1,184 @@
+import os
+import time
+import asyncio
+from datetime import timedelta
+from threading import Lock
+from typing import NamedTuple, Optional
+from sqlalchemy import select, func
+from dotenv import load_dotenv
+
+from db.database import AsyncSessionLocal
+from db.models.vector_query import QueryHistory
+from embedding import embed_text
+from utils.page_fingerprint import page_fingerprints, fingerprint_text
+
+load_dotenv()
+
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE_ENABLED", "true").lower() == "true"
+# Max cosine distance between two queries for a replay; stricter than chat-memory lookups.
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.08"))
+SEMANTIC_CACHE_TTL_SECONDS = int(os.getenv("SEMANTIC_CACHE_TTL_SECONDS", "86400"))
+SEMANTIC_CACHE_SCOPE = os.getenv("SEMANTIC_CACHE_SCOPE", "user").lower()  # "user" | "global"
+
+
+class CacheScope(NamedTuple):
+    """Everything besides the query text that must match for a cached answer to be valid."""
+    model: str
+    url: Optional[str]                 # None for questions that don't depend on the page
+    context_fingerprint: str           # page hash the answer was grounded on ("" if none)
+
+
+class CacheHit(NamedTuple):
+    response: str
+    distance: float
+    query: str
+
+
+class SemanticCache:
+    """
+    Semantic response cache over `query_history`.
+
+    A turn is served from cache when a previous query (same user, or any user in
+    "global" scope) is within SEMANTIC_CACHE_THRESHOLD cosine distance, was answered
+    by the same model, for the same URL and the same page fingerprint, and is younger
+    than SEMANTIC_CACHE_TTL_SECONDS. When a page's content changes its fingerprint
+    changes, so older answers stop matching without touching chat memory rows.
+    """
+
+    def __init__(
+        self,
+        threshold: float = SEMANTIC_CACHE_THRESHOLD,
+        ttl_seconds: int = SEMANTIC_CACHE_TTL_SECONDS,
+        scope: str = SEMANTIC_CACHE_SCOPE
+    ):
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.global_scope = scope == "global"
+        self._lock = Lock()
+        self._stats = {"lookups": 0, "hits": 0, "misses": 0, "errors": 0, "stores": 0, "lookup_ms_total": 0.0}
+
+    def _count(self, key: str, amount: float = 1) -> None:
+        with self._lock:
+            self._stats[key] += amount
+
+    # --------------------------------------------------------
+    # Scope
+    # --------------------------------------------------------
+    async def context_fingerprint(
+        self,
+        user_id: str,
+        url: Optional[str],
+        conversation_id: Optional[int],
+        raw_context=None
+    ) -> str:
+        """
+        Fingerprint of the page the answer will be grounded on: the last saved page
+        (what vector retrieval reads), else the context sent with the request.
+        """
+        if url:
+            saved = await page_fingerprints.aget(user_id, url, conversation_id)
+            if saved:
+                return saved.page_hash
+
+        if isinstance(raw_context, dict):
+            text = raw_context.get("textContent") or raw_context.get("content")
+            if isinstance(text, str) and text:
+                return fingerprint_text(text)
+        elif isinstance(raw_context, str) and raw_context:
+            return fingerprint_text(raw_context)
+
+        return ""
+
+    # --------------------------------------------------------
+    # Lookup
+    # --------------------------------------------------------
+    async def _lookup(self, user_id: str, embedding: list[float], scope: CacheScope) -> Optional[CacheHit]:
+        distance = QueryHistory.query_embedding.cosine_distance(embedding).label("distance")
+        stmt = (
+            select(QueryHistory.response, QueryHistory.query, distance)
+            .where(QueryHistory.model == scope.model)
+            .where(QueryHistory.context_fingerprint == scope.context_fingerprint)
+            .where(QueryHistory.created_at >= func.now() - timedelta(seconds=self.ttl_seconds))
+        )
+        if not self.global_scope:
+            stmt = stmt.where(QueryHistory.user_id == user_id)
+        if scope.url:
+            stmt = stmt.where(QueryHistory.url == scope.url)
+
+        async with AsyncSessionLocal() as db:
+            row = (await db.execute(stmt.order_by(distance).limit(1))).first()
+
+        if row and row.distance is not None and row.distance < self.threshold:
+            return CacheHit(response=row.response, distance=float(row.distance), query=row.query)
+        return None
+
+    async def lookup(self, user_id: str, query: str, scope: CacheScope) -> Optional[CacheHit]:
+        start = time.perf_counter()
+        self._count("lookups")
+        try:
+            embedding = await embed_text(query)
+            if not any(embedding):
+                hit = None
+            else:
+                hit = await self._lookup(user_id, embedding, scope)
+        except Exception as e:
+            print(f"⚠️ Semantic cache lookup failed: {e}")
+            self._count("errors")
+            return None
+        finally:
+            self._count("lookup_ms_total", (time.perf_counter() - start) * 1000)
+
+        self._count("hits" if hit else "misses")
+        return hit
+
+    # --------------------------------------------------------
+    # Store
+    # --------------------------------------------------------
+    async def store(
+        self,
+        user_id: str,
+        conversation_id: Optional[int],
+        query: str,
+        response: str,
+        scope: CacheScope
+    ) -> None:
+        if not response.strip():
+            return
+        try:
+            query_embedding, response_embedding = await asyncio.gather(
+                embed_text(query), embed_text(response)
+            )
+            if not any(query_embedding):
+                return
+            async with AsyncSessionLocal() as db:
+                db.add(QueryHistory(
+                    user_id=user_id,
+                    conversation_id=conversation_id,
+                    url=scope.url,
+                    query=query,
+                    query_embedding=query_embedding,
+                    response=response,
+                    response_embedding=response_embedding,
+                    model=scope.model,
+                    context_fingerprint=scope.context_fingerprint
+                ))
+                await db.commit()
+            self._count("stores")
+        except Exception as e:
+            print(f"⚠️ Semantic cache store failed: {e}")
+            self._count("errors")
+
+    # --------------------------------------------------------
+    # Metrics
+    # --------------------------------------------------------
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+        answered = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / answered if answered else 0.0
+        stats["avg_lookup_ms"] = stats.pop("lookup_ms_total") / stats["lookups"] if stats["lookups"] else 0.0
+        stats.update({"threshold": self.threshold, "ttl_seconds": self.ttl_seconds, "global_scope": self.global_scope})
+        return stats
+
+
+semantic_cache = SemanticCache() if SEMANTIC_CACHE_ENABLED else None
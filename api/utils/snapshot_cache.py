@@ -0,0 +1,145 @@
+import os
+import json
+import time
+import sqlite3
+import asyncio
+import hashlib
+from typing import Awaitable, Callable, Optional
+from dotenv import load_dotenv
+
+from utils.lru_cache import LRUCache
+from utils.sqlite_store import SQLiteStore
+
+load_dotenv()
+
+API_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SNAPSHOT_CACHE_ENABLED = os.getenv("SNAPSHOT_CACHE_ENABLED", "true").lower() == "true"
+SNAPSHOT_CACHE_PATH = os.getenv("SNAPSHOT_CACHE_PATH", os.path.join(API_DIR, "snapshot_cache.sqlite3"))
+# Live pages change; scrapes go stale quickly. Reports are keyed by content hash, so they can live longer.
+SNAPSHOT_SCRAPE_TTL = float(os.getenv("SNAPSHOT_SCRAPE_TTL", "900"))
+SNAPSHOT_REPORT_TTL = float(os.getenv("SNAPSHOT_REPORT_TTL", "86400"))
+SNAPSHOT_CACHE_MEMORY_ITEMS = int(os.getenv("SNAPSHOT_CACHE_MEMORY_ITEMS", "256"))
+
+SCRAPE = "scrape"
+REPORT = "report"
+
+
+def cache_key(*parts: str) -> str:
+    h = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        h.update((part or "").encode("utf-8", "surrogatepass"))
+        h.update(b"\x00")
+    return h.hexdigest()
+
+
+class SnapshotCache(SQLiteStore):
+    """
+    Scrape results and structured LLM report JSON, shared across snapshot formats.
+
+    - `scrape` entries: keyed by URL (live fetch) or by hash of the HTML sent by the
+      extension, so every format requested for a page reuses one fetch + parse.
+    - `report` entries: keyed by (template, url, hash of the scraped text), so a
+      second PDF of the same content skips the LLM call; changed content misses.
+
+    Memory LRU in front of a host-local SQLite table; concurrent requests for the
+    same key in one process share a single computation.
+    """
+
+    SCHEMA = ("""
+        CREATE TABLE IF NOT EXISTS snapshot_cache (
+            namespace TEXT NOT NULL,
+            key TEXT NOT NULL,
+            value TEXT NOT NULL,
+            created_at REAL NOT NULL,
+            PRIMARY KEY (namespace, key)
+        )
+    """,)
+
+    def __init__(self, path: str = SNAPSHOT_CACHE_PATH, memory_items: int = SNAPSHOT_CACHE_MEMORY_ITEMS):
+        super().__init__(path)
+        self.memory = LRUCache(max_items=memory_items)
+        self._inflight: dict[tuple, asyncio.Future] = {}
+
+    def get(self, namespace: str, key: str, ttl: float) -> Optional[dict]:
+        entry = self.memory.get((namespace, key))
+        if entry is None:
+            try:
+                with self._lock:
+                    row = self._connection().execute(
+                        "SELECT value, created_at FROM snapshot_cache WHERE namespace = ? AND key = ?",
+                        (namespace, key)
+                    ).fetchone()
+            except sqlite3.Error as e:
+                print(f"⚠️ Snapshot cache read failed: {e}")
+                return None
+            if not row:
+                return None
+            entry = (json.loads(row[0]), row[1])
+            self.memory.set((namespace, key), entry)
+
+        value, created_at = entry
+        if time.time() - created_at > ttl:
+            return None
+        return value
+
+    def put(self, namespace: str, key: str, value: dict) -> None:
+        now = time.time()
+        self.memory.set((namespace, key), (value, now))
+        try:
+            with self._lock:
+                conn = self._connection()
+                conn.execute(
+                    "INSERT OR REPLACE INTO snapshot_cache (namespace, key, value, created_at) VALUES (?, ?, ?, ?)",
+                    (namespace, key, json.dumps(value), now)
+                )
+                conn.commit()
+        except sqlite3.Error as e:
+            print(f"⚠️ Snapshot cache write failed: {e}")
+
+    def prune(self, max_age: float) -> int:
+        try:
+            with self._lock:
+                conn = self._connection()
+                cursor = conn.execute("DELETE FROM snapshot_cache WHERE created_at < ?", (time.time() - max_age,))
+                conn.commit()
+                return cursor.rowcount
+        except sqlite3.Error as e:
+            print(f"⚠️ Snapshot cache prune failed: {e}")
+            return 0
+
+    async def get_or_create(
+        self,
+        namespace: str,
+        key: str,
+        ttl: float,
+        factory: Callable[[], Awaitable[dict]],
+        cacheable: Callable[[dict], bool] = lambda value: True
+    ) -> dict:
+        """Returns the cached value or awaits `factory` once per key, storing results that are `cacheable`."""
+        cached = await asyncio.to_thread(self.get, namespace, key, ttl)
+        if cached is not None:
+            print(f"♻️ Snapshot cache hit ({namespace})")
+            return cached
+
+        inflight = self._inflight.get((namespace, key))
+        if inflight:
+            return await asyncio.shield(inflight)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[(namespace, key)] = future
+        try:
+            value = await factory()
+            if cacheable(value):
+                await asyncio.to_thread(self.put, namespace, key, value)
+            future.set_result(value)
+            return value
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception()  # Mark retrieved when nobody else is waiting
+            raise
+        finally:
+            self._inflight.pop((namespace, key), None)
+
+
+snapshot_cache = SnapshotCache() if SNAPSHOT_CACHE_ENABLED else None
@@ -0,0 +1,31 @@
+import sqlite3
+from threading import Lock
+from typing import Optional
+
+
+class SQLiteStore:
+    """
+    Base class for small host-local SQLite stores (caches, indexes).
+
+    Opens one lazily-created connection in WAL mode that is shared across threads
+    and serialised with a lock, so subclasses can be called from `asyncio.to_thread`.
+    Subclasses set `SCHEMA` to the CREATE statements they need.
+    """
+
+    SCHEMA: tuple[str, ...] = ()
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            for statement in self.SCHEMA:
+                conn.execute(statement)
+            conn.commit()
+            self._conn = conn
+        return self._conn
@@ -0,0 +1,215 @@
+import os
+import uuid
+import shutil
+import asyncio
+from datetime import datetime
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple
+from dotenv import load_dotenv
+
+load_dotenv()
+
+API_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "r2").lower()  # "r2" | "local"
+STORAGE_IO_THREADS = int(os.getenv("STORAGE_IO_THREADS", "16"))
+LOCAL_STORAGE_ROOT = os.getenv("LOCAL_STORAGE_ROOT", os.path.join(API_DIR, "local_storage"))
+LOCAL_STORAGE_URL = os.getenv("LOCAL_STORAGE_URL", "http://localhost:8000/storage")
+
+
+def _object_key(filename: str, folder: str) -> str:
+    file_ext = os.path.splitext(filename)[1]
+    return f"{folder}/{datetime.now().strftime('%Y/%m/%d')}/{uuid.uuid4().hex}{file_ext}"
+
+
+class R2Backend:
+    """
+    Async facade over the boto3 R2 client.
+
+    boto3 is blocking, so every call runs on a dedicated thread pool sized to the
+    client's connection pool (instead of the default executor shared with everything
+    else). Retries (adaptive mode), pooling and multipart part size/parallelism are
+    configured on the client in utils/r2_storage.py.
+    """
+
+    name = "r2"
+
+    def __init__(self, threads: int = STORAGE_IO_THREADS):
+        from utils.r2_storage import r2_storage, R2_PUBLIC_URL
+        self.r2 = r2_storage
+        self.base_url = R2_PUBLIC_URL
+        self._executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="r2-io")
+
+    async def _run(self, fn, *args, **kwargs):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, partial(fn, *args, **kwargs))
+
+    # --------------------------------------------------------
+    # Keys / URLs
+    # --------------------------------------------------------
+    def new_object_key(self, filename: str, folder: str = "uploads") -> str:
+        return _object_key(filename, folder)
+
+    def public_url(self, object_key: str) -> str:
+        return f"{self.base_url}/{object_key}"
+
+    async def presigned_get(self, file_url: str, expiry: int = 3600, download_filename: Optional[str] = None) -> Optional[str]:
+        # Signing is local computation, no network round trip
+        return self.r2.generate_presigned_url(file_url, expiry=expiry, download_filename=download_filename)
+
+    async def presigned_put(self, object_key: str, content_type: str, expiry: int = 900) -> Optional[str]:
+        return self.r2.generate_presigned_put(object_key, content_type, expiry=expiry)
+
+    # --------------------------------------------------------
+    # Whole-object operations
+    # --------------------------------------------------------
+    async def upload_bytes(self, file_bytes: bytes, filename: str, content_type: Optional[str] = None, folder: str = "uploads") -> Tuple[bool, str, str]:
+        return await self._run(self.r2.upload_file, file_bytes, filename, content_type, folder)
+
+    async def upload_path(self, file_path: str, filename: str, content_type: Optional[str] = None, folder: str = "uploads") -> Tuple[bool, str, str]:
+        return await self._run(self.r2.upload_path, file_path, filename, content_type, folder)
+
+    async def delete_file(self, file_url: str) -> Tuple[bool, str]:
+        return await self._run(self.r2.delete_file, file_url)
+
+    async def object_size(self, object_key: str) -> Optional[int]:
+        return await self._run(self.r2.object_size, object_key)
+
+    async def put_object(self, object_key: str, data: bytes, content_type: str, filename: str) -> None:
+        await self._run(self.r2.put_object, object_key, data, content_type, filename)
+
+    # --------------------------------------------------------
+    # Multipart
+    # --------------------------------------------------------
+    async def create_multipart_upload(self, object_key: str, content_type: str, filename: str) -> str:
+        return await self._run(self.r2.create_multipart_upload, object_key, content_type, filename)
+
+    async def upload_part(self, object_key: str, upload_id: str, part_number: int, data: bytes) -> dict:
+        return await self._run(self.r2.upload_part, object_key, upload_id, part_number, data)
+
+    async def complete_multipart_upload(self, object_key: str, upload_id: str, parts: list) -> None:
+        await self._run(self.r2.complete_multipart_upload, object_key, upload_id, parts)
+
+    async def abort_multipart_upload(self, object_key: str, upload_id: str) -> None:
+        await self._run(self.r2.abort_multipart_upload, object_key, upload_id)
+
+
+class LocalStorageBackend:
+    """
+    Filesystem stand-in with the same interface, for offline development and tests.
+    Objects live under LOCAL_STORAGE_ROOT and are served by the API at /storage.
+    Presigned PUTs are not supported; clients use /media/upload/stream instead.
+    """
+
+    name = "local"
+
+    def __init__(self, root: str = LOCAL_STORAGE_ROOT, base_url: str = LOCAL_STORAGE_URL):
+        self.root = root
+        self.base_url = base_url.rstrip("/")
+        os.makedirs(os.path.join(root, ".multipart"), exist_ok=True)
+
+    def _path(self, object_key: str) -> str:
+        path = os.path.abspath(os.path.join(self.root, object_key))
+        if not path.startswith(os.path.abspath(self.root) + os.sep):
+            raise ValueError(f"Invalid object key: {object_key}")
+        return path
+
+    def _key(self, file_url: str) -> str:
+        return file_url.replace(f"{self.base_url}/", "")
+
+    def _write(self, object_key: str, data: bytes) -> None:
+        path = self._path(object_key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(data)
+
+    def _copy(self, file_path: str, object_key: str) -> None:
+        path = self._path(object_key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        shutil.copyfile(file_path, path)
+
+    def new_object_key(self, filename: str, folder: str = "uploads") -> str:
+        return _object_key(filename, folder)
+
+    def public_url(self, object_key: str) -> str:
+        return f"{self.base_url}/{object_key}"
+
+    async def presigned_get(self, file_url: str, expiry: int = 3600, download_filename: Optional[str] = None) -> Optional[str]:
+        return file_url
+
+    async def presigned_put(self, object_key: str, content_type: str, expiry: int = 900) -> Optional[str]:
+        return None
+
+    async def upload_bytes(self, file_bytes: bytes, filename: str, content_type: Optional[str] = None, folder: str = "uploads") -> Tuple[bool, str, str]:
+        object_key = self.new_object_key(filename, folder)
+        try:
+            await asyncio.to_thread(self._write, object_key, file_bytes)
+        except OSError as e:
+            return False, "", f"Local storage write failed: {e}"
+        return True, self.public_url(object_key), ""
+
+    async def upload_path(self, file_path: str, filename: str, content_type: Optional[str] = None, folder: str = "uploads") -> Tuple[bool, str, str]:
+        object_key = self.new_object_key(filename, folder)
+        try:
+            await asyncio.to_thread(self._copy, file_path, object_key)
+        except OSError as e:
+            return False, "", f"Local storage write failed: {e}"
+        return True, self.public_url(object_key), ""
+
+    async def delete_file(self, file_url: str) -> Tuple[bool, str]:
+        try:
+            await asyncio.to_thread(os.remove, self._path(self._key(file_url)))
+        except (OSError, ValueError) as e:
+            return False, f"Local storage delete failed: {e}"
+        return True, ""
+
+    async def object_size(self, object_key: str) -> Optional[int]:
+        try:
+            return os.path.getsize(self._path(object_key))
+        except (OSError, ValueError):
+            return None
+
+    async def put_object(self, object_key: str, data: bytes, content_type: str, filename: str) -> None:
+        await asyncio.to_thread(self._write, object_key, data)
+
+    async def create_multipart_upload(self, object_key: str, content_type: str, filename: str) -> str:
+        upload_id = uuid.uuid4().hex
+        os.makedirs(os.path.join(self.root, ".multipart", upload_id))
+        return upload_id
+
+    async def upload_part(self, object_key: str, upload_id: str, part_number: int, data: bytes) -> dict:
+        part_path = os.path.join(self.root, ".multipart", upload_id, f"{part_number:05d}")
+        await asyncio.to_thread(self._write_part, part_path, data)
+        return {"PartNumber": part_number, "ETag": f"{upload_id}-{part_number}"}
+
+    @staticmethod
+    def _write_part(part_path: str, data: bytes) -> None:
+        with open(part_path, "wb") as f:
+            f.write(data)
+
+    def _assemble(self, object_key: str, upload_id: str, parts: list) -> None:
+        parts_dir = os.path.join(self.root, ".multipart", upload_id)
+        path = self._path(object_key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as out:
+            for part in sorted(parts, key=lambda p: p["PartNumber"]):
+                with open(os.path.join(parts_dir, f"{part['PartNumber']:05d}"), "rb") as f:
+                    shutil.copyfileobj(f, out)
+        shutil.rmtree(parts_dir, ignore_errors=True)
+
+    async def complete_multipart_upload(self, object_key: str, upload_id: str, parts: list) -> None:
+        await asyncio.to_thread(self._assemble, object_key, upload_id, parts)
+
+    async def abort_multipart_upload(self, object_key: str, upload_id: str) -> None:
+        await asyncio.to_thread(shutil.rmtree, os.path.join(self.root, ".multipart", upload_id), True)
+
+
+def get_storage_backend(name: str = STORAGE_BACKEND):
+    if name == "local":
+        return LocalStorageBackend()
+    if name == "r2":
+        return R2Backend()
+    raise ValueError(f"Unknown STORAGE_BACKEND: {name}")
+
+
+storage = get_storage_backend()
@@ -1,86 +1,201 @@
 import json
-from langchain_text_splitters import RecursiveCharacterTextSplitter
+from typing import Iterator, Optional
 
-def extract_clean_text_from_dom(dom_node, depth=0, max_depth=50):
+from utils.flat_dom import FlatDomView, is_flat_dom
+
+SKIP_TAGS = frozenset({
+    "SCRIPT", "STYLE", "NOSCRIPT", "IFRAME", "SVG", "NAV", "FOOTER", "HEADER",
+    "ASIDE", "BUTTON", "INPUT", "FORM", "AD", "INS"
+})
+
+# tag -> (prefix, suffix) wrapped around the element's text when it has any
+TAG_FORMATS = {
+    **dict.fromkeys(("H1", "H2", "H3"), ("\n\n# ", "\n")),
+    **dict.fromkeys(("H4", "H5", "H6"), ("\n## ", "\n")),
+    **dict.fromkeys(("P", "DIV", "SECTION", "ARTICLE"), ("", "\n")),
+    "LI": ("- ", ""),
+    "CODE": ("`", "`"),
+    "TR": ("| ", " |"),
+}
+
+# Rough chars-per-token for budgeting without a tokenizer
+CHARS_PER_TOKEN = 4
+
+
+class _Frame:
+    __slots__ = ("prefix", "suffix", "parent", "opened", "has_items")
+
+    def __init__(self, prefix: str, suffix: str, parent: "_Frame" = None):
+        self.prefix = prefix
+        self.suffix = suffix
+        self.parent = parent
+        self.opened = False     # prefix already emitted
+        self.has_items = False  # at least one non-empty child emitted
+
+
+def _lead(frame: _Frame) -> str:
     """
-    Recursively extracts clean text from a DOM tree structure.
-    Compatible with the Universal Extractor from sidebar.js.
+    Text that must precede a new non-empty item inside `frame`: prefixes of
+    ancestors that had no text until now, and the " " between siblings.
     """
-    if not dom_node or depth > max_depth:
+    if frame.opened:
+        if frame.has_items:
+            return " "
+        frame.has_items = True
         return ""
 
-    # 1. Handle Text Nodes (Universal Extractor format)
-    if dom_node.get("type") == "text":
-        return dom_node.get("content", "").strip()
+    pending = []
+    while not frame.opened:
+        pending.append(frame)
+        frame = frame.parent
 
-    # 2. Handle Strings (Legacy/Fallback)
-    if isinstance(dom_node, str):
-        return dom_node.strip()
+    lead = []
+    for child in reversed(pending):
+        if frame.has_items:
+            lead.append(" ")
+        frame.has_items = True
+        child.opened = True
+        lead.append(child.prefix)
+        frame = child
+    if frame.has_items:
+        lead.append(" ")
+    frame.has_items = True
+    return "".join(lead)
 
-    tag = dom_node.get("tag", "").upper()
-    
-    # Skip noise tags (Double check, though frontend filters most)
-    SKIP_TAGS = {"SCRIPT", "STYLE", "NOSCRIPT", "IFRAME", "SVG", "NAV", "FOOTER", "HEADER", "ASIDE", "BUTTON", "INPUT", "FORM", "AD", "INS"}
-    if tag in SKIP_TAGS:
-        return ""
 
-    text_parts = []
-    
-    # 3. Recurse children
-    children = dom_node.get("children", [])
-    child_texts = []
-    
-    for child in children:
-        text = extract_clean_text_from_dom(child, depth + 1, max_depth)
-        if text:
-            child_texts.append(text)
-
-    # 4. Formatting based on Tag
-    full_text = " ".join(child_texts)
-    
-    if not full_text:
-        return ""
+def iter_dom_text(dom_node) -> Iterator[str]:
+    """
+    Yields the clean text of a DOM tree as segments, in document order, in a
+    single iterative pass (no recursion limit, no per-level string copies).
+
+    Accepts both the Universal Extractor format (`{"type": "text", "content"}`
+    leaves) and domExtractor.js nodes (`{"tag", "text", "children"}`). Empty
+    elements produce nothing, so the joined segments match the old recursive
+    formatting. Stop iterating to stop extraction. Flat (`flat-dom/1`) trees are
+    walked in place via FlatDomView.
+    """
+    if is_flat_dom(dom_node):
+        yield from _iter_flat_dom_text(FlatDomView(dom_node))
+        return
+
+    root = _Frame("", "")
+    root.opened = True
+    # (children iterator, frame they belong to, frame to close once exhausted)
+    stack = [(iter((dom_node,)), root, None)]
+
+    while stack:
+        children, frame, closing = stack[-1]
+        for node in children:
+            if node.__class__ is dict:
+                if node.get("type") == "text":
+                    text = node.get("content")
+                else:
+                    tag = (node.get("tag") or "").upper()
+                    if tag in SKIP_TAGS:
+                        continue
+                    fmt = TAG_FORMATS.get(tag)
+                    # Unformatted elements (span, a, td...) join their children with
+                    # spaces exactly like their parent does, so they share its frame
+                    element = _Frame(fmt[0], fmt[1], frame) if fmt else frame
 
-    if tag in ["H1", "H2", "H3"]:
-        return f"\n\n# {full_text}\n"
-    elif tag in ["H4", "H5", "H6"]:
-        return f"\n## {full_text}\n"
-    elif tag == "LI":
-        return f"- {full_text}"
-    elif tag in ["P", "DIV", "SECTION", "ARTICLE"]:
-        return f"{full_text}\n"
-    elif tag == "CODE":
-        return f"`{full_text}`"
-    elif tag == "TR":
-        return f"| {full_text} |"
-    elif tag in ["TD", "TH"]:
-        return getattr(dom_node, "text", full_text) # Simple cell join
-        
-    return full_text
-
-
-def limit_context(text: str, chunk_size: int = 4000, overlap: int = 200, max_chunks: int = 3) -> str:
+                    own_text = node.get("text")
+                    if own_text and own_text.__class__ is str:
+                        own_text = own_text.strip()
+                        if own_text:
+                            yield _lead(element) + own_text
+
+                    grandchildren = node.get("children")
+                    if grandchildren:
+                        stack.append((iter(grandchildren), element, element if fmt and fmt[1] else None))
+                        break
+                    if fmt and fmt[1] and element.opened:
+                        yield fmt[1]
+                    continue
+            else:
+                text = node
+
+            if not text or text.__class__ is not str:
+                continue
+            text = text.strip()
+            if not text:
+                continue
+            if frame.opened:
+                if frame.has_items:
+                    yield " " + text
+                else:
+                    frame.has_items = True
+                    yield text
+            else:
+                yield _lead(frame) + text
+        else:
+            stack.pop()
+            if closing is not None and closing.opened:
+                yield closing.suffix
+
+
+def _iter_flat_dom_text(view: FlatDomView) -> Iterator[str]:
+    """iter_dom_text over the pre-order node columns: a linear scan, no per-node objects."""
+    root = _Frame("", "")
+    root.opened = True
+    frame = root
+    open_frames = []  # (end index, frame) of formatted elements enclosing the cursor
+
+    upper = [name.upper() for name in view.strings]
+    tags, sizes, texts = view.tags, view.sizes, view.texts
+    node, count = 0, len(view)
+
+    while node < count:
+        while open_frames and node >= open_frames[-1][0]:
+            closing = open_frames.pop()[1]
+            if closing.opened and closing.suffix:
+                yield closing.suffix
+            frame = open_frames[-1][1] if open_frames else root
+
+        tag = upper[tags[node]]
+        if tag in SKIP_TAGS:
+            node += sizes[node]
+            continue
+        fmt = TAG_FORMATS.get(tag)
+        if fmt:
+            frame = _Frame(fmt[0], fmt[1], frame)
+            open_frames.append((node + sizes[node], frame))
+
+        text = texts[node]
+        if text and text.__class__ is str:
+            text = text.strip()
+            if text:
+                yield _lead(frame) + text
+        node += 1
+
+    while open_frames:
+        closing = open_frames.pop()[1]
+        if closing.opened and closing.suffix:
+            yield closing.suffix
+
+
+def extract_clean_text_from_dom(dom_node, max_chars: Optional[int] = None, max_tokens: Optional[int] = None) -> str:
     """
-    Splits text into chunks and returns the first N chunks to fit context window.
-    Using RecursiveCharacterTextSplitter for intelligent splitting.
+    Extracts clean text from a DOM tree structure.
+    Compatible with the Universal Extractor from sidebar.js and domExtractor.js.
+
+    Stops walking the tree once `max_chars` (or ~`max_tokens`) of text has been
+    produced, so oversized pages cost no more than the budget.
     """
-    if not text:
+    if not dom_node:
         return ""
-        
-    splitter = RecursiveCharacterTextSplitter(
-        chunk_size=chunk_size,
-        chunk_overlap=overlap,
-        separators=["\n\n", "\n", " ", ""]
-    )
-    
-    chunks = splitter.split_text(text)
-    
-    # Return limited chunks joined
-    selected_chunks = chunks[:max_chunks]
-    
-    # Add an indicator if truncated
-    result = "\n\n".join(selected_chunks)
-    if len(chunks) > max_chunks:
-        result += "\n\n...[Content Truncated]..."
-        
-    return result
+
+    if max_tokens is not None:
+        token_chars = max_tokens * CHARS_PER_TOKEN
+        max_chars = token_chars if max_chars is None else min(max_chars, token_chars)
+
+    if max_chars is None:
+        return "".join(iter_dom_text(dom_node))
+
+    parts = []
+    total = 0
+    for segment in iter_dom_text(dom_node):
+        parts.append(segment)
+        total += len(segment)
+        if total >= max_chars:
+            break
+    return "".join(parts)[:max_chars]
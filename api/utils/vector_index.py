@@ -0,0 +1,563 @@
+import os
+import json
+import math
+import asyncio
+import hashlib
+from abc import ABC, abstractmethod
+from typing import AsyncIterator, Awaitable, Callable, Optional
+import httpx
+from dotenv import load_dotenv
+
+load_dotenv()
+
+API_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+VECTOR_INDEX_BACKEND = os.getenv("VECTOR_INDEX_BACKEND", "pinecone").lower()
+
+CHROMA_PERSIST_DIR = os.getenv("CHROMA_PERSIST_DIR", os.path.join(API_DIR, "chroma_index"))
+CHROMA_COLLECTION_PREFIX = os.getenv("CHROMA_COLLECTION_PREFIX", "page_chunks")
+CHROMA_SHARDS = int(os.getenv("CHROMA_SHARDS", "8"))
+
+PINECONE_API_VERSION = "2025-01"
+PINECONE_CONTROL_PLANE_URL = "https://api.pinecone.io"
+PINECONE_UPSERT_BATCH_SIZE = int(os.getenv("PINECONE_UPSERT_BATCH_SIZE", "100"))
+PINECONE_MAX_REQUEST_BYTES = int(os.getenv("PINECONE_MAX_REQUEST_BYTES", str(2 * 1024 * 1024)))
+PINECONE_MAX_CONCURRENCY = int(os.getenv("PINECONE_MAX_CONCURRENCY", "8"))
+PINECONE_MAX_CONNECTIONS = int(os.getenv("PINECONE_MAX_CONNECTIONS", "32"))
+PINECONE_UPSERT_LINGER_MS = int(os.getenv("PINECONE_UPSERT_LINGER_MS", "25"))
+
+# Pinecone rejects delete requests with more than 1000 ids
+_DELETE_BATCH = 1000
+
+
+# ======================================================
+# INTERFACE
+# ======================================================
+
+class VectorIndex(ABC):
+    """
+    Async vector index interface used by VectorStoreService.
+
+    Vectors are dicts of {"id", "values", "metadata"}; query results are dicts of
+    {"id", "score", "metadata"} ordered by descending similarity. Filters follow the
+    Pinecone metadata filter syntax (field equality, $eq/$ne/$in/$nin and $and).
+    """
+
+    @abstractmethod
+    async def upsert(self, vectors: list[dict], namespace: str = "") -> int:
+        ...
+
+    @abstractmethod
+    async def query(
+        self,
+        vector: list[float],
+        top_k: int = 5,
+        filter: Optional[dict] = None,
+        include_metadata: bool = True,
+        namespace: str = ""
+    ) -> list[dict]:
+        ...
+
+    @abstractmethod
+    async def delete(self, ids: list[str], namespace: str = "") -> None:
+        ...
+
+    async def aclose(self) -> None:
+        return None
+
+
+def matches_filter(metadata: dict, filter: Optional[dict]) -> bool:
+    """Evaluates a Pinecone-style metadata filter against a metadata dict."""
+    if not filter:
+        return True
+
+    for field, condition in filter.items():
+        if field == "$and":
+            if not all(matches_filter(metadata, sub) for sub in condition):
+                return False
+            continue
+        if field == "$or":
+            if not any(matches_filter(metadata, sub) for sub in condition):
+                return False
+            continue
+
+        value = metadata.get(field)
+        if not isinstance(condition, dict):
+            condition = {"$eq": condition}
+
+        for op, expected in condition.items():
+            if op == "$eq" and value != expected:
+                return False
+            if op == "$ne" and value == expected:
+                return False
+            if op == "$in" and value not in expected:
+                return False
+            if op == "$nin" and value in expected:
+                return False
+
+    return True
+
+
+# ======================================================
+# UPSERT COALESCING
+# ======================================================
+
+def estimate_vector_bytes(vector: dict) -> int:
+    """Rough JSON size of a vector record (floats serialise to ~20 bytes each)."""
+    return 20 * len(vector.get("values", [])) + len(json.dumps(vector.get("metadata") or {})) + 64
+
+
+class UpsertBatcher:
+    """
+    Coalesces concurrent upserts (e.g. many users saving pages at once) into shared,
+    size-capped batches and sends them with bounded concurrency.
+
+    Each `submit` call resolves once every one of its vectors has been written,
+    or raises if any batch carrying its vectors failed.
+    """
+
+    def __init__(
+        self,
+        send_batch: Callable[[list[dict], str], Awaitable[None]],
+        max_batch_size: int = PINECONE_UPSERT_BATCH_SIZE,
+        max_batch_bytes: int = PINECONE_MAX_REQUEST_BYTES,
+        max_concurrency: int = PINECONE_MAX_CONCURRENCY,
+        linger_ms: int = PINECONE_UPSERT_LINGER_MS
+    ):
+        self.send_batch = send_batch
+        self.max_batch_size = max_batch_size
+        # Leave headroom for the request envelope
+        self.max_batch_bytes = int(max_batch_bytes * 0.9)
+        self.linger = linger_ms / 1000
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._pending: dict[str, list[tuple[dict, list]]] = {}
+        self._flush_scheduled = False
+        self._tasks: set[asyncio.Task] = set()
+        self.batches_sent = 0
+
+    async def submit(self, vectors: list[dict], namespace: str = "") -> int:
+        if not vectors:
+            return 0
+
+        future = asyncio.get_running_loop().create_future()
+        # [vectors still in flight, future] shared by every queued vector of this call
+        ticket = [len(vectors), future]
+        self._pending.setdefault(namespace, []).extend((v, ticket) for v in vectors)
+
+        if not self._flush_scheduled:
+            self._flush_scheduled = True
+            task = asyncio.create_task(self._flush_after_linger())
+            # Keep a strong reference until the flush finishes
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+        await future
+        return len(vectors)
+
+    async def _flush_after_linger(self):
+        if self.linger:
+            await asyncio.sleep(self.linger)
+
+        # Anything submitted from here on is picked up by the next flush
+        pending, self._pending = self._pending, {}
+        self._flush_scheduled = False
+
+        sends = []
+        for namespace, items in pending.items():
+            for batch in self._split(items):
+                sends.append(self._send(batch, namespace))
+        await asyncio.gather(*sends)
+
+    def _split(self, items: list[tuple[dict, list]]):
+        batch, batch_bytes = [], 0
+        for item in items:
+            size = estimate_vector_bytes(item[0])
+            if batch and (len(batch) >= self.max_batch_size or batch_bytes + size > self.max_batch_bytes):
+                yield batch
+                batch, batch_bytes = [], 0
+            batch.append(item)
+            batch_bytes += size
+        if batch:
+            yield batch
+
+    async def _send(self, batch: list[tuple[dict, list]], namespace: str):
+        try:
+            async with self._semaphore:
+                await self.send_batch([vector for vector, _ in batch], namespace)
+            self.batches_sent += 1
+        except Exception as e:
+            for _, ticket in batch:
+                if not ticket[1].done():
+                    ticket[1].set_exception(e)
+            return
+
+        for _, ticket in batch:
+            ticket[0] -= 1
+            if ticket[0] == 0 and not ticket[1].done():
+                ticket[1].set_result(None)
+
+
+# ======================================================
+# PINECONE (ASYNC, POOLED)
+# ======================================================
+
+class PineconeIndexClient(VectorIndex):
+    """
+    Async Pinecone data-plane client over a single pooled httpx.AsyncClient.
+
+    Upserts go through an UpsertBatcher; queries and deletes share the same
+    connection pool and concurrency limit instead of spawning a thread per call.
+    """
+
+    def __init__(
+        self,
+        api_key: str,
+        index_name: str,
+        host: Optional[str] = None,
+        max_concurrency: int = PINECONE_MAX_CONCURRENCY,
+        max_connections: int = PINECONE_MAX_CONNECTIONS,
+        timeout: float = 30.0,
+        max_retries: int = 3
+    ):
+        self.api_key = api_key
+        self.index_name = index_name
+        self._host = f"https://{host}" if host and not host.startswith("http") else host
+        self.max_retries = max_retries
+        self._limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        self._timeout = timeout
+        self._http: Optional[httpx.AsyncClient] = None
+        self._host_lock: Optional[asyncio.Lock] = None
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self.batcher = UpsertBatcher(self._send_upsert_batch, max_concurrency=max_concurrency)
+
+    # --------------------------------------------------------
+    # Connection pool & host resolution
+    # --------------------------------------------------------
+    def _client(self) -> httpx.AsyncClient:
+        if self._http is None or self._http.is_closed:
+            self._http = httpx.AsyncClient(
+                limits=self._limits,
+                timeout=self._timeout,
+                headers={
+                    "Api-Key": self.api_key,
+                    "Content-Type": "application/json",
+                    "X-Pinecone-API-Version": PINECONE_API_VERSION,
+                }
+            )
+        return self._http
+
+    async def _resolve_host(self) -> str:
+        if self._host:
+            return self._host
+
+        if self._host_lock is None:
+            self._host_lock = asyncio.Lock()
+
+        async with self._host_lock:
+            if not self._host:
+                resp = await self._client().get(f"{PINECONE_CONTROL_PLANE_URL}/indexes/{self.index_name}")
+                resp.raise_for_status()
+                self._host = f"https://{resp.json()['host']}"
+        return self._host
+
+    async def _post(self, path: str, payload: dict) -> dict:
+        return await self._request("POST", path, json=payload)
+
+    async def _request(self, method: str, path: str, **kwargs) -> dict:
+        host = await self._resolve_host()
+        delay = 0.5
+
+        for attempt in range(self.max_retries):
+            try:
+                resp = await self._client().request(method, f"{host}{path}", **kwargs)
+                resp.raise_for_status()
+                return resp.json() if resp.content else {}
+            except (httpx.TransportError, httpx.HTTPStatusError) as e:
+                retryable = isinstance(e, httpx.TransportError) or e.response.status_code == 429 or e.response.status_code >= 500
+                if not retryable or attempt == self.max_retries - 1:
+                    raise
+                await asyncio.sleep(delay)
+                delay *= 2
+
+    # --------------------------------------------------------
+    # Data plane
+    # --------------------------------------------------------
+    async def _send_upsert_batch(self, vectors: list[dict], namespace: str) -> None:
+        await self._post("/vectors/upsert", {"vectors": vectors, "namespace": namespace})
+
+    async def upsert(self, vectors: list[dict], namespace: str = "") -> int:
+        return await self.batcher.submit(vectors, namespace)
+
+    async def query(
+        self,
+        vector: list[float],
+        top_k: int = 5,
+        filter: Optional[dict] = None,
+        include_metadata: bool = True,
+        namespace: str = ""
+    ) -> list[dict]:
+        payload = {
+            "vector": vector,
+            "topK": top_k,
+            "includeMetadata": include_metadata,
+            "namespace": namespace,
+        }
+        if filter:
+            payload["filter"] = filter
+
+        async with self._semaphore:
+            result = await self._post("/query", payload)
+        return result.get("matches", [])
+
+    async def delete(self, ids: list[str], namespace: str = "") -> None:
+        for start in range(0, len(ids), _DELETE_BATCH):
+            async with self._semaphore:
+                await self._post("/vectors/delete", {"ids": ids[start:start + _DELETE_BATCH], "namespace": namespace})
+
+    async def list_ids(self, prefix: str = "", namespace: str = "", page_size: int = 100) -> AsyncIterator[list[str]]:
+        """Pages of vector ids (serverless indexes only; used by maintenance scripts)."""
+        token = None
+        while True:
+            params = {"namespace": namespace, "limit": page_size}
+            if prefix:
+                params["prefix"] = prefix
+            if token:
+                params["paginationToken"] = token
+            async with self._semaphore:
+                result = await self._request("GET", "/vectors/list", params=params)
+            ids = [v["id"] for v in result.get("vectors", [])]
+            if ids:
+                yield ids
+            token = (result.get("pagination") or {}).get("next")
+            if not token:
+                return
+
+    async def fetch(self, ids: list[str], namespace: str = "") -> dict[str, dict]:
+        """id -> {"id", "values", "metadata"} for the ids that exist."""
+        async with self._semaphore:
+            result = await self._request("GET", "/vectors/fetch", params={"ids": ids, "namespace": namespace})
+        return result.get("vectors", {})
+
+    async def aclose(self) -> None:
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+
+# ======================================================
+# IN-PROCESS STAND-IN (TESTS / OFFLINE DEV)
+# ======================================================
+
+class InMemoryVectorIndex(VectorIndex):
+    """
+    In-process index implementing the same interface with brute-force cosine
+    similarity. Upserts still go through an UpsertBatcher so batching behaviour
+    can be exercised offline.
+    """
+
+    def __init__(self, max_batch_size: int = PINECONE_UPSERT_BATCH_SIZE, linger_ms: int = 0):
+        self._namespaces: dict[str, dict[str, dict]] = {}
+        self.batcher = UpsertBatcher(self._write_batch, max_batch_size=max_batch_size, linger_ms=linger_ms)
+
+    async def _write_batch(self, vectors: list[dict], namespace: str) -> None:
+        store = self._namespaces.setdefault(namespace, {})
+        for v in vectors:
+            store[v["id"]] = {"values": list(v["values"]), "metadata": dict(v.get("metadata") or {})}
+
+    async def upsert(self, vectors: list[dict], namespace: str = "") -> int:
+        return await self.batcher.submit(vectors, namespace)
+
+    @staticmethod
+    def _cosine(a: list[float], b: list[float]) -> float:
+        dot = sum(x * y for x, y in zip(a, b))
+        norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+        return dot / norm if norm else 0.0
+
+    async def query(
+        self,
+        vector: list[float],
+        top_k: int = 5,
+        filter: Optional[dict] = None,
+        include_metadata: bool = True,
+        namespace: str = ""
+    ) -> list[dict]:
+        scored = [
+            {
+                "id": vid,
+                "score": self._cosine(vector, record["values"]),
+                "metadata": record["metadata"] if include_metadata else {}
+            }
+            for vid, record in self._namespaces.get(namespace, {}).items()
+            if matches_filter(record["metadata"], filter)
+        ]
+        scored.sort(key=lambda m: m["score"], reverse=True)
+        return scored[:top_k]
+
+    async def delete(self, ids: list[str], namespace: str = "") -> None:
+        store = self._namespaces.get(namespace, {})
+        for vid in ids:
+            store.pop(vid, None)
+
+    def __len__(self) -> int:
+        return sum(len(store) for store in self._namespaces.values())
+
+
+# ======================================================
+# EMBEDDED HNSW (CHROMA, IN-PROCESS)
+# ======================================================
+
+def to_chroma_where(filter: Optional[dict]) -> Optional[dict]:
+    """
+    Translates a Pinecone-style filter into Chroma's `where` syntax, which needs
+    explicit operators and an explicit $and for more than one field.
+    """
+    if not filter:
+        return None
+
+    clauses = []
+    for field, condition in filter.items():
+        if field in ("$and", "$or"):
+            subs = [to_chroma_where(sub) for sub in condition]
+            clauses.append({field: subs} if len(subs) > 1 else subs[0])
+        elif isinstance(condition, dict):
+            clauses.extend({field: {op: expected}} for op, expected in condition.items())
+        else:
+            clauses.append({field: {"$eq": condition}})
+
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+
+class ChromaVectorIndex(VectorIndex):
+    """
+    Embedded HNSW index backed by Chroma's persistent segments (the
+    data_level0.bin / link_lists.bin files under chroma_index/), queried in-process
+    with no network round trip.
+
+    Vectors are sharded across collections by a hash of their user_id so each HNSW
+    graph stays small and user-scoped queries only search one shard. Metadata
+    filters (user_id, url, conversation_id) are applied by Chroma during search.
+    """
+
+    def __init__(
+        self,
+        path: str = CHROMA_PERSIST_DIR,
+        collection_prefix: str = CHROMA_COLLECTION_PREFIX,
+        shards: int = CHROMA_SHARDS
+    ):
+        # Optional dependency: only needed when the chroma backend is selected
+        import chromadb
+
+        self._client = chromadb.PersistentClient(path=path)
+        self.collection_prefix = collection_prefix
+        self.shards = max(1, shards)
+        self._collections = {}
+
+    def _shard_for(self, user_id) -> int:
+        return int(hashlib.md5(str(user_id).encode()).hexdigest()[:8], 16) % self.shards
+
+    def _collection(self, namespace: str, shard: int):
+        name = f"{self.collection_prefix}_{namespace}_{shard}" if namespace else f"{self.collection_prefix}_{shard}"
+        collection = self._collections.get(name)
+        if collection is None:
+            collection = self._client.get_or_create_collection(
+                name=name,
+                embedding_function=None,
+                metadata={"hnsw:space": "cosine"}
+            )
+            self._collections[name] = collection
+        return collection
+
+    def _upsert_sync(self, vectors: list[dict], namespace: str) -> int:
+        by_shard: dict[int, list[dict]] = {}
+        for v in vectors:
+            shard = self._shard_for((v.get("metadata") or {}).get("user_id", ""))
+            by_shard.setdefault(shard, []).append(v)
+
+        for shard, group in by_shard.items():
+            self._collection(namespace, shard).upsert(
+                ids=[v["id"] for v in group],
+                embeddings=[v["values"] for v in group],
+                metadatas=[v.get("metadata") or None for v in group],
+            )
+        return len(vectors)
+
+    def _query_sync(self, vector, top_k, filter, include_metadata, namespace) -> list[dict]:
+        user_id = (filter or {}).get("user_id")
+        if isinstance(user_id, dict):
+            user_id = user_id.get("$eq")
+        shards = [self._shard_for(user_id)] if user_id is not None else range(self.shards)
+
+        where = to_chroma_where(filter)
+        matches = []
+        for shard in shards:
+            collection = self._collection(namespace, shard)
+            if collection.count() == 0:
+                continue
+            result = collection.query(
+                query_embeddings=[vector],
+                n_results=top_k,
+                where=where,
+                include=["metadatas", "distances"]
+            )
+            for vid, distance, metadata in zip(result["ids"][0], result["distances"][0], result["metadatas"][0]):
+                matches.append({
+                    "id": vid,
+                    # Cosine distance -> similarity, to match Pinecone's score
+                    "score": 1.0 - distance,
+                    "metadata": (metadata or {}) if include_metadata else {}
+                })
+
+        matches.sort(key=lambda m: m["score"], reverse=True)
+        return matches[:top_k]
+
+    def _delete_sync(self, ids: list[str], namespace: str) -> None:
+        # Ids carry no user_id, so fan the delete out to every shard
+        for shard in range(self.shards):
+            self._collection(namespace, shard).delete(ids=ids)
+
+    async def upsert(self, vectors: list[dict], namespace: str = "") -> int:
+        if not vectors:
+            return 0
+        return await asyncio.to_thread(self._upsert_sync, vectors, namespace)
+
+    async def query(
+        self,
+        vector: list[float],
+        top_k: int = 5,
+        filter: Optional[dict] = None,
+        include_metadata: bool = True,
+        namespace: str = ""
+    ) -> list[dict]:
+        return await asyncio.to_thread(self._query_sync, vector, top_k, filter, include_metadata, namespace)
+
+    async def delete(self, ids: list[str], namespace: str = "") -> None:
+        if ids:
+            await asyncio.to_thread(self._delete_sync, ids, namespace)
+
+
+# ======================================================
+# FACTORY
+# ======================================================
+
+def create_vector_index() -> Optional[VectorIndex]:
+    """
+    Builds the configured backend (VECTOR_INDEX_BACKEND = "pinecone" | "chroma" | "memory").
+    Returns None when Pinecone is selected but not configured.
+    """
+    if VECTOR_INDEX_BACKEND == "memory":
+        return InMemoryVectorIndex()
+
+    if VECTOR_INDEX_BACKEND == "chroma":
+        return ChromaVectorIndex()
+
+    api_key = os.getenv("PINECONE_API_KEY")
+    index_name = os.getenv("PINECONE_INDEX_NAME")
+    if not api_key or not index_name:
+        print("⚠️ Pinecone is not configured (PINECONE_API_KEY / PINECONE_INDEX_NAME); page context will not be stored")
+        return None
+
+    return PineconeIndexClient(
+        api_key=api_key,
+        index_name=index_name,
+        host=os.getenv("PINECONE_INDEX_HOST")
+    )
@@ -4,13 +4,11 @@ from typing import Optional
 from langchain_openai import OpenAIEmbeddings
 from langchain_ollama import OllamaEmbeddings
 from langchain_text_splitters import RecursiveCharacterTextSplitter
-from db.database import SessionLocal
-from db.models.vector_rag import PageChunk
-from db.models.chatContext import ChatContext
-from sqlalchemy import select
-from sqlalchemy.orm import Session
+from utils.embedding_cache import embedding_cache
+from embedding import embed_text
+from utils.page_fingerprint import page_fingerprints, fingerprint_text
 from dotenv import load_dotenv
-from pinecone import Pinecone
+from utils.vector_index import create_vector_index
 
 load_dotenv()
 
@@ -18,19 +16,21 @@ load_dotenv()
 class VectorStoreService:
 
     VECTOR_DIM = 1536
+    OPENAI_EMBEDDING_MODEL = "text-embedding-3-small"
+    OLLAMA_EMBEDDING_MODEL = "nomic-embed-text"
 
     def __init__(self):
         openai_key = os.getenv("OPENAI_API_KEY")
 
         if openai_key:
             self.openai_embeddings = OpenAIEmbeddings(
-                model="text-embedding-3-small",
+                model=self.OPENAI_EMBEDDING_MODEL,
                 openai_api_key=openai_key
             )
         else:
             self.openai_embeddings = None
 
-        self.ollama_embeddings = OllamaEmbeddings(model="nomic-embed-text")
+        self.ollama_embeddings = OllamaEmbeddings(model=self.OLLAMA_EMBEDDING_MODEL)
 
         self.text_splitter = RecursiveCharacterTextSplitter(
             chunk_size=800,
@@ -38,14 +38,8 @@ class VectorStoreService:
             separators=["\n\n", "\n", " ", ""]
         )
 
-        pincone_api_key = os.getenv("PINECONE_API_KEY")
-        self.index_name = os.getenv("PINECONE_INDEX_NAME")
-        if pincone_api_key and self.index_name:
-            self.pc = Pinecone(api_key=pincone_api_key)
-            self.index = self.pc.Index(self.index_name)
-        else:
-            self.pc = None
-            self.index = None
+        # Async vector index client (pooled Pinecone client or in-process stand-in)
+        self.index = create_vector_index()
 
     # --------------------------------------------------------
     # Ensure vectors match pgvector dimension (1536)
@@ -63,44 +57,80 @@ class VectorStoreService:
     # --------------------------------------------------------
     # Batch embed documents
     # --------------------------------------------------------
-    async def _embed_documents_with_fallback(self, texts: list[str]) -> list[list[float]]:
-
+    async def _embed_documents_with_provider(self, texts: list[str]) -> tuple[Optional[str], list[list[float]]]:
+        """
+        Embeds texts with OpenAI, falling back to Ollama.
+        Returns (model_name, vectors); model_name is None when every provider failed
+        and the vectors are zero placeholders (which must never be cached).
+        """
         if self.openai_embeddings:
             try:
-                return await self.openai_embeddings.aembed_documents(texts)
+                embeddings = await self.openai_embeddings.aembed_documents(texts)
+                return self.OPENAI_EMBEDDING_MODEL, embeddings
             except Exception as e:
                 print(f"⚠️ OpenAI batch embedding failed: {e}")
 
         try:
             print("🔄 Using Ollama for batch embeddings...")
             embeddings = await self.ollama_embeddings.aembed_documents(texts)
-            return [self._ensure_1536_dimensions(v) for v in embeddings]
+            return self.OLLAMA_EMBEDDING_MODEL, [self._ensure_1536_dimensions(v) for v in embeddings]
 
         except Exception as ollama_err:
             print(f"❌ Ollama batch embedding failed: {ollama_err}")
-            return [[0.0] * self.VECTOR_DIM for _ in texts]
+            return None, [[0.0] * self.VECTOR_DIM for _ in texts]
+
+    async def _embed_documents_with_fallback(self, texts: list[str]) -> list[list[float]]:
+        _, embeddings = await self._embed_documents_with_provider(texts)
+        return embeddings
+
+    # --------------------------------------------------------
+    # Cached batch embed (content-addressed by chunk hash)
+    # --------------------------------------------------------
+    async def _embed_chunks_cached(self, chunks: list[str], chunk_hashes: list[str]) -> tuple[list[list[float]], set]:
+        """
+        Looks up every chunk in the embedding cache under the primary model and only
+        sends novel chunks to the embedding provider. Duplicate chunks within the
+        same page are embedded once.
+        Returns (vectors, failed): `failed` holds the chunk hashes whose vectors are
+        zero placeholders because every provider failed.
+        """
+        if not embedding_cache:
+            model, embeddings = await self._embed_documents_with_provider(chunks)
+            return embeddings, (set() if model else set(chunk_hashes))
+
+        primary_model = self.OPENAI_EMBEDDING_MODEL if self.openai_embeddings else self.OLLAMA_EMBEDDING_MODEL
+        cached = await embedding_cache.aget_many(primary_model, chunk_hashes)
+
+        # Unique misses, preserving the first text seen for each hash
+        misses = {}
+        for text, content_hash in zip(chunks, chunk_hashes):
+            if content_hash not in cached and content_hash not in misses:
+                misses[content_hash] = text
+
+        print(f"🧠 Embedding cache: {len(chunks) - len(misses)} hits, {len(misses)} misses")
+
+        failed = set()
+        if misses:
+            model, embeddings = await self._embed_documents_with_provider(list(misses.values()))
+            fresh = {
+                content_hash: self._ensure_1536_dimensions(vec)
+                for content_hash, vec in zip(misses.keys(), embeddings)
+            }
+            if model:
+                await embedding_cache.aput_many(model, fresh)
+            else:
+                failed = set(misses)
+            cached.update(fresh)
+
+        return [cached[content_hash] for content_hash in chunk_hashes], failed
 
     # --------------------------------------------------------
     # Query embedding
     # --------------------------------------------------------
     async def _embed_query_with_fallback(self, query: str) -> list[float]:
-
-        if self.openai_embeddings:
-            try:
-                vec = await self.openai_embeddings.aembed_query(query)
-                return self._ensure_1536_dimensions(vec)
-
-            except Exception as e:
-                print(f"⚠️ OpenAI query embedding failed: {e}")
-
-        try:
-            print("🔄 Using Ollama for query embedding...")
-            vec = await self.ollama_embeddings.aembed_query(query)
-            return self._ensure_1536_dimensions(vec)
-
-        except Exception as ollama_err:
-            print(f"❌ Ollama query embedding failed: {ollama_err}")
-            return [0.0] * self.VECTOR_DIM
+        # Shared, memoized query embedding (same model and fallback chain), so the
+        # vector is reused by every retrieval path in the same turn
+        return await embed_text(query)
 
     def get_query_embedding_sync(self, q):
         """Synchronous version for internal thread usage"""
@@ -120,30 +150,25 @@ class VectorStoreService:
             return [0.0] * self.VECTOR_DIM
 
     # --------------------------------------------------------
-    # Context existence check
+    # Context existence check (page fingerprint index)
     # --------------------------------------------------------
     def has_context(self, user_id: str, url: str, conversation_id: int) -> bool:
+        return page_fingerprints.get(user_id, url, conversation_id) is not None
 
-        db: Session = SessionLocal()
-
-        try:
-            exists = db.query(PageChunk).join(
-                ChatContext,
-                PageChunk.id == ChatContext.chunk_id
-            ).filter(
-                PageChunk.user_id == str(user_id),
-                PageChunk.url == url,
-                ChatContext.conversation_id == conversation_id
-            ).first()
-
-            return exists is not None
-
-        except Exception as e:
-            print(f"Error checking context: {e}")
+    async def is_page_unchanged(self, user_id: str, url: str, conversation_id: Optional[int], content: str) -> bool:
+        """True if `content` is byte-identical to the last page saved for this user/URL/conversation."""
+        if not content:
             return False
+        previous = await page_fingerprints.aget(user_id, url, conversation_id)
+        return previous is not None and previous.page_hash == fingerprint_text(content)
+
+    @staticmethod
+    def _vector_id(user_id: str, conversation_id: Optional[int], url: str, content_hash: str) -> str:
+        # Scoped per user/conversation/URL so one user's save never overwrites
+        # (or deletes) another user's vectors for the same page.
+        scope = hashlib.md5(f"{user_id}:{conversation_id or 0}:{url}".encode()).hexdigest()
+        return f"{scope}_{content_hash}"
 
-        finally:
-            db.close()
     async def process_and_save_context(
             self,
             user_id: str,
@@ -165,6 +190,13 @@ class VectorStoreService:
         if not content:
             return 0
 
+        # Fast path: identical page already saved for this user/URL/conversation
+        page_hash = fingerprint_text(content)
+        previous = await page_fingerprints.aget(user_id, url, conversation_id)
+        if previous and previous.page_hash == page_hash:
+            print(f"⏭️ Page unchanged, skipping context save for: {url}")
+            return 0
+
         chunks = self.text_splitter.split_text(content)
 
         if not chunks:
@@ -177,23 +209,34 @@ class VectorStoreService:
         try:
             chunk_hashes = [hashlib.md5(c.encode()).hexdigest() for c in chunks]
 
-            if self.index:
-                texts_to_embed = chunks
-                embeddings = await self._embed_documents_with_fallback(texts_to_embed)
+            if self.index is not None:
+                # Diff against the previous save: only novel chunks are embedded/upserted,
+                # chunks that disappeared from the page are deleted.
+                previous_hashes = previous.chunk_hashes if previous else frozenset()
+                new_chunks = {}
+                for i, content_hash in enumerate(chunk_hashes):
+                    if content_hash not in previous_hashes and content_hash not in new_chunks:
+                        new_chunks[content_hash] = i
+                stale_hashes = previous_hashes - set(chunk_hashes)
+
+                new_indices = list(new_chunks.values())
+                embeddings, failed = await self._embed_chunks_cached(
+                    [chunks[i] for i in new_indices],
+                    [chunk_hashes[i] for i in new_indices]
+                )
 
                 vectors_to_upsert = []
-                for i, text in enumerate(chunks):
+                for i, embedding in zip(new_indices, embeddings):
                     content_hash = chunk_hashes[i]
-                    # We use URL + Hash as a stable ID for Pinecone to prevent duplicates
-                    pinecone_id = f"{hashlib.md5(url.encode()).hexdigest()}_{content_hash}"
-                    
+                    if content_hash in failed:
+                        continue  # Zero placeholder: never index it
                     vectors_to_upsert.append({
-                        "id": pinecone_id,
-                        "values": self._ensure_1536_dimensions(embeddings[i]),
+                        "id": self._vector_id(user_id, conversation_id, url, content_hash),
+                        "values": self._ensure_1536_dimensions(embedding),
                         "metadata": {
                             "user_id": str(user_id),
                             "url": url,
-                            "content": text,
+                            "content": chunks[i],
                             "content_hash": content_hash,
                             "chunk_index": i,
                             "conversation_id": conversation_id or 0 # Store context link in Pinecone
@@ -201,11 +244,22 @@ class VectorStoreService:
                     })
 
                 try:
-                    import asyncio
-                    # Run the sync Pinecone upsert in a thread to keep the event loop moving
-                    await asyncio.to_thread(self.index.upsert, vectors=vectors_to_upsert)
-                    saved_count = len(chunks)
-                    print(f"🚀 Successfully upserted {saved_count} chunks to Pinecone for: {url}")
+                    # Upserts are coalesced with other concurrent saves into size-capped batches
+                    if vectors_to_upsert:
+                        await self.index.upsert(vectors_to_upsert)
+                    if stale_hashes:
+                        await self.index.delete([self._vector_id(user_id, conversation_id, url, h) for h in stale_hashes])
+                    # Chunks whose embedding failed stay unrecorded (and the page never
+                    # matches as unchanged), so the next save embeds them again
+                    indexed_hashes = [h for h in chunk_hashes if h not in failed]
+                    if failed:
+                        print(f"⚠️ Embedding failed for {len(failed)} chunks of {url}; they will be retried on the next save")
+                    if indexed_hashes or previous:
+                        await page_fingerprints.aput(
+                            user_id, url, conversation_id, "" if failed else page_hash, indexed_hashes
+                        )
+                    saved_count = len(vectors_to_upsert)
+                    print(f"🚀 Upserted {saved_count} new chunks, deleted {len(stale_hashes)} stale chunks in Pinecone for: {url}")
                 except Exception as p_err:
                     print(f"⚠️ Pinecone upsert failed: {p_err}")
 
@@ -215,10 +269,6 @@ class VectorStoreService:
             print(f"❌ Error saving vector context: {e}")
             return 0
 
-        except Exception as e:
-            print(f"❌ Error saving vector context: {e}")
-            return 0
-
     # --------------------------------------------------------
     # Retrieve relevant chunks
     # --------------------------------------------------------
@@ -232,11 +282,10 @@ class VectorStoreService:
     ) -> str:
 
         try:
-            import asyncio
             query_embedding = await self._embed_query_with_fallback(query)
 
-            # TRY PINECONE
-            if self.index:
+            # TRY VECTOR INDEX
+            if self.index is not None:
                 try:
                     filter_dict = {"user_id": str(user_id)}
                     
@@ -246,17 +295,18 @@ class VectorStoreService:
                     elif current_url:
                         filter_dict["url"] = current_url
                     
-                    # Run sync Pinecone query in a thread
-                    results = await asyncio.to_thread(
-                        self.index.query,
+                    # Pooled async query (no thread per request)
+                    matches = await self.index.query(
                         vector=query_embedding,
                         top_k=limit,
                         include_metadata=True,
                         filter=filter_dict
                     )
                     
-                    if results and results.matches:
-                        return "\n\n".join(m.metadata["content"] for m in results.matches if "content" in m.metadata)
+                    if matches:
+                        return "\n\n".join(
+                            m["metadata"]["content"] for m in matches if "content" in (m.get("metadata") or {})
+                        )
                 except Exception as p_query_err:
                     print(f"⚠️ Pinecone query failed: {p_query_err}")
 
@@ -132,7 +132,7 @@ chrome.runtime.onMessage.addListener((message, sender, sendResponse) => {
           const [tab] = await chrome.tabs.query({ active: true, currentWindow: true });
           const response = await fetch("http://localhost:8000/snapshot", {
             method: "POST",
-            headers: { "Content-Type": "application/json" },
+            headers: await snapshotHeaders(),
             body: JSON.stringify({ url: tab.url, format: "png" })
           });
           const data = await response.json();
@@ -163,7 +163,7 @@ chrome.runtime.onMessage.addListener((message, sender, sendResponse) => {
         const format = message.snapshotType || "pdf";
         const response = await fetch("http://localhost:8000/snapshot", {
           method: "POST",
-          headers: { "Content-Type": "application/json" },
+          headers: await snapshotHeaders(),
           body: JSON.stringify({ url: tab.url, format: format })
         });
         const data = await response.json();
@@ -1116,64 +1116,116 @@ async function toggleDarkSite(tabId) {
 // �� SNAPSHOT POLLING LOGIC
 // ==================================================
 
-async function pollSnapshotStatus(taskId, format) {
-  console.log(`⏳ Starting poll for task ${taskId} (format: ${format})...`);
-  const poll = async () => {
-    try {
-      const resp = await fetch(`http://localhost:8000/snapshot/status/${taskId}`);
-      const statusData = await resp.json();
+// Snapshot requests carry the session token so results land in the user's media library.
+async function snapshotHeaders() {
+  const { access_token } = await chrome.storage.local.get(['access_token']);
+  const headers = { "Content-Type": "application/json" };
+  if (access_token) headers.Authorization = `Bearer ${access_token}`;
+  return headers;
+}
+
+// Applies one snapshot status update. Returns true once the job is finished.
+async function handleSnapshotStatus(taskId, format, statusData) {
+  // Dispatch progress
+  if (statusData.progress !== undefined && statusData.message) {
+    chrome.runtime.sendMessage({
+      type: "SMART_SNAPSHOT_PROGRESS",
+      taskId: taskId,
+      progress: statusData.progress,
+      messageText: statusData.message
+    }).catch(() => {});
+  }
+
+  if (statusData.status === 'completed') {
+    console.log(`✅ Snapshot ${taskId} completed!`);
 
-      // Dispatch progress
-      if (statusData.progress !== undefined && statusData.message) {
+    if (format === 'png') {
+      // Fetch the actual image data
+      const previewResp = await fetch(`http://localhost:8000/snapshot/preview/${taskId}`);
+      const blob = await previewResp.blob();
+      const reader = new FileReader();
+      reader.onloadend = () => {
         chrome.runtime.sendMessage({
-          type: "SMART_SNAPSHOT_PROGRESS",
-          taskId: taskId,
-          progress: statusData.progress,
-          messageText: statusData.message
+          type: "SCREENSHOT_CAPTURED",
+          image: reader.result
         }).catch(() => {});
-      }
 
-      if (statusData.status === 'completed') {
-        console.log(`✅ Snapshot ${taskId} completed!`);
-        
-        if (format === 'png') {
-          // Fetch the actual image data
-          const previewResp = await fetch(`http://localhost:8000/snapshot/preview/${taskId}`);
-          const blob = await previewResp.blob();
-          const reader = new FileReader();
-          reader.onloadend = () => {
-            chrome.runtime.sendMessage({
-              type: "SCREENSHOT_CAPTURED",
-              image: reader.result
-            }).catch(() => {});
-            
-            // Send complete signal for loader
-            chrome.runtime.sendMessage({
-              type: "SMART_SNAPSHOT_COMPLETE",
-              taskId: taskId,
-              downloadUrl: null, // Just image for PNG, handled by modal
-              filename: 'snapshot.png'
-            }).catch(() => {});
-          };
-          reader.readAsDataURL(blob);
-        } else {
-          // For PDF/Word etc, we can just send a notification or link
-          const downloadUrl = `http://localhost:8000/snapshot/download/${taskId}`;
-          chrome.runtime.sendMessage({
-            type: "SMART_SNAPSHOT_COMPLETE",
-            taskId: taskId,
-            downloadUrl: downloadUrl,
-            filename: statusData.filename || 'snapshot.pdf'
-          }).catch(() => {});
-        }
-      } else if (statusData.status === 'error') {
-        console.error(`❌ Snapshot ${taskId} failed:`, statusData.error);
+        // Send complete signal for loader
         chrome.runtime.sendMessage({
-          type: "SMART_SNAPSHOT_ERROR",
+          type: "SMART_SNAPSHOT_COMPLETE",
           taskId: taskId,
-          error: statusData.error || "Unknown error occurred"
+          downloadUrl: null, // Just image for PNG, handled by modal
+          filename: 'snapshot.png'
         }).catch(() => {});
-      } else {
+      };
+      reader.readAsDataURL(blob);
+    } else {
+      // For PDF/Word etc, we can just send a notification or link
+      const downloadUrl = `http://localhost:8000/snapshot/download/${taskId}`;
+      chrome.runtime.sendMessage({
+        type: "SMART_SNAPSHOT_COMPLETE",
+        taskId: taskId,
+        downloadUrl: downloadUrl,
+        filename: statusData.filename || 'snapshot.pdf'
+      }).catch(() => {});
+    }
+    return true;
+  }
+
+  if (statusData.status === 'error') {
+    console.error(`❌ Snapshot ${taskId} failed:`, statusData.error);
+    chrome.runtime.sendMessage({
+      type: "SMART_SNAPSHOT_ERROR",
+      taskId: taskId,
+      error: statusData.error || "Unknown error occurred"
+    }).catch(() => {});
+    return true;
+  }
+
+  return false;
+}
+
+// Follows a snapshot job over the /snapshot/events stream; falls back to polling if the stream drops.
+async function pollSnapshotStatus(taskId, format) {
+  console.log(`⏳ Following task ${taskId} (format: ${format})...`);
+  try {
+    const resp = await fetch(`http://localhost:8000/snapshot/events/${taskId}`);
+    if (!resp.ok || !resp.body) throw new Error(`events stream unavailable (${resp.status})`);
+
+    const reader = resp.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+
+    while (true) {
+      const { value, done } = await reader.read();
+      if (done) break;
+
+      buffer += decoder.decode(value, { stream: true });
+      const frames = buffer.split('\n\n');
+      buffer = frames.pop();
+
+      for (const frame of frames) {
+        if (!frame.trim()) continue;
+        const event = JSON.parse(frame);
+        if (event.type === 'status' && await handleSnapshotStatus(taskId, format, event.data)) {
+          reader.cancel().catch(() => {});
+          return;
+        }
+        if (event.type === 'error') throw new Error(event.data);
+      }
+    }
+  } catch (err) {
+    console.warn("⚠️ Snapshot event stream failed, polling instead:", err);
+  }
+  pollSnapshotStatusFallback(taskId, format);
+}
+
+async function pollSnapshotStatusFallback(taskId, format) {
+  const poll = async () => {
+    try {
+      const resp = await fetch(`http://localhost:8000/snapshot/status/${taskId}`);
+      const statusData = await resp.json();
+      if (!(await handleSnapshotStatus(taskId, format, statusData))) {
         // Keep polling
         setTimeout(poll, 2000);
       }
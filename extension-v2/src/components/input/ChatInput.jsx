@@ -9,7 +9,7 @@ export default function ChatInput({ currentUrl }) {
     const { state, dispatch } = useApp();
     const { isStreaming, attachedImageUrl, plusMenuOpen, agentMode } = state;
     const { streamChatResponse, streamAgentManifest, abortStream, addMessage } = useStreaming();
-    const { uploadMedia } = useMedia();
+    const { uploadMediaFile } = useMedia();
     const inputRef = useRef(null);
     const fileInputRef = useRef(null);
     const [uploadProgress, setUploadProgress] = useState(0);
@@ -82,42 +82,37 @@ export default function ChatInput({ currentUrl }) {
         if (!file) return;
         dispatch({ type: 'CLOSE_PLUS_MENU' });
 
-        const reader = new FileReader();
-        reader.onload = async (ev) => {
-            setIsUploading(true);
-            setPreviewLabel('Uploading to cloud...');
+        setIsUploading(true);
+        setPreviewLabel('Uploading to cloud...');
 
-            const base64 = ev.target.result;
-            const fileType = file.type.startsWith('image') ? 'image' : file.type.includes('pdf') ? 'pdf' : 'docx';
+        const fileType = file.type.startsWith('image') ? 'image' : file.type.includes('pdf') ? 'pdf' : 'docx';
 
-            // Simulate progress
-            let progress = 0;
-            const interval = setInterval(() => {
-                progress += Math.random() * 15;
-                if (progress > 90) progress = 90;
-                setUploadProgress(Math.floor(progress));
-            }, 200);
+        // Simulate progress
+        let progress = 0;
+        const interval = setInterval(() => {
+            progress += Math.random() * 15;
+            if (progress > 90) progress = 90;
+            setUploadProgress(Math.floor(progress));
+        }, 200);
 
-            try {
-                const result = await uploadMedia(base64, file.name, fileType, 'sidebar');
-                clearInterval(interval);
-                setUploadProgress(100);
+        try {
+            const result = await uploadMediaFile(file, fileType, 'sidebar');
+            clearInterval(interval);
+            setUploadProgress(100);
 
-                if (result.status === 'success') {
-                    dispatch({ type: 'SET_ATTACHED_IMAGE', url: result.file_url });
-                    setPreviewLabel('Image attached — Type your query below');
-                    setIsUploading(false);
-                    setTimeout(() => setUploadProgress(0), 500);
-                    inputRef.current?.focus();
-                }
-            } catch (err) {
-                clearInterval(interval);
-                setPreviewLabel('❌ Upload failed');
+            if (result.status === 'success') {
+                dispatch({ type: 'SET_ATTACHED_IMAGE', url: result.file_url });
+                setPreviewLabel('Image attached — Type your query below');
                 setIsUploading(false);
+                setTimeout(() => setUploadProgress(0), 500);
+                inputRef.current?.focus();
             }
-        };
-        reader.readAsDataURL(file);
-    }, [uploadMedia, dispatch]);
+        } catch (err) {
+            clearInterval(interval);
+            setPreviewLabel('❌ Upload failed');
+            setIsUploading(false);
+        }
+    }, [uploadMediaFile, dispatch]);
 
     return (
         <div
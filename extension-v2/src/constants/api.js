@@ -12,7 +12,10 @@ export const API = {
     SNAPSHOT: "http://127.0.0.1:8000/snapshot",
     MEDIA: "http://127.0.0.1:8000/media",
     CONTEXT: "http://127.0.0.1:8000/context/save",
+    CONTEXT_STATE: "http://127.0.0.1:8000/context/state",
+    CONTEXT_DELTA: "http://127.0.0.1:8000/context/delta",
     MEDIA_UPLOAD: "http://127.0.0.1:8000/media/upload",
+    MEDIA_UPLOAD_STREAM: "http://127.0.0.1:8000/media/upload/stream",
     LOGIN: "http://127.0.0.1:8000/login",
     LOGOUT: "http://127.0.0.1:8000/auth/logout",
 };
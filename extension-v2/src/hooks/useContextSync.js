@@ -3,6 +3,7 @@ import { useApp } from '../store/AppContext';
 import { API } from '../constants/api';
 import { isRestrictedPage, downloadJSON } from '../utils/helpers';
 import { extractDOMTree } from '../utils/domExtractor';
+import { syncPageState, forgetPageState, isUnknownContextRef } from '../utils/pageState';
 
 export function useContextSync() {
     const { state, dispatch } = useApp();
@@ -37,6 +38,8 @@ export function useContextSync() {
                 const token = state.accessToken;
                 if (!token) return;
 
+                const contextRef = await syncPageState({ tabId, url, pageContext, token });
+
                 fetch(API.CONTEXT, {
                     method: 'POST',
                     headers: {
@@ -46,10 +49,15 @@ export function useContextSync() {
                     body: JSON.stringify({
                         url,
                         title,
-                        raw_html: pageContext,
+                        ...(contextRef ? { context_ref: contextRef } : { raw_html: pageContext }),
                         conversation_id: state.conversationId || undefined
                     })
                 }).then(res => res.json()).then(data => {
+                    if (isUnknownContextRef(data?.message)) {
+                        // Server dropped this page; the next sync uploads it in full
+                        forgetPageState(tabId);
+                        return;
+                    }
                     console.log("Context saved successfully:", data);
                     // Add to cache on success
                     if (state.conversationId) {
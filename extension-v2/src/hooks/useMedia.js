@@ -33,5 +33,17 @@ export function useMedia() {
         return await res.json();
     }, [state.accessToken]);
 
-    return { fetchMedia, deleteMedia, uploadMedia };
+    // Sends the File/Blob as the raw request body; the server streams it to storage
+    const uploadMediaFile = useCallback(async (file, fileType, source) => {
+        const token = state.accessToken;
+        const params = new URLSearchParams({ filename: file.name, file_type: fileType, source });
+        const res = await fetch(`${API.MEDIA_UPLOAD_STREAM}?${params}`, {
+            method: 'POST',
+            headers: { 'Content-Type': file.type || 'application/octet-stream', Authorization: `Bearer ${token}` },
+            body: file
+        });
+        return await res.json();
+    }, [state.accessToken]);
+
+    return { fetchMedia, deleteMedia, uploadMedia, uploadMediaFile };
 }
@@ -4,6 +4,7 @@ import { API } from '../constants/api';
 import { marked } from 'marked';
 import { isRestrictedPage, downloadJSON } from '../utils/helpers';
 import { extractDOMTree } from '../utils/domExtractor';
+import { syncPageState, forgetPageState, isUnknownContextRef } from '../utils/pageState';
 
 marked.setOptions({ breaks: true, gfm: true });
 
@@ -56,6 +57,7 @@ export function useStreaming() {
         let effectiveUrl = currentUrl;  // may be null if called without it
         let activeTab = null;
         let pageContext = null;
+        let contextRef = null;
 
         try {
             if (typeof chrome !== 'undefined' && chrome.tabs) {
@@ -88,6 +90,14 @@ export function useStreaming() {
                 if (pageContext) {
                     // Download the extracted JSON
                     // downloadJSON(pageContext, `chat-context-${Date.now()}.json`);
+
+                    // Upload only what changed since the last extraction of this tab
+                    contextRef = await syncPageState({
+                        tabId: activeTab.id,
+                        url: effectiveUrl,
+                        pageContext,
+                        token: state.accessToken
+                    });
                 }
 
                 if (pageContext && conversationId) {
@@ -102,10 +112,11 @@ export function useStreaming() {
                         },
                         body: JSON.stringify({
                             url: effectiveUrl,
-                            raw_html: pageContext,
+                            ...(contextRef ? { context_ref: contextRef } : { raw_html: pageContext }),
                             conversation_id: conversationId
                         })
-                    }).then(() => {
+                    }).then(res => res.json()).then(data => {
+                        if (isUnknownContextRef(data?.message)) forgetPageState(activeTab.id);
                         console.log('[Context] Synced page context in background for:', effectiveUrl);
                     }).catch(err => {
                         console.error('[Context] Background sync failed:', err);
@@ -120,87 +131,100 @@ export function useStreaming() {
 
         try {
             const token = state.accessToken;
-            const res = await fetch(API.CHAT, {
-                method: 'POST',
-                headers: { 'Content-Type': 'application/json', 'Authorization': `Bearer ${token}` },
-                body: JSON.stringify({
-                    prompt: text,
-                    imageUrl,
-                    currentUrl: effectiveUrl,           // use live-resolved URL, not null state.activeUrl
-                    context: pageContext,               // raw DOM fallback for backend
-                    conversationId,
-                    model: state.preferredModel,
-                    history: state.messages.map(m => ({
-                        role: m.role === 'bot' ? 'assistant' : m.role,
-                        content: m.content,
-                        imageUrl: m.imageUrl || (m.screenshot ? m.screenshot : null)
-                    }))
-                }),
-                signal: controller.signal
-            });
+            // A second attempt only happens when the server no longer knows contextRef
+            for (let attempt = 0; attempt < 2; attempt++) {
+                let refExpired = false;
+                const res = await fetch(API.CHAT, {
+                    method: 'POST',
+                    headers: { 'Content-Type': 'application/json', 'Authorization': `Bearer ${token}` },
+                    body: JSON.stringify({
+                        prompt: text,
+                        imageUrl,
+                        currentUrl: effectiveUrl,           // use live-resolved URL, not null state.activeUrl
+                        context: contextRef ? undefined : pageContext, // raw DOM fallback for backend
+                        contextRef,                         // server-side page state (see utils/pageState)
+                        conversationId,
+                        model: state.preferredModel,
+                        history: state.messages.map(m => ({
+                            role: m.role === 'bot' ? 'assistant' : m.role,
+                            content: m.content,
+                            imageUrl: m.imageUrl || (m.screenshot ? m.screenshot : null)
+                        }))
+                    }),
+                    signal: controller.signal
+                });
+
+                const reader = res.body.getReader();
+                const decoder = new TextDecoder();
+                let buffer = '';
+
+                while (true) {
+                    const { value, done } = await reader.read();
+                    if (done) break;
+
+                    buffer += decoder.decode(value, { stream: true });
+                    const frames = buffer.split('\n\n');
+                    buffer = frames.pop();
 
-            const reader = res.body.getReader();
-            const decoder = new TextDecoder();
-            let buffer = '';
-
-            while (true) {
-                const { value, done } = await reader.read();
-                if (done) break;
-
-                buffer += decoder.decode(value, { stream: true });
-                const frames = buffer.split('\n\n');
-                buffer = frames.pop();
-
-                for (const frame of frames) {
-                    if (!frame.trim()) continue;
-                    try {
-                        const event = JSON.parse(frame);
-
-                        if (event.type === 'text') {
-                            fullText += event.data;
-                            const html = marked.parse(fullText);
-                            dispatch({
-                                type: 'UPDATE_LAST_BOT_MESSAGE',
-                                updates: { content: fullText, html, isStreaming: true }
-                            });
-                        }
-
-                        if (event.type === 'context_analysis') {
-                            dispatch({
-                                type: 'UPDATE_LAST_BOT_MESSAGE',
-                                updates: { contextAnalysis: event.data }
-                            });
-                        }
-
-                        if (event.type === 'video_analysis') {
-                            dispatch({
-                                type: 'UPDATE_LAST_BOT_MESSAGE',
-                                updates: { videoAnalysis: event.data }
-                            });
-                        }
-
-                        if (event.type === 'status') {
-                            dispatch({
-                                type: 'UPDATE_LAST_BOT_MESSAGE',
-                                updates: { statusText: event.data }
-                            });
-                        }
-
-                        if (event.type === 'rich_blocks') {
-                            dispatch({
-                                type: 'UPDATE_LAST_BOT_MESSAGE',
-                                updates: { richBlocks: event.data }
-                            });
-                        }
-
-                        if (event.type === 'error') {
-                            dispatch({
-                                type: 'UPDATE_LAST_BOT_MESSAGE',
-                                updates: { content: '⚠️ ' + event.data, isStreaming: false, isError: true }
-                            });
-                        }
-                    } catch (e) { /* parse error */ }
+                    for (const frame of frames) {
+                        if (!frame.trim()) continue;
+                        try {
+                            const event = JSON.parse(frame);
+
+                            if (event.type === 'text') {
+                                fullText += event.data;
+                                const html = marked.parse(fullText);
+                                dispatch({
+                                    type: 'UPDATE_LAST_BOT_MESSAGE',
+                                    updates: { content: fullText, html, isStreaming: true }
+                                });
+                            }
+
+                            if (event.type === 'context_analysis') {
+                                dispatch({
+                                    type: 'UPDATE_LAST_BOT_MESSAGE',
+                                    updates: { contextAnalysis: event.data }
+                                });
+                            }
+
+                            if (event.type === 'video_analysis') {
+                                dispatch({
+                                    type: 'UPDATE_LAST_BOT_MESSAGE',
+                                    updates: { videoAnalysis: event.data }
+                                });
+                            }
+
+                            if (event.type === 'status') {
+                                dispatch({
+                                    type: 'UPDATE_LAST_BOT_MESSAGE',
+                                    updates: { statusText: event.data }
+                                });
+                            }
+
+                            if (event.type === 'rich_blocks') {
+                                dispatch({
+                                    type: 'UPDATE_LAST_BOT_MESSAGE',
+                                    updates: { richBlocks: event.data }
+                                });
+                            }
+
+                            if (event.type === 'error' && event.code === 'unknown_context_ref') {
+                                refExpired = true;
+                            } else if (event.type === 'error') {
+                                dispatch({
+                                    type: 'UPDATE_LAST_BOT_MESSAGE',
+                                    updates: { content: '⚠️ ' + event.data, isStreaming: false, isError: true }
+                                });
+                            }
+                        } catch (e) { /* parse error */ }
+                    }
                 }
+
+                if (!refExpired || !contextRef) break;
+                // Page state expired server-side: resend the full page and re-upload on the next sync
+                console.log('[Context] context_ref expired; retrying with the full page');
+                forgetPageState(activeTab.id);
+                contextRef = null;
             }
         } catch (error) {
             if (error.name !== 'AbortError') {
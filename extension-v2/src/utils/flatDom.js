@@ -0,0 +1,71 @@
+/**
+ * Compact "flat-dom/1" encoding of an extractDOMTree() tree.
+ *
+ * Nodes are listed in pre-order as parallel columns, and tag and attribute
+ * names go through a shared string table, so repeated names like "div" or
+ * "class" are sent once. The API accepts this form anywhere a domTree is
+ * expected (see api/utils/flat_dom.py).
+ */
+
+export const FLAT_DOM_FORMAT = 'flat-dom/1';
+const TEXT_TAG = '#text';
+
+export function encodeFlatDom(tree) {
+    const strings = [];
+    const stringIds = new Map();
+    const tags = [], sizes = [], texts = [], attrs = [], values = [], checked = [];
+    const parents = [];
+
+    const intern = (s) => {
+        let id = stringIds.get(s);
+        if (id === undefined) {
+            id = strings.length;
+            stringIds.set(s, id);
+            strings.push(s);
+        }
+        return id;
+    };
+
+    const stack = [[tree, -1]];
+    while (stack.length) {
+        let [node, parent] = stack.pop();
+        const index = tags.length;
+        parents.push(parent);
+        sizes.push(1);
+        if (typeof node === 'string') node = { type: 'text', content: node };
+        if (node === null || typeof node !== 'object') node = {};
+
+        if (node.type === 'text') {
+            tags.push(intern(TEXT_TAG));
+            texts.push(node.content ?? null);
+            attrs.push(null);
+            continue;
+        }
+
+        tags.push(intern(node.tag || ''));
+        texts.push(node.text ?? null);
+        const names = node.attrs ? Object.keys(node.attrs) : [];
+        if (names.length) {
+            const flat = [];
+            for (const name of names) flat.push(intern(name), node.attrs[name]);
+            attrs.push(flat);
+        } else {
+            attrs.push(null);
+        }
+        if (node.value !== undefined && node.value !== null) values.push([index, node.value]);
+        if (node.checked) checked.push(index);
+
+        const children = node.children || [];
+        for (let i = children.length - 1; i >= 0; i--) stack.push([children[i], index]);
+    }
+
+    for (let i = parents.length - 1; i > 0; i--) sizes[parents[i]] += sizes[i];
+
+    return { format: FLAT_DOM_FORMAT, strings, tags, sizes, texts, attrs, values, checked };
+}
+
+/** The page payload with its domTree in flat form (for full uploads). */
+export function withFlatDomTree(pageContext) {
+    if (!pageContext?.domTree || pageContext.domTree.format === FLAT_DOM_FORMAT) return pageContext;
+    return { ...pageContext, domTree: encodeFlatDom(pageContext.domTree) };
+}
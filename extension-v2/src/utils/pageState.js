@@ -0,0 +1,155 @@
+import { API } from '../constants/api';
+import { withFlatDomTree } from './flatDom';
+
+/**
+ * Incremental page-context uploads.
+ *
+ * The first extraction of a tab is uploaded once to /context/state; later
+ * extractions are diffed against it and only node-level patches go to
+ * /context/delta. Chat and context-save requests then send `contextRef`
+ * instead of the full domTree. Any 404/409/422 falls back to a full upload.
+ *
+ * The server forgets pages that go unread for PAGE_STATE_TTL (6h) or are pruned,
+ * so an unchanged tab is re-uploaded after MAX_STATE_AGE_MS, and callers that get
+ * "Unknown context_ref" back call forgetPageState() and send the full page.
+ */
+
+// Above this many ops a full upload is cheaper than the patch
+const MAX_DELTA_OPS = 500;
+const DELTA_FIELDS = ['title', 'url', 'textContent', 'metadata', 'word_count', 'extractedAt'];
+// Well under the server's PAGE_STATE_TTL, so a ref we hand out is still live
+const MAX_STATE_AGE_MS = 60 * 60 * 1000;
+
+// tabId -> { url, ref, version, snapshot, syncedAt }
+const pageStates = new Map();
+
+const isNode = (value) => value !== null && typeof value === 'object' && !Array.isArray(value);
+
+const sameValue = (a, b) => a === b || JSON.stringify(a) === JSON.stringify(b);
+
+// Cheap identity for aligning sibling lists (avoids diffing every node after an insertion)
+const nodeKey = (node) => isNode(node)
+    ? `${node.tag}|${node.attrs?.id || ''}|${(node.text || '').slice(0, 40)}|${node.children?.length || 0}`
+    : String(node);
+
+function diffNode(prev, next, path, ops) {
+    if (ops.length > MAX_DELTA_OPS) return;
+
+    if (!isNode(prev) || !isNode(next) || prev.tag !== next.tag) {
+        if (!sameValue(prev, next)) ops.push({ op: 'replace', path, node: next });
+        return;
+    }
+
+    const fields = {};
+    for (const key of new Set([...Object.keys(prev), ...Object.keys(next)])) {
+        if (key !== 'children' && !sameValue(prev[key], next[key])) {
+            fields[key] = next[key] ?? null;
+        }
+    }
+    if (Object.keys(fields).length) ops.push({ op: 'set', path, fields });
+
+    const before = prev.children || [];
+    const after = next.children || [];
+
+    // Unchanged head and tail of the child list keep their positions
+    let head = 0;
+    while (head < before.length && head < after.length && nodeKey(before[head]) === nodeKey(after[head])) head++;
+    let tail = 0;
+    while (
+        tail < before.length - head && tail < after.length - head &&
+        nodeKey(before[before.length - 1 - tail]) === nodeKey(after[after.length - 1 - tail])
+    ) tail++;
+
+    for (let i = 0; i < head; i++) diffNode(before[i], after[i], [...path, i], ops);
+
+    const middleBefore = before.length - head - tail;
+    const middleAfter = after.length - head - tail;
+    const paired = Math.min(middleBefore, middleAfter);
+    for (let i = head; i < head + paired; i++) diffNode(before[i], after[i], [...path, i], ops);
+    for (let i = paired; i < middleBefore; i++) ops.push({ op: 'remove', path: [...path, head + paired] });
+    for (let i = paired; i < middleAfter; i++) ops.push({ op: 'insert', path: [...path, head + i], node: after[head + i] });
+
+    // Tail indexes are in the new list's coordinates (the middle edits are applied first)
+    for (let j = 0; j < tail; j++) {
+        diffNode(before[before.length - tail + j], after[after.length - tail + j], [...path, after.length - tail + j], ops);
+    }
+}
+
+/** Patches turning `prev` into `next`, or null when a full upload is smaller. */
+export function diffDomTrees(prev, next) {
+    const ops = [];
+    diffNode(prev, next, [], ops);
+    return ops.length > MAX_DELTA_OPS ? null : ops;
+}
+
+function diffFields(prev, next, treeChanged) {
+    const fields = {};
+    for (const key of DELTA_FIELDS) {
+        // The server drops stale textContent when the tree changes, so always resend it then
+        if ((treeChanged && key === 'textContent') || !sameValue(prev[key], next[key])) {
+            fields[key] = next[key] ?? null;
+        }
+    }
+    return fields;
+}
+
+async function postJSON(url, token, body) {
+    return fetch(url, {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+            'Authorization': `Bearer ${token}`
+        },
+        body: JSON.stringify(body)
+    });
+}
+
+/**
+ * Makes the server's copy of this tab's page match `pageContext`.
+ * Resolves to the context ref, or null (callers then send the full payload).
+ */
+export async function syncPageState({ tabId, url, pageContext, token }) {
+    if (!pageContext || pageContext.error || !token || tabId == null) return null;
+
+    const known = pageStates.get(tabId);
+    try {
+        if (known && known.url === url && Date.now() - known.syncedAt < MAX_STATE_AGE_MS) {
+            const ops = diffDomTrees(known.snapshot.domTree, pageContext.domTree);
+            if (ops) {
+                const fields = diffFields(known.snapshot, pageContext, ops.length > 0);
+                delete fields.extractedAt;
+                if (!ops.length && !Object.keys(fields).length) return known.ref;
+
+                const res = await postJSON(API.CONTEXT_DELTA, token, {
+                    ref: known.ref,
+                    base_version: known.version,
+                    ops,
+                    fields
+                });
+                if (res.ok) {
+                    const data = await res.json();
+                    pageStates.set(tabId, { url, ref: data.ref, version: data.version, snapshot: pageContext, syncedAt: Date.now() });
+                    return data.ref;
+                }
+                console.log(`[Context] Delta rejected (${res.status}); uploading full page`);
+            }
+        }
+
+        const res = await postJSON(API.CONTEXT_STATE, token, { url, tab_id: tabId, raw_html: withFlatDomTree(pageContext) });
+        if (!res.ok) throw new Error(`HTTP ${res.status}`);
+        const data = await res.json();
+        pageStates.set(tabId, { url, ref: data.ref, version: data.version, snapshot: pageContext, syncedAt: Date.now() });
+        return data.ref;
+    } catch (err) {
+        console.warn('[Context] Page state sync failed:', err);
+        pageStates.delete(tabId);
+        return null;
+    }
+}
+
+/** Drops a tab's state after the server reported its ref unknown; the next sync re-uploads. */
+export function forgetPageState(tabId) {
+    pageStates.delete(tabId);
+}
+
+export const isUnknownContextRef = (message) => message === 'Unknown context_ref';